@@ -41,6 +41,10 @@ import {
 import { WS_URL } from '../config'; // WebSocket 统一配置
 import useMediaPipeHands from '@/hooks/useMediaPipeHands'; // MediaPipe Hands Hook
 
+// 服务端推荐的默认值；开始 / 停止识别时恢复（上一轮拥塞时的推荐不带到下一轮）
+const DEFAULT_FRAME_RECOMMEND = { fps: 20, jpeg_width: 320, jpeg_quality: 0.6, mode: 'frame' };
+const DEFAULT_LANDMARKS_RECOMMEND = { fps: 20 };
+
 interface GestureResult {
   gesture: string;
   confidence: number;
@@ -74,6 +78,12 @@ export default function WebcamViewer() {
   const fpsCounterRef = useRef({ frames: 0, lastTime: Date.now(), fps: 0 });
   const wsCounterRef = useRef({ frames: 0, lastTime: Date.now(), fps: 0 });
 
+  // 服务端负载反馈：推荐的发送帧率 / JPEG 尺寸 / 模式（随 gesture_result 下发）
+  // 整帧与 landmarks 两条发送路径各自记录（按推荐的 source 区分）
+  const frameRecommendRef = useRef(DEFAULT_FRAME_RECOMMEND);
+  const landmarksRecommendRef = useRef(DEFAULT_LANDMARKS_RECOMMEND);
+  const lastLandmarksSentRef = useRef(0);
+
   const [isStreaming, setIsStreaming] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [stream, setStream] = useState<MediaStream | null>(null);
@@ -105,8 +115,12 @@ export default function WebcamViewer() {
           setHasHand(true);
         }
 
-        // 📤 发送 landmarks 到后端（携带镜像/单位上下文）
-        if (isRecognizing && wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+        // 📤 发送 landmarks 到后端（携带镜像/单位上下文），按服务端推荐帧率限速
+        const sendNow = Date.now();
+        const minGapMs = 1000 / landmarksRecommendRef.current.fps;
+        if (isRecognizing && wsRef.current && wsRef.current.readyState === WebSocket.OPEN
+            && sendNow - lastLandmarksSentRef.current >= minGapMs) {
+          lastLandmarksSentRef.current = sendNow;
           const video = videoRef.current;
           const videoWidth = video?.videoWidth || 640;
           const videoHeight = video?.videoHeight || 480;
@@ -118,7 +132,7 @@ export default function WebcamViewer() {
               // 将 21 点转为 [x, y, z] 数组格式（tasks-vision 的 image 坐标，范围 0~1）
               points: (lms[0] ?? []).map((p: any) => [p.x, p.y, p.z ?? 0]),
               image: { width: videoWidth, height: videoHeight, unit: 'norm01' },
-              mirrored: videoMirrored,  // 镜像状态（CSS transform: scaleX(-1)）
+              mirrored: false,  // detectForVideo 输出原始画面坐标，CSS 镜像（videoMirrored）只影响显示
               target_gesture: targetGesture,  // 目标手势
             }),
           );
@@ -265,6 +279,20 @@ export default function WebcamViewer() {
       }
     }
 
+    // 记录服务端推荐（拥塞时降低帧率 / 缩小 JPEG / 改用 landmarks）
+    const recommend = data?.data?.recommend;
+    if (recommend) {
+      if (recommend.source === 'frame') {
+        frameRecommendRef.current = recommend;
+      } else {
+        landmarksRecommendRef.current = recommend;
+        // landmarks 模式下整帧路径没有回复，只能由 landmarks 的推荐告知负载已回落、可以恢复整帧
+        if (recommend.mode === 'frame' && frameRecommendRef.current.mode === 'landmarks') {
+          frameRecommendRef.current = { ...frameRecommendRef.current, mode: 'frame' };
+        }
+      }
+    }
+
     // 仅保存最新消息到 ref（不立即处理，统一在 rAF 中处理）
     latestMsgRef.current = data;
 
@@ -373,6 +401,8 @@ export default function WebcamViewer() {
     }
 
     setTargetGesture(gesture);
+    frameRecommendRef.current = DEFAULT_FRAME_RECOMMEND;
+    landmarksRecommendRef.current = DEFAULT_LANDMARKS_RECOMMEND;
     setIsRecognizing(true);
     setError(null);
     
@@ -408,12 +438,14 @@ export default function WebcamViewer() {
     if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
       wsRef.current.send(JSON.stringify({ type: 'stop_recognition' }));
     }
+    frameRecommendRef.current = DEFAULT_FRAME_RECOMMEND;
+    landmarksRecommendRef.current = DEFAULT_LANDMARKS_RECOMMEND;
     setIsRecognizing(false);
     // CHANGE: keep targetGesture for resume; clear results
     setGestureResults([]);
   };
 
-  // ⚠️ 性能优化：发送帧前先缩放到 320x240（降低传输和推理成本）
+  // ⚠️ 性能优化：发送帧前先缩放（默认 320x240，服务端拥塞时按推荐缩小）
   // 任务 C：添加发送日志（限频打印）
   const frameSendCounter = useRef({ count: 0, lastLog: Date.now() });
   
@@ -425,9 +457,10 @@ export default function WebcamViewer() {
     const ctx = canvas.getContext('2d');
     if (!ctx) return;
 
-    // 缩放到 320x240（模型输入尺寸）
-    const TARGET_WIDTH = 320;
-    const TARGET_HEIGHT = 240;
+    // 缩放到推荐宽度（默认 320x240），保持 4:3
+    const { jpeg_width, jpeg_quality } = frameRecommendRef.current;
+    const TARGET_WIDTH = jpeg_width;
+    const TARGET_HEIGHT = Math.round((jpeg_width * 3) / 4);
     
     canvas.width = TARGET_WIDTH;
     canvas.height = TARGET_HEIGHT;
@@ -435,8 +468,8 @@ export default function WebcamViewer() {
     // 绘制并缩放视频帧
     ctx.drawImage(video, 0, 0, TARGET_WIDTH, TARGET_HEIGHT);
 
-    // 使用较低质量（0.6）减少传输数据量
-    const frameData = canvas.toDataURL('image/jpeg', 0.6).split(',')[1];
+    // 使用较低质量（默认 0.6）减少传输数据量
+    const frameData = canvas.toDataURL('image/jpeg', jpeg_quality).split(',')[1];
 
     if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
       // 任务 C：每 60 帧（约 3 秒）打印一次发送日志
@@ -505,17 +538,22 @@ export default function WebcamViewer() {
     console.info('Camera stopped'); // 验收标准日志
   };
 
-  // 发送帧循环（独立于渲染循环，使用 setInterval 限制发送速率）
+  // 发送帧循环（独立于渲染循环，按服务端推荐帧率调度，默认 ~20fps）
   useEffect(() => {
     if (!isStreaming || !isRecognizing) return;
 
-    // 限制发送帧率为 ~20fps（每 50ms 一帧）
-    const interval = setInterval(() => {
-      processFrame();
-    }, 50);
+    let timer: ReturnType<typeof setTimeout>;
+    const tick = () => {
+      // 服务端推荐 landmarks 模式时不再发送整帧 JPEG
+      if (frameRecommendRef.current.mode !== 'landmarks') {
+        processFrame();
+      }
+      timer = setTimeout(tick, 1000 / frameRecommendRef.current.fps);
+    };
+    timer = setTimeout(tick, 1000 / frameRecommendRef.current.fps);
 
     return () => {
-      clearInterval(interval);
+      clearTimeout(timer);
     };
   }, [isStreaming, isRecognizing, processFrame]);
 
@@ -25,6 +25,7 @@ interface GestureMessage {
     type?: string;
     hands_detected?: boolean;
     confidence?: number;
+    smoothed_confidence?: number;  // 服务端 EMA 平滑后的置信度
     target?: string;
     predicted?: string;
     landmarks_ok?: boolean;
@@ -67,6 +68,7 @@ export function useGestureScore() {
     const {
       hands_detected,
       confidence,
+      smoothed_confidence,
       target,
       predicted: predictedGesture,
       landmarks_ok,
@@ -109,11 +111,17 @@ export function useGestureScore() {
     const currentScore = Math.round(normalizedConf * 100);
     setScore(currentScore);
 
-    // EMA 平滑分数（用于进度条，alpha=0.7）
-    setSmoothScore((prevSmooth) => {
-      const newSmooth = EMA_ALPHA * currentScore + (1 - EMA_ALPHA) * prevSmooth;
-      return Math.round(newSmooth);
-    });
+    // 服务端已做 EMA 平滑时直接使用，避免前端重复平滑
+    if (smoothed_confidence !== undefined) {
+      const smoothConf = Math.max(0, Math.min(1, Number(smoothed_confidence) || 0));
+      setSmoothScore(Math.round(smoothConf * 100));
+    } else {
+      // 兼容旧服务端：前端自行 EMA 平滑分数（用于进度条，alpha=0.7）
+      setSmoothScore((prevSmooth) => {
+        const newSmooth = EMA_ALPHA * currentScore + (1 - EMA_ALPHA) * prevSmooth;
+        return Math.round(newSmooth);
+      });
+    }
 
     // 更新统计数据
     setTotal((t) => t + 1);
@@ -0,0 +1,52 @@
+#!/usr/bin/env tsx
+/**
+ * 协议契约测试的桥接端：用 server/worker_router.ts 的真实路由逻辑处理 worker 输出
+ * - stdin：worker 的 stdout（逐行 JSON）
+ * - stdout：每行一个路由事件 {event: deliver | control | dropped | raw, ...}，由 server/ml/protocol_contract.py 校验
+ * - 参数：--inactive id1,id2（已连接但未在识别的客户端，结果应被丢弃）
+ *         --pending seq1,seq2（管理通道等待回复的 seq）
+ * 用法（通常由 protocol_contract.py 启动）:
+ *     realtime_recognition.py < requests | npx tsx scripts/route_contract.ts --pending admin-1
+ */
+
+import readline from "readline";
+import { routePythonMessage } from "../server/worker_router.js";
+
+function listArg(name: string): Set<string> {
+  const i = process.argv.indexOf(name);
+  return new Set(i >= 0 && process.argv[i + 1] ? process.argv[i + 1].split(",") : []);
+}
+
+const inactive = listArg("--inactive");
+const pending = listArg("--pending");
+
+function emit(event: Record<string, any>) {
+  process.stdout.write(JSON.stringify(event) + "\n");
+}
+
+const sinks = {
+  releaseSlot: (slot: number) => emit({ event: "release", slot }),
+  resolveControl: (seq: string, msg: any) => {
+    if (!pending.delete(seq)) return false;
+    emit({ event: "resolved", seq, message: msg });
+    return true;
+  },
+  deliverResult: (clientId: string, message: any) => {
+    if (inactive.has(clientId)) return false;
+    emit({ event: "deliver", client_id: clientId, message });
+    return true;
+  },
+};
+
+const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+rl.on("line", (line) => {
+  let msg: any;
+  try {
+    msg = JSON.parse(line);
+  } catch {
+    emit({ event: "raw", line });
+    return;
+  }
+  emit({ event: routePythonMessage(msg, sinks), type: msg.type, client_id: msg.client_id, seq: msg.seq });
+});
+rl.on("close", () => emit({ event: "end", unresolved: Array.from(pending) }));
@@ -0,0 +1,56 @@
+/**
+ * 管理接口：在运行中的生产 worker 上按需剖析（转发 profile_start / profile_stop 控制消息）
+ * 需设置 ADMIN_TOKEN，请求头 Authorization: Bearer <ADMIN_TOKEN>；未设置时管理接口整体关闭（404）
+ *
+ *   POST /api/admin/profile/start  { mode?: 'cprofile' | 'sampling', duration_s?, top_n?, interval_ms?, tracemalloc? }
+ *   POST /api/admin/profile/stop   -> profile_stopped 摘要（输出文件路径 + 热点 top-N）
+ */
+import type { Express, Request, Response, NextFunction } from "express";
+import { timingSafeEqual } from "crypto";
+import type { GestureWebSocketService } from "./websocket_service.js";
+
+const ADMIN_TOKEN = process.env.ADMIN_TOKEN || "";
+
+function requireAdmin(req: Request, res: Response, next: NextFunction): void {
+  if (!ADMIN_TOKEN) {
+    res.status(404).json({ success: false, error: "Admin API disabled (ADMIN_TOKEN not set)" });
+    return;
+  }
+  const header = req.headers.authorization || "";
+  const given = Buffer.from(header.startsWith("Bearer ") ? header.slice(7) : "");
+  const expected = Buffer.from(ADMIN_TOKEN);
+  // 定长比较，避免按响应时间猜出 token
+  if (given.length !== expected.length || !timingSafeEqual(given, expected)) {
+    res.status(401).json({ success: false, error: "Unauthorized" });
+    return;
+  }
+  next();
+}
+
+/**
+ * getService：WebSocket 服务在路由注册之后才创建，这里按需取
+ */
+export function registerAdminRoutes(app: Express, getService: () => GestureWebSocketService | null) {
+  const forward = (build: (req: Request) => Record<string, any>, timeoutMs: number) =>
+    async (req: Request, res: Response): Promise<void> => {
+      const service = getService();
+      if (!service) {
+        res.status(503).json({ success: false, error: "Gesture service not started" });
+        return;
+      }
+      try {
+        const reply = await service.sendWorkerControl(build(req), timeoutMs);
+        res.status(reply.ok ? 200 : 409).json({ success: !!reply.ok, data: reply });
+      } catch (e: any) {
+        res.status(503).json({ success: false, error: e?.message || String(e) });
+      }
+    };
+
+  app.post("/api/admin/profile/start", requireAdmin, forward((req) => {
+    const { mode, duration_s, top_n, interval_ms, tracemalloc } = req.body ?? {};
+    return { type: "profile_start", mode, duration_s, top_n, interval_ms, tracemalloc };
+  }, 10_000));
+
+  // cProfile 统计写盘可能需要几秒，超时放宽
+  app.post("/api/admin/profile/stop", requireAdmin, forward(() => ({ type: "profile_stop" }), 60_000));
+}
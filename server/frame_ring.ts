@@ -0,0 +1,58 @@
+/**
+ * 共享内存帧环的写入端（布局与 server/ml/frame_ring.py 一致）
+ * - Python worker 在 FRAME_TRANSPORT=shm 时创建 /dev/shm 下的帧环，并在 ready 消息中通告
+ * - Node 用普通文件 API 打开该路径，把 JPEG 原始字节写进空闲槽位，只向 stdin 发槽位号
+ * - 槽位在收到回显 slot 的回复（结果或 slot_released）后回收；没有空闲槽位时退回 pipe 路径
+ */
+
+import fs from "fs";
+
+export interface FrameRingInfo {
+  name: string;
+  path: string;
+  slots: number;
+  slot_size: number;
+  header_bytes: number;
+}
+
+export class FrameRingWriter {
+  private fd: number;
+  private free: number[] = [];
+  private generation: number[];
+  private header = Buffer.alloc(8);
+  private stride: number;
+
+  constructor(private info: FrameRingInfo) {
+    this.fd = fs.openSync(info.path, "r+");
+    this.stride = info.header_bytes + info.slot_size;
+    this.generation = new Array(info.slots).fill(0);
+    for (let i = info.slots - 1; i >= 0; i--) this.free.push(i);
+  }
+
+  get capacity() {
+    return this.info.slot_size;
+  }
+
+  /** 写入一帧，返回 { slot, gen }；无空闲槽位或帧过大时返回 null（调用方退回 pipe 路径） */
+  write(data: Buffer): { slot: number; gen: number } | null {
+    if (data.length > this.info.slot_size || this.free.length === 0) return null;
+    const slot = this.free.pop()!;
+    const gen = (this.generation[slot] + 1) >>> 0;
+    this.generation[slot] = gen;
+    const offset = slot * this.stride;
+    // 先写数据再写头部：worker 以头部中的 length/gen 校验槽位
+    fs.writeSync(this.fd, data, 0, data.length, offset + this.info.header_bytes);
+    this.header.writeUInt32LE(data.length, 0);
+    this.header.writeUInt32LE(gen, 4);
+    fs.writeSync(this.fd, this.header, 0, 8, offset);
+    return { slot, gen };
+  }
+
+  release(slot: number) {
+    if (slot >= 0 && slot < this.info.slots && !this.free.includes(slot)) this.free.push(slot);
+  }
+
+  close() {
+    try { fs.closeSync(this.fd); } catch {}
+  }
+}
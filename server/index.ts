@@ -3,6 +3,7 @@ import { registerRoutes } from "./routes.js";
 import { setupFrontend, log } from "./vite.js";
 // ✅ 新增：引入 WebSocket 服务
 import { GestureWebSocketService } from "./websocket_service.js";
+import { registerAdminRoutes } from "./admin_routes.js";
 // ✅ CORS：允许前端域名访问 API
 import cors from "cors";
 
@@ -76,6 +77,10 @@ app.use((req, res, next) => {
   // （中文说明）registerRoutes 会返回一个 http.Server（你的工程里就是这个约定）
   const server = await registerRoutes(app);
 
+  // 管理接口（ADMIN_TOKEN 鉴权）：需在前端兜底路由之前注册，WebSocket 服务稍后创建
+  let gestureService: GestureWebSocketService | null = null;
+  registerAdminRoutes(app, () => gestureService);
+
   app.use((err: any, _req: Request, res: Response, _next: NextFunction) => {
     const status = err.status || err.statusCode || 500;
     const message = err.message || "Internal Server Error";
@@ -88,7 +93,7 @@ app.use((req, res, next) => {
 
   // ✅ 关键：把 WebSocket 服务"挂载"到同一个 server 上（与 Express 复用端口）
   //    这行之前一直缺失，导致前端连不上 ws://localhost:4000/ws/gesture
-  new GestureWebSocketService(server);
+  gestureService = new GestureWebSocketService(server);
 
   // ✅ 监听 4000 (或 PORT)，并承载 API + 前端 + WebSocket
   // Environment-adaptive server listener (works on both local & Render)
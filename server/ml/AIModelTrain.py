@@ -1,24 +1,38 @@
 # -*- coding: utf-8 -*-
 """
 AIModelTrain.py
-Train a simple KNN model for ASL gesture classification.
+Train ASL gesture classifiers (KNN + fixed-cost NumPy backends).
 
 中文说明：
 - 读取采集到的关键点CSV（优先：dataset/asl_dataset.csv；否则：asl_dataset.csv）
 - 特征顺序与实时推理脚本一致：先所有 x，再所有 y，再所有 z（21点 * 3轴 = 63维）
-- 训练 KNN(k=3) 并打印准确率，保存到同目录的 asl_knn_model.pkl
+- 训练集先做关键点增强（augment.py：旋转 / 3D 倾斜 / 缩放 / 平移 / 手指扰动 / 抖动），测试集保持原样
+- 训练 KNN(k=3)，参考集由增强后的样本按类 k-means 选代表样本（规模可控），保存到同目录的 asl_knn_model.pkl
+- 级联 KNN（类中心预筛 + 候选类精确 KNN）直接由 KNN 参考样本构建，worker 加载时生成
+- 练习模式的目标验证器（asl_verifier.npz）：只用训练集——交叉验证混淆矩阵为每类选出易混类，
+  折外距离差拟合匹配概率的逻辑回归校准与接受阈值；留出集上精度不达标时不保存（练习模式回退到普通分类）
+- 同时训练多原型最近中心（asl_centroid_model.npz）和小 MLP（asl_mlp_model.npz），
+  推理只需 NumPy；打印各模型的准确率与单帧延迟对比，便于选择满足精度要求的最便宜模型；
+  留出集准确率比 KNN 低超过 MAX_DROP 的后端不保存
 """
 
 import os
 import sys
 import csv
+import time
+import argparse
 import numpy as np
 from collections import Counter
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedKFold, train_test_split
 from sklearn.neighbors import KNeighborsClassifier
-from sklearn.metrics import accuracy_score
+from sklearn.neural_network import MLPClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, confusion_matrix
 import joblib
 
+from classifiers import CascadeKNNBackend, NearestCentroidBackend, MLPBackend, TargetVerifier, group_by_label
+from augment import augment, prune_references
+
 # -----------------------------
 # 路径设置（使用绝对路径更稳）
 # -----------------------------
@@ -28,6 +42,11 @@ DATASET_CANDIDATES = [
     os.path.join(BASE_DIR, "asl_dataset.csv"),             # 兼容：历史旧路径
 ]
 MODEL_PATH = os.path.join(BASE_DIR, "asl_knn_model.pkl")
+CENTROID_MODEL_PATH = os.path.join(BASE_DIR, "asl_centroid_model.npz")
+MLP_MODEL_PATH = os.path.join(BASE_DIR, "asl_mlp_model.npz")
+MAX_DROP = 0.02  # 相对 KNN 准确率的最大下降（与 golden_eval.py 的默认阈值一致），超过则不发布
+VERIFIER_PATH = os.path.join(BASE_DIR, "asl_verifier.npz")
+GOLDEN_PATH = os.path.join(BASE_DIR, "asl_golden.npz")  # golden_eval.py build 冻结的留出集
 
 def find_dataset_path() -> str:
     """Return the first existing dataset path or exit with a helpful message."""
@@ -91,7 +110,94 @@ def load_dataset(csv_path: str):
     y = np.array(y)
     return X, y
 
+def measure_latency_ms(model, X, repeats=3):
+    """单帧推理延迟（毫秒，逐行调用 predict_proba 取中位数，与 worker 的调用方式一致）"""
+    timings = []
+    for _ in range(repeats):
+        for row in X:
+            t0 = time.perf_counter()
+            model.predict_proba(row[None, :])
+            timings.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(timings))
+
+def evaluate(name, model, X_test, y_test, path):
+    """返回一行报告：准确率 + 单帧延迟"""
+    acc = accuracy_score(y_test, model.predict(X_test))
+    return {"name": name, "accuracy": acc, "latency_ms": measure_latency_ms(model, X_test), "path": path}
+
+def knn_references(X, y, copies, per_class):
+    """KNN 参考集：增强后按类剪枝（copies=0 时为原样本，per_class=0 时保留全部增强样本）"""
+    if copies <= 0:
+        return X, y
+    X_fit, y_fit = augment(X, y, copies, seed=42)
+    return prune_references(X_fit, y_fit, per_class) if per_class > 0 else (X_fit, y_fit)
+
+def train_verifier(X_train, y_train, X_test, y_test, baseline_acc, references=knn_references,
+                   n_confusable=3, max_drop=MAX_DROP, folds=5):
+    """
+    目标验证器（只用训练集拟合，测试集 / golden 集只用于最终评估）：
+    1. 训练集 folds 折交叉验证 KNN 的混淆矩阵 -> 每类最易混的 n_confusable 个类
+       （references(X, y) 与发布的 KNN 用同样方式由训练样本生成参考集）
+    2. 交叉拟合：每折以其余折生成的参考集为参考样本，计算 (样本, 目标) 对的折外距离差；
+       目标为样本真实类别（正例）或把该类列为易混类的目标（负例），用折外距离差拟合逻辑回归校准
+    3. 接受阈值：在折外正例上，取使“目标手势被接受的比例”不低于 KNN 折外准确率的最大阈值，
+       即练习模式拒绝的正确手势不多于 KNN 本身会认错的
+    4. 最终参考样本由全部训练集生成；测试集上目标手势被接受的比例与 baseline_acc（发布的 KNN 的测试准确率）相比，
+       下降超过 max_drop（与 golden_eval.py 的默认阈值一致）时 deployable=False，不应发布
+    返回 (verifier, 折外配对准确率, 测试集接受率, 单次验证延迟 ms, deployable)
+    """
+    classes = np.unique(y_train)
+    index = {c: i for i, c in enumerate(classes)}
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(X_train, y_train))
+    fold_refs = [references(X_train[fit_idx], y_train[fit_idx]) for fit_idx, _ in splits]
+    cv_pred = np.empty_like(y_train)
+    for (_, held_idx), (X_ref, y_ref) in zip(splits, fold_refs):
+        cv_pred[held_idx] = KNeighborsClassifier(n_neighbors=3).fit(X_ref, y_ref).predict(X_train[held_idx])
+    knn_cv_acc = float(np.mean(cv_pred == y_train))
+    confusables = TargetVerifier.confusables_from_matrix(
+        confusion_matrix(y_train, cv_pred, labels=classes), n_confusable)
+
+    diffs, labels = [], []
+    for (_, held_idx), fold_ref in zip(splits, fold_refs):
+        fold = TargetVerifier(*group_by_label(*fold_ref), confusables)
+        for x, c in zip(X_train[held_idx], y_train[held_idx]):
+            ci = index[c]
+            targets = [ci] + [t for t in range(len(classes)) if t != ci and ci in confusables[t]]
+            for t in targets:
+                diffs.append(fold.margin(x, str(classes[t]))[0])
+                labels.append(int(t == ci))
+    diffs, labels = np.array(diffs)[:, None], np.array(labels)
+    calib = LogisticRegression().fit(diffs, labels)
+    verifier = TargetVerifier(*group_by_label(*references(X_train, y_train)), confusables,
+                              coef=float(calib.coef_[0, 0]), intercept=float(calib.intercept_[0]))
+
+    # 阈值：折外正例的匹配概率取 (1 - KNN 折外准确率) 分位数，且不高于 0.5
+    pos_prob = calib.predict_proba(diffs[labels == 1])[:, 1]
+    verifier.threshold = float(min(0.5, np.quantile(pos_prob, 1.0 - knn_cv_acc, method='lower')))
+    pair_acc = accuracy_score(labels, calib.predict_proba(diffs)[:, 1] >= verifier.threshold)
+
+    timings, accepted = [], []
+    for x, c in zip(X_test, y_test):
+        t0 = time.perf_counter()
+        prob, _ = verifier.verify(x, str(c))
+        timings.append((time.perf_counter() - t0) * 1000)
+        accepted.append(prob >= verifier.threshold)
+    accept_rate = float(np.mean(accepted))
+    deployable = accept_rate >= baseline_acc - max_drop
+    return verifier, pair_acc, accept_rate, float(np.median(timings)), deployable
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train ASL gesture classifiers")
+    parser.add_argument("--prototypes", type=int, default=3, help="每类原型数（centroid 后端）")
+    parser.add_argument("--hidden", type=int, default=64, help="MLP 隐层宽度")
+    parser.add_argument("--accuracy-bar", type=float, default=0.9, help="部署所需的最低准确率")
+    parser.add_argument("--augment", type=int, default=10, help="每个训练样本生成的增强样本数（0 表示不增强）")
+    parser.add_argument("--references-per-class", type=int, default=24,
+                        help="KNN 每类保留的参考样本数（0 表示保留全部增强样本）")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     csv_path = find_dataset_path()
     print(f"📄 Using dataset: {csv_path}")
 
@@ -111,18 +217,91 @@ def main():
         X, y, test_size=0.2, random_state=42, stratify=stratify
     )
 
-    # 训练 KNN（保持与在线推理一致的简洁模型）
+    # golden 集永远不进入训练（数据集增长后切分会变化，按样本内容排除）
+    if os.path.exists(GOLDEN_PATH):
+        with np.load(GOLDEN_PATH, allow_pickle=False) as golden:
+            held_out = {row.tobytes() for row in golden["X"].astype(np.float32)}
+        keep = np.array([row.tobytes() not in held_out for row in X_train], dtype=bool)
+        if not keep.all():
+            print(f"Excluded {int((~keep).sum())} golden samples from training")
+        X_train, y_train = X_train[keep], y_train[keep]
+
+    # 数据增强：只扩充训练集，测试集保持真实采集的样本
+    X_fit, y_fit = X_train, y_train
+    if args.augment > 0:
+        t0 = time.perf_counter()
+        X_fit, y_fit = augment(X_train, y_train, args.augment, seed=42)
+        print(f"Augmented training set: {len(y_train)} -> {len(y_fit)} samples "
+              f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+    # 训练 KNN（保持与在线推理一致的简洁模型）；参考集按类剪枝，推理代价不随增强倍数增长
+    X_ref, y_ref = X_fit, y_fit
+    if args.augment > 0 and args.references_per_class > 0:
+        X_ref, y_ref = prune_references(X_fit, y_fit, args.references_per_class)
+        print(f"KNN references: {len(y_ref)} ({args.references_per_class} per class)")
     model = KNeighborsClassifier(n_neighbors=3)
-    model.fit(X_train, y_train)
+    model.fit(X_ref, y_ref)
 
-    # 评估
-    y_pred = model.predict(X_test)
-    acc = accuracy_score(y_test, y_pred)
-    print(f"Model accuracy: {acc:.4f}")
+    # 固定代价后端：多原型最近中心 + 单隐层 MLP（推理只用 NumPy）
+    centroid = NearestCentroidBackend.fit(X_fit, y_fit, prototypes_per_class=args.prototypes)
+    mlp = MLPBackend.from_sklearn(
+        MLPClassifier(hidden_layer_sizes=(args.hidden,), max_iter=2000, random_state=42).fit(X_fit, y_fit)
+    )
+
+    # 评估：准确率与单帧延迟并列
+    cascade = CascadeKNNBackend.from_sklearn(model)
+    report = [
+        evaluate("knn", model, X_test, y_test, MODEL_PATH),
+        evaluate("cascade", cascade, X_test, y_test, MODEL_PATH),
+        evaluate("centroid", centroid, X_test, y_test, CENTROID_MODEL_PATH),
+        evaluate("mlp", mlp, X_test, y_test, MLP_MODEL_PATH),
+    ]
+    print(f"{'backend':<10}{'accuracy':>10}{'latency_ms':>12}")
+    for r in report:
+        print(f"{r['name']:<10}{r['accuracy']:>10.4f}{r['latency_ms']:>12.3f}")
+    agreement = float(np.mean(cascade.predict(X_test) == model.predict(X_test)))
+    stats = cascade.stats()
+    print(f"cascade: scanned {stats['scanned_ratio']:.2%} of references, "
+          f"pruning fallback rate {stats['fallback_rate']:.2%}, agreement with knn {agreement:.2%}")
 
-    # 保存模型
+    # 目标验证器（练习模式热路径）
+    verifier, pair_acc, accept_rate, verify_ms, deployable = train_verifier(
+        X_train, y_train, X_test, y_test, baseline_acc=report[0]["accuracy"],
+        references=lambda Xa, ya: knn_references(Xa, ya, args.augment, args.references_per_class))
+    print(f"verifier: out-of-fold pair accuracy {pair_acc:.4f}, threshold {verifier.threshold:.3f}, "
+          f"test acceptance {accept_rate:.4f} (knn {report[0]['accuracy']:.4f}), latency {verify_ms:.3f} ms")
+
+    # 保存模型；固定代价后端 / 验证器精度不达标时不发布，并删除旧文件
+    # （对应的 MODEL_BACKEND 不可用，VERIFY_MODE 下 worker 回退到普通分类）
     joblib.dump(model, MODEL_PATH)
-    print(f"Model saved to: {MODEL_PATH}")
+    saved = [MODEL_PATH]
+    for r, backend in ((report[2], centroid), (report[3], mlp)):
+        if r["accuracy"] >= report[0]["accuracy"] - MAX_DROP:
+            backend.save(r["path"])
+            saved.append(r["path"])
+        else:
+            if os.path.exists(r["path"]):
+                os.remove(r["path"])
+            print(f"{r['name']} not saved: accuracy {r['accuracy']:.4f} regresses against knn "
+                  f"{report[0]['accuracy']:.4f} by more than {MAX_DROP}")
+    if deployable:
+        verifier.save(VERIFIER_PATH)
+        saved.append(VERIFIER_PATH)
+    else:
+        if os.path.exists(VERIFIER_PATH):
+            os.remove(VERIFIER_PATH)
+        print("verifier not saved: test acceptance regresses against knn, VERIFY_MODE stays unavailable")
+    for path in saved:
+        print(f"Model saved to: {path}")
+
+    # 满足精度要求的最便宜模型（MODEL_BACKEND 环境变量选择 worker 使用的后端）
+    eligible = [r for r in report if r["accuracy"] >= args.accuracy_bar]
+    if eligible:
+        best = min(eligible, key=lambda r: r["latency_ms"])
+        print(f"Cheapest backend meeting accuracy >= {args.accuracy_bar}: {best['name']} "
+              f"(MODEL_BACKEND={best['name']})")
+    else:
+        print(f"No backend meets accuracy >= {args.accuracy_bar}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+关键点数据增强（全部向量化，一次处理整批样本）
+输入/输出都是训练与推理使用的 63 维特征：[21 个 x] + [21 个 y] + [21 个 z]
+
+每个增强样本依次施加（参数逐样本独立采样）:
+    mirror   —— 以手部中心为轴水平翻转（左右手）
+    rotate   —— 绕手腕的平面内旋转（按图像宽高比在像素空间旋转，避免拉伸）
+    tilt     —— 绕 x / y 轴的小角度 3D 旋转（手掌俯仰 / 偏转）
+    scale    —— 以手腕为中心缩放（离摄像头远近）
+    shift    —— 整体平移（手在画面中的位置）
+    finger   —— 每根手指绕其根部关节独立小角度弯曲/张开
+    jitter   —— 逐点噪声（关键点检测抖动，jitter 为标准差）
+原始坐标是否归一化都可以用：旋转与缩放都以手腕为中心，不依赖绝对位置
+
+用途:
+    augment()           一次生成 copies 倍数据（AIModelTrain.py --augment）
+    iter_augmented()    分批生成任意数量样本（百万级，内存只占一批）
+    prune_references()  把增强后的大集合压缩成每类少量代表样本（KNN / 级联的参考集保持原有规模）
+
+用法（吞吐基准）:
+    python server/ml/augment.py [--samples 2000000] [--batch 65536]
+"""
+import argparse
+import time
+
+import numpy as np
+
+N_POINTS = 21
+WRIST = 0
+# 每根手指的 [根部, 第二, 第三, 指尖] 关节下标（MediaPipe Hands）
+FINGERS = np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [13, 14, 15, 16], [17, 18, 19, 20]])
+
+DEFAULTS = {
+    'mirror_prob': 0.0,     # 数据集只采了右手；需要覆盖左手时调大
+    'rotate_deg': 15.0,
+    'tilt_deg': 10.0,
+    'scale': 0.1,
+    'shift': 0.05,
+    'finger_deg': 6.0,
+    'jitter': 0.004,
+    'aspect': 640 / 480,    # 图像宽 / 高：x、y 归一化尺度不同
+}
+
+
+def _planes(X):
+    """(N, 63) 特征 -> (3, 21, N) 的 x / y / z 平面（样本维放在最后，逐样本参数沿最内层连续广播）"""
+    return np.ascontiguousarray(np.asarray(X, dtype=np.float32).reshape(-1, 3, N_POINTS).transpose(1, 2, 0))
+
+
+def _uniform(rng, limit, shape):
+    """[-limit, limit) 均匀分布（float32，原地运算避免临时数组）"""
+    r = rng.random(shape, dtype=np.float32)
+    r -= np.float32(0.5)
+    r *= np.float32(2 * limit)
+    return r
+
+
+def augment_features(X, rng, **params):
+    """
+    对 (N, 63) 特征施加一组随机变换，返回新的 (N, 63) float32 数组
+    在 x / y / z 三个 (21, N) 平面上做逐元素运算：平面内旋转、3D 倾斜与缩放合成为
+    每个样本一个 3x3 矩阵，一次乘加完成
+    """
+    cfg = dict(DEFAULTS, **params)
+    F = _planes(X)
+    n = F.shape[2]
+    aspect = np.float32(cfg['aspect'])
+    x, y, z = F
+    x *= aspect  # 转到各向同性的像素比例空间
+
+    # 以手腕为原点
+    wx, wy, wz = x[WRIST].copy(), y[WRIST].copy(), z[WRIST].copy()
+    x -= wx
+    y -= wy
+    z -= wz
+
+    if cfg['mirror_prob'] > 0:
+        # 以手部中心为轴翻转：相对坐标取反，手腕移到关于中心的对称位置
+        flip = rng.random(n) < cfg['mirror_prob']
+        sign = np.where(flip, np.float32(-1), np.float32(1))
+        wx += np.where(flip, 2 * x.mean(axis=0), np.float32(0))
+        x *= sign
+
+    if cfg['finger_deg'] > 0:
+        # 手指关节在特征中连续存放（1-4, 5-8, ...），reshape 成 (5, 4, N) 视图后绕根部关节旋转
+        theta = np.deg2rad(_uniform(rng, cfg['finger_deg'], (len(FINGERS), 1, n)))
+        c, s = np.cos(theta), np.sin(theta)
+        fx, fy = x[1:].reshape(5, 4, n), y[1:].reshape(5, 4, n)
+        bx, by = fx[:, :1].copy(), fy[:, :1].copy()
+        jx, jy = fx[:, 1:] - bx, fy[:, 1:] - by
+        fx[:, 1:] = jx * c - jy * s + bx
+        fy[:, 1:] = jx * s + jy * c + by
+
+    # 合成矩阵 M = scale * Rz(rotate) @ R(tilt)
+    a = np.deg2rad(_uniform(rng, cfg['tilt_deg'], n))
+    b = np.deg2rad(_uniform(rng, cfg['tilt_deg'], n))
+    ca, sa, cb, sb = np.cos(a), np.sin(a), np.cos(b), np.sin(b)
+    zero = np.zeros(n, dtype=np.float32)
+    R0 = (cb, zero, sb)
+    R1 = (sa * sb, ca, -sa * cb)
+    R2 = (-ca * sb, sa, ca * cb)
+    t = np.deg2rad(_uniform(rng, cfg['rotate_deg'], n))
+    ct, st = np.cos(t), np.sin(t)
+    k = 1 + _uniform(rng, cfg['scale'], n)
+    M = [[k * (ct * R0[j] - st * R1[j]) for j in range(3)],
+         [k * (st * R0[j] + ct * R1[j]) for j in range(3)],
+         [k * R2[j] for j in range(3)]]
+
+    if cfg['shift'] > 0:
+        wx += _uniform(rng, cfg['shift'], n)
+        wy += _uniform(rng, cfg['shift'], n)
+
+    out = np.empty((n, 3, N_POINTS), dtype=np.float32)
+    plane = np.empty((N_POINTS, n), dtype=np.float32)
+    tmp = np.empty_like(plane)
+    for i, w in enumerate((wx, wy, wz)):
+        np.multiply(x, M[i][0], out=plane)
+        plane += np.multiply(y, M[i][1], out=tmp)
+        plane += np.multiply(z, M[i][2], out=tmp)
+        plane += w
+        if i == 0:
+            plane /= aspect
+        out[:, i] = plane.T
+
+    if cfg['jitter'] > 0:
+        # 均匀噪声（与高斯同方差）：生成代价约为正态分布的 1/4
+        out += _uniform(rng, np.float32(cfg['jitter'] * np.sqrt(3)), out.shape)
+    return out.reshape(n, 3 * N_POINTS)
+
+
+def augment(X, y, copies, seed=0, include_original=True, **params):
+    """
+    每个样本生成 copies 个增强样本，返回 (X_aug, y_aug)
+    include_original=True 时原始样本排在最前面
+    """
+    rng = np.random.default_rng(seed)
+    X = np.asarray(X, dtype=np.float32)
+    idx = np.repeat(np.arange(len(X)), copies)
+    X_aug = augment_features(X[idx], rng, **params)
+    y_aug = np.asarray(y)[idx]
+    if include_original:
+        X_aug = np.vstack([X, X_aug])
+        y_aug = np.concatenate([np.asarray(y), y_aug])
+    return X_aug, y_aug
+
+
+def iter_augmented(X, y, total, batch=1 << 16, seed=0, **params):
+    """分批生成共 total 个增强样本（每批从原始样本中有放回抽样）"""
+    rng = np.random.default_rng(seed)
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    produced = 0
+    while produced < total:
+        n = min(batch, total - produced)
+        idx = rng.integers(0, len(X), n)
+        yield augment_features(X[idx], rng, **params), y[idx]
+        produced += n
+
+
+def prune_references(X, y, per_class, iters=20, seed=0):
+    """
+    每类用 k-means 选出 per_class 个代表样本（取离各中心最近的真实样本，而不是中心本身）
+    返回 (X_ref, y_ref)，类别顺序与 np.unique(y) 一致
+    """
+    from classifiers import NearestCentroidBackend
+
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    model = NearestCentroidBackend.fit(X, y, prototypes_per_class=per_class, iters=iters, seed=seed)
+    X_ref, y_ref = [], []
+    for ci, c in enumerate(model.classes_):
+        Xc = X[y == c]
+        centers = model.prototypes[model.proto_labels == ci]
+        d2 = (Xc ** 2).sum(axis=1)[None, :] - 2.0 * centers @ Xc.T
+        picks = np.unique(d2.argmin(axis=1))
+        X_ref.append(Xc[picks])
+        y_ref.extend([c] * len(picks))
+    return np.vstack(X_ref), np.asarray(y_ref)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Landmark augmentation throughput')
+    parser.add_argument('--samples', type=int, default=2_000_000)
+    parser.add_argument('--batch', type=int, default=1 << 16)
+    args = parser.parse_args()
+
+    from AIModelTrain import find_dataset_path, load_dataset
+    X, y = load_dataset(find_dataset_path())
+    start = time.perf_counter()
+    produced = 0
+    for X_aug, _ in iter_augmented(X, y, args.samples, batch=args.batch):
+        produced += len(X_aug)
+    elapsed = time.perf_counter() - start
+    print(f"augmented {produced} samples in {elapsed:.2f}s ({produced / elapsed / 1e6:.2f}M samples/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+离线批量打分：对录制的视频 / 图片目录重新跑识别（模型更新后重评历史练习片段）
+- 进程池：每个进程 import 一次 realtime_recognition，即一份模型
+  （MODEL_BACKEND 等环境变量与在线 worker 完全一致）
+- 任务粒度：一个视频一个任务（保持 MediaPipe 跟踪的时间连续性），图片按 --chunk 张一组
+- MediaPipe 实例：每个进程只有 realtime_recognition 自己的一个 Hands（get_hands()）
+  视频与图片分两轮进程池：视频池为跟踪模式，每个视频开始前 reset()（跟踪状态不会从上一个视频带过来）；
+  图片池设置 HANDS_STATIC_IMAGE_MODE=true（互不相关的图片逐张独立检测）
+- 每个任务内先检测全部帧，再对检测到手的帧做一次批量 predict_proba
+- 结果按任务完成顺序流式写入列式文件（内存占用与单个任务成正比）：
+    .parquet —— 每个任务一个 row group（需要 pyarrow）
+    .npz     —— 仅依赖 numpy，每个任务追加到临时列文件，结束时经 memmap 分块打包
+                （source / predicted 做字典编码）
+- 结束时输出 JSON 汇总：总帧数、墙钟 fps、每核 fps（帧数 / 各进程 CPU 时间之和）
+
+用法:
+    python server/ml/batch_score.py clips/ frames_dir/ a.mp4 -o scores.parquet [--workers 4]
+                                    [--stride 1] [--chunk 64] [--backend knn]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+VIDEO_EXTS = {'.mp4', '.avi', '.mov', '.mkv', '.webm'}
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+COLUMNS = ('source', 'frame', 'ts_ms', 'hands_detected', 'landmarks_ok', 'predicted', 'confidence')
+
+# 进程内的识别模块（_init_worker 中导入：每个进程一份模型、一个 Hands）
+rr = None
+
+
+def _init_worker():
+    global rr
+    import realtime_recognition
+    rr = realtime_recognition
+
+
+def collect_tasks(inputs, chunk):
+    """展开输入：视频 -> ('video', path)，图片按目录分组后切块 -> ('images', [paths])"""
+    tasks = []
+    for item in inputs:
+        if os.path.isdir(item):
+            videos, images = [], []
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    ext = os.path.splitext(name)[1].lower()
+                    if ext in VIDEO_EXTS:
+                        videos.append(os.path.join(root, name))
+                    elif ext in IMAGE_EXTS:
+                        images.append(os.path.join(root, name))
+            tasks.extend(('video', v) for v in videos)
+            tasks.extend(('images', images[i:i + chunk]) for i in range(0, len(images), chunk))
+        elif os.path.splitext(item)[1].lower() in VIDEO_EXTS:
+            tasks.append(('video', item))
+        elif os.path.splitext(item)[1].lower() in IMAGE_EXTS:
+            tasks.append(('images', [item]))
+        else:
+            print(json.dumps({'type': 'warning', 'message': f'skipped unsupported input: {item}'}), file=sys.stderr)
+    return tasks
+
+
+def _task_hands(kind):
+    """进程内唯一的 Hands；视频任务开始前清空跟踪状态（图片池为静态模式，无跨帧状态）"""
+    hands = rr.get_hands()
+    if kind == 'video':
+        hands.reset()
+    return hands
+
+
+def _iter_frames(kind, target, stride):
+    """逐帧产出 (source, frame_index, ts_ms, bgr)"""
+    if kind == 'video':
+        cap = cv2.VideoCapture(target)
+        index = 0
+        try:
+            while True:
+                ok = cap.grab()
+                if not ok:
+                    break
+                if index % stride == 0:
+                    ok, frame = cap.retrieve()
+                    if ok:
+                        yield target, index, cap.get(cv2.CAP_PROP_POS_MSEC), frame
+                index += 1
+        finally:
+            cap.release()
+    else:
+        for path in target:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield path, 0, 0.0, frame
+
+
+def score_task(task, stride=1):
+    """
+    在池进程中处理一个任务，返回 (列字典, 帧数, CPU 秒, 进程号)
+    predicted 为类别下标（-1 表示未检测到手或无模型）
+    """
+    kind, target = task
+    cpu_start = time.process_time()
+    sources, frames, ts, detected, quality, vectors = [], [], [], [], [], []
+    hands = _task_hands(kind)
+    for source, index, ts_ms, bgr in _iter_frames(kind, target, stride):
+        results = hands.process(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+        hand = results.multi_hand_landmarks[0] if results.multi_hand_landmarks else None
+        sources.append(source)
+        frames.append(index)
+        ts.append(ts_ms)
+        detected.append(hand is not None)
+        quality.append(bool(rr.check_landmarks_quality(hand)[0]) if hand is not None else False)
+        vectors.append(rr.extract_landmarks(hand) if hand is not None else None)
+
+    n = len(frames)
+    predicted = np.full(n, -1, dtype=np.int16)
+    confidence = np.zeros(n, dtype=np.float32)
+    hit = [i for i, v in enumerate(vectors) if v is not None]
+    if hit and rr.model is not None:
+        # 与在线路径相同的分类器，批量一次推理
+        probs = rr.model.predict_proba(np.asarray([vectors[i] for i in hit], dtype=np.float32))
+        predicted[hit] = np.argmax(probs, axis=1)
+        confidence[hit] = probs.max(axis=1)
+    columns = {
+        'source': sources,
+        'frame': np.asarray(frames, dtype=np.int32),
+        'ts_ms': np.asarray(ts, dtype=np.float32),
+        'hands_detected': np.asarray(detected, dtype=bool),
+        'landmarks_ok': np.asarray(quality, dtype=bool),
+        'predicted': predicted,
+        'confidence': confidence,
+    }
+    return columns, n, time.process_time() - cpu_start, os.getpid()
+
+
+def _score_task_star(args):
+    return score_task(*args)
+
+
+def _model_classes():
+    return [str(c) for c in rr.model.classes_] if rr is not None and rr.model is not None else []
+
+
+class ParquetColumnWriter:
+    """每批结果写一个 row group（流式，内存占用与单个任务成正比）"""
+
+    def __init__(self, path, classes):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('pyarrow is required for .parquet output (pip install pyarrow), or use a .npz path')
+        self.pa = pa
+        self.classes = np.asarray(classes + [None], dtype=object)  # 下标 -1 -> None
+        self.writer = None
+        self.path = path
+        self.pq = pq
+
+    def write(self, columns):
+        pa = self.pa
+        table = pa.table({
+            'source': pa.array(columns['source'], type=pa.string()),
+            'frame': columns['frame'],
+            'ts_ms': columns['ts_ms'],
+            'hands_detected': columns['hands_detected'],
+            'landmarks_ok': columns['landmarks_ok'],
+            'predicted': pa.array(self.classes[columns['predicted']], type=pa.string()),
+            'confidence': columns['confidence'],
+        })
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class NpzColumnWriter:
+    """
+    仅依赖 numpy：每批结果追加到临时目录下的原始列文件（内存只保留当前批），
+    结束时以 memmap 打开，np.savez_compressed 分块写入 .npz；source 存为 source_id + sources 字典
+    """
+    DTYPES = {'source_id': np.int32, 'frame': np.int32, 'ts_ms': np.float32, 'hands_detected': bool,
+              'landmarks_ok': bool, 'predicted': np.int16, 'confidence': np.float32}
+
+    def __init__(self, path, classes):
+        self.path = path
+        self.classes = classes
+        self.sources = {}
+        self.rows = 0
+        self.tmp = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path)))
+        self.files = {name: open(os.path.join(self.tmp.name, name), 'wb') for name in self.DTYPES}
+
+    def write(self, columns):
+        ids = [self.sources.setdefault(s, len(self.sources)) for s in columns['source']]
+        for name, values in [('source_id', ids)] + [(name, columns[name]) for name in COLUMNS[1:]]:
+            np.asarray(values, dtype=self.DTYPES[name]).tofile(self.files[name])
+        self.rows += len(ids)
+
+    def close(self):
+        try:
+            arrays = {}
+            for name, f in self.files.items():
+                f.close()
+                dtype = self.DTYPES[name]
+                arrays[name] = (np.memmap(f.name, dtype=dtype, mode='r', shape=(self.rows,)) if self.rows
+                                else np.zeros(0, dtype=dtype))
+            np.savez_compressed(self.path, sources=np.asarray(list(self.sources), dtype=str),
+                                classes=np.asarray(self.classes, dtype=str), **arrays)
+            del arrays  # 先释放 memmap，再删除临时文件
+        finally:
+            self.tmp.cleanup()
+
+
+WRITERS = {'.parquet': ParquetColumnWriter, '.npz': NpzColumnWriter}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch-score recorded videos and image folders')
+    parser.add_argument('inputs', nargs='+', help='视频文件 / 图片文件 / 目录（递归）')
+    parser.add_argument('-o', '--output', required=True, help='输出文件（.parquet 或 .npz）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--stride', type=int, default=1, help='视频每隔 N 帧取一帧')
+    parser.add_argument('--chunk', type=int, default=64, help='每个图片任务的图片数')
+    parser.add_argument('--backend', default=None, help='覆盖 MODEL_BACKEND（knn / cascade / centroid / mlp）')
+    args = parser.parse_args()
+
+    writer_cls = WRITERS.get(os.path.splitext(args.output)[1].lower())
+    if writer_cls is None:
+        parser.error('output must end with .parquet or .npz')
+    if args.backend:
+        os.environ['MODEL_BACKEND'] = args.backend
+    os.environ.setdefault('WORKER_LOG_LEVEL', 'warning')
+
+    tasks = collect_tasks(args.inputs, args.chunk)
+    if not tasks:
+        parser.error('no videos or images found')
+
+    # spawn：每个进程独立导入 MediaPipe（fork 后共享 MediaPipe 图状态不安全，Windows 也只支持 spawn）
+    # 视频与图片分两轮进程池，每个进程只有一个对应模式的 Hands（环境变量在 spawn 时继承）
+    ctx = mp.get_context('spawn')
+    start = time.perf_counter()
+    total_frames, cpu_seconds, per_process = 0, 0.0, {}
+    writer = None
+    try:
+        for kind, static in (('video', 'false'), ('images', 'true')):
+            kind_tasks = [task for task in tasks if task[0] == kind]
+            if not kind_tasks:
+                continue
+            os.environ['HANDS_STATIC_IMAGE_MODE'] = static
+            with ctx.Pool(processes=min(args.workers, len(kind_tasks)), initializer=_init_worker) as pool:
+                if writer is None:
+                    writer = writer_cls(args.output, pool.apply(_model_classes))
+                jobs = ((task, args.stride) for task in kind_tasks)
+                for columns, n, cpu_s, pid in pool.imap_unordered(_score_task_star, jobs):
+                    if n:
+                        writer.write(columns)
+                    total_frames += n
+                    cpu_seconds += cpu_s
+                    frames_pid, cpu_pid = per_process.get(pid, (0, 0.0))
+                    per_process[pid] = (frames_pid + n, cpu_pid + cpu_s)
+    finally:
+        if writer is not None:
+            writer.close()
+    wall = time.perf_counter() - start
+
+    print(json.dumps({
+        'type': 'batch_summary',
+        'output': args.output,
+        'tasks': len(tasks),
+        'frames': total_frames,
+        'workers': args.workers,
+        'wall_s': round(wall, 2),
+        'fps': round(total_frames / wall, 2) if wall else 0.0,
+        'fps_per_core': round(total_frames / cpu_seconds, 2) if cpu_seconds else 0.0,
+        'per_process_fps': [round(f / c, 2) if c else 0.0 for f, c in per_process.values()],
+    }))
+
+
+if __name__ == '__main__':
+    main()
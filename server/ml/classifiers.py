@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+分类器后端（推理只依赖 NumPy）
+所有后端与 sklearn 分类器保持同样的接口，worker 可以直接替换：
+    classes_            类别标签数组
+    predict_proba(X)    (N, n_classes) 概率
+    predict(X)          (N,) 标签
+
+后端:
+    knn       —— sklearn KNeighborsClassifier（.pkl，代价随参考样本数线性增长）
+    centroid  —— 每类多原型最近中心（固定 P 个原型，代价恒定）
+    mlp       —— 单隐层 MLP，前向只做两次矩阵乘（代价恒定）
+    cascade   —— 粗到细级联：类中心预筛候选类做精确 KNN，三角不等式剪枝补齐，结果与全量 KNN 一致
+    knn_online —— 可在线追加样本的 KNN（add_samples 消息 + 追加日志，周期性压缩为 .npz）
+
+centroid / mlp 以 .npz 保存（纯数组，无 pickle），由 AIModelTrain.py 训练导出
+"""
+import os
+
+import numpy as np
+
+
+class ClassifierBackend:
+    """后端基类：子类实现 predict_proba，predict 取概率最大的类别"""
+    kind = None
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def predict_proba(self, X):
+        raise NotImplementedError
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def arrays(self):
+        """需要保存到 .npz 的数组（不含 kind / classes）"""
+        raise NotImplementedError
+
+    def save(self, path):
+        np.savez(path, kind=self.kind, classes=self.classes_, **self.arrays())
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    e = np.exp(logits)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def group_by_label(X, y):
+    """按类别排序样本，返回 (classes, 分组后的样本, 每类起止偏移)"""
+    classes, inverse = np.unique(y, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    offsets = np.r_[0, np.cumsum(np.bincount(inverse, minlength=len(classes)))]
+    return classes, np.asarray(X, dtype=np.float32)[order], offsets
+
+
+class NearestCentroidBackend(ClassifierBackend):
+    """
+    每类若干原型（k-means 中心），按到各类最近原型的距离做 softmax
+    参数:
+        prototypes: (P, D) 原型矩阵，同一类的原型连续存放
+        proto_labels: (P,) 每个原型对应的类别下标
+        temperature: softmax 温度（训练集最近距离的中位数）
+    """
+    kind = 'centroid'
+
+    def __init__(self, classes, prototypes, proto_labels, temperature):
+        super().__init__(classes)
+        self.prototypes = np.asarray(prototypes, dtype=np.float32)
+        self.proto_labels = np.asarray(proto_labels, dtype=np.intp)
+        self.temperature = float(temperature)
+        self._proto_sq = (self.prototypes ** 2).sum(axis=1)
+        # 原型按类别连续存放，每类的起始下标用于 reduceat 取类内最小距离
+        self._class_starts = np.flatnonzero(np.r_[True, self.proto_labels[1:] != self.proto_labels[:-1]])
+
+    def class_distances(self, X):
+        """(N, n_classes) 到每类最近原型的欧氏距离"""
+        X = np.asarray(X, dtype=np.float32)
+        d2 = (X ** 2).sum(axis=1)[:, None] - 2.0 * X @ self.prototypes.T + self._proto_sq[None, :]
+        return np.sqrt(np.maximum(np.minimum.reduceat(d2, self._class_starts, axis=1), 0.0))
+
+    def predict_proba(self, X):
+        return _softmax(-self.class_distances(X) / self.temperature)
+
+    def arrays(self):
+        return {'prototypes': self.prototypes, 'proto_labels': self.proto_labels,
+                'temperature': np.float32(self.temperature)}
+
+    @classmethod
+    def fit(cls, X, y, prototypes_per_class=3, iters=20, seed=0):
+        """每类跑一次小 k-means 得到原型（样本数不足时原型数取样本数）"""
+        X = np.asarray(X, dtype=np.float32)
+        classes = np.unique(y)
+        rng = np.random.default_rng(seed)
+        protos, labels = [], []
+        for ci, c in enumerate(classes):
+            Xc = X[y == c]
+            k = min(prototypes_per_class, len(Xc))
+            centers = Xc[rng.choice(len(Xc), k, replace=False)]
+            for _ in range(iters):
+                assign = ((Xc[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+                for j in range(k):
+                    members = Xc[assign == j]
+                    if len(members):
+                        centers[j] = members.mean(axis=0)
+            protos.append(centers)
+            labels.extend([ci] * k)
+        model = cls(classes, np.vstack(protos), labels, temperature=1.0)
+        nearest = model.class_distances(X).min(axis=1)
+        model.temperature = float(max(np.median(nearest), 1e-6))
+        return model
+
+
+class MLPBackend(ClassifierBackend):
+    """
+    单隐层 ReLU MLP，前向: softmax(relu(X @ W1 + b1) @ W2 + b2)
+    权重由 sklearn MLPClassifier 训练后导出，推理不依赖 sklearn
+    """
+    kind = 'mlp'
+
+    def __init__(self, classes, W1, b1, W2, b2):
+        super().__init__(classes)
+        self.W1 = np.asarray(W1, dtype=np.float32)
+        self.b1 = np.asarray(b1, dtype=np.float32)
+        self.W2 = np.asarray(W2, dtype=np.float32)
+        self.b2 = np.asarray(b2, dtype=np.float32)
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        h = np.maximum(X @ self.W1 + self.b1, 0.0)
+        return _softmax(h @ self.W2 + self.b2)
+
+    def arrays(self):
+        return {'W1': self.W1, 'b1': self.b1, 'W2': self.W2, 'b2': self.b2}
+
+    @classmethod
+    def from_sklearn(cls, mlp):
+        """从已训练的 sklearn MLPClassifier（单隐层、relu）导出权重"""
+        if len(mlp.coefs_) != 2 or mlp.activation != 'relu':
+            raise ValueError('only single-hidden-layer relu MLPClassifier can be exported')
+        return cls(mlp.classes_, mlp.coefs_[0], mlp.intercepts_[0], mlp.coefs_[1], mlp.intercepts_[1])
+
+
+class CascadeKNNBackend(ClassifierBackend):
+    """
+    级联 KNN：先算到每类中心的距离（n_classes 次），在下界最小的 candidates 个类的参考样本上做精确 KNN，
+    再用三角不等式剪枝补齐，结果与全量 KNN（uniform 权重）一致：
+    - 参考样本 r 到查询 q 的距离下界：|d(q, c) − d(r, c)|，c 为 r 所在类的中心，d(r, c) 预先算好
+    - 候选类内第 k 近的距离为 D_k；候选类之外只有下界 <= D_k 的参考样本才可能进入前 k，
+      对它们补算精确距离（"回退"），其余样本不必计算 63 维距离
+    参数:
+        references: (M, D) 参考样本，按类别分组连续存放
+        class_offsets: (n_classes + 1,) 第 i 类样本为 references[offsets[i]:offsets[i+1]]
+        n_neighbors: KNN 的 k
+        candidates: 先做精确搜索的类数（按类下界 d(q, c) − 类半径 排序）
+    """
+    kind = 'cascade'
+
+    def __init__(self, classes, references, class_offsets, n_neighbors=3, candidates=5):
+        super().__init__(classes)
+        self.references = np.asarray(references, dtype=np.float32)
+        self.class_offsets = np.asarray(class_offsets, dtype=np.intp)
+        self.n_neighbors = int(n_neighbors)
+        self.candidates = int(min(candidates, len(self.classes_)))
+        self.labels = np.repeat(np.arange(len(self.classes_)), np.diff(self.class_offsets))
+        self.centroids = np.stack([
+            self.references[a:b].mean(axis=0)
+            for a, b in zip(self.class_offsets[:-1], self.class_offsets[1:])
+        ])
+        # 每个参考样本到本类中心的距离，与每类半径（类内最大值）
+        self._to_centroid = np.sqrt(((self.references - self.centroids[self.labels]) ** 2).sum(axis=1))
+        self._radius = np.maximum.reduceat(self._to_centroid, self.class_offsets[:-1])
+        # 类 -> 参考样本行的成员矩阵：候选行由布尔或得到，查询时不拼接参考样本
+        self._members = self.labels[None, :] == np.arange(len(self.classes_))[:, None]
+        self.queries = 0
+        self.fallbacks = 0
+        self.scanned = 0
+
+    def _predict_one(self, x):
+        self.queries += 1
+        k = min(self.n_neighbors, len(self.labels))
+        cd = np.sqrt(((self.centroids - x) ** 2).sum(axis=1))
+        picked = np.argpartition(cd - self._radius, self.candidates - 1)[:self.candidates]
+        in_picked = self._members[picked].any(axis=0)
+        rows = np.flatnonzero(in_picked)
+        d = np.sqrt(((self.references[rows] - x) ** 2).sum(axis=1))
+        if len(rows) >= k:
+            kth = np.partition(d, k - 1)[k - 1]
+            extra = np.flatnonzero(~in_picked & (np.abs(cd[self.labels] - self._to_centroid) <= kth))
+        else:
+            extra = np.flatnonzero(~in_picked)
+        if len(extra):
+            self.fallbacks += 1
+            rows = np.concatenate([rows, extra])
+            d = np.concatenate([d, np.sqrt(((self.references[extra] - x) ** 2).sum(axis=1))])
+        self.scanned += len(rows)
+        nearest = rows[np.argpartition(d, k - 1)[:k]]
+        return np.bincount(self.labels[nearest], minlength=len(self.classes_)) / k
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return np.stack([self._predict_one(x) for x in X])
+
+    def stats(self):
+        """需要在候选类之外补算距离的次数与比例，以及平均计算了多少比例的参考样本"""
+        return {
+            'queries': self.queries,
+            'fallbacks': self.fallbacks,
+            'fallback_rate': round(self.fallbacks / self.queries, 4) if self.queries else 0.0,
+            'scanned_ratio': round(self.scanned / (self.queries * len(self.labels)), 4) if self.queries else 0.0,
+        }
+
+    def arrays(self):
+        return {'references': self.references, 'class_offsets': self.class_offsets,
+                'n_neighbors': np.int64(self.n_neighbors), 'candidates': np.int64(self.candidates)}
+
+    @classmethod
+    def fit(cls, X, y, **kwargs):
+        """按类别排序参考样本，使每类成为连续切片"""
+        return cls(*group_by_label(X, y), **kwargs)
+
+    @classmethod
+    def from_sklearn(cls, knn, **kwargs):
+        """从已训练的 sklearn KNeighborsClassifier 取出参考样本构建级联"""
+        return cls.fit(knn._fit_X, knn.classes_[knn._y], n_neighbors=knn.n_neighbors, **kwargs)
+
+
+class OnlineKNNBackend(ClassifierBackend):
+    """
+    可在线追加参考样本的 KNN（概率与 sklearn KNN 的 uniform 权重一致）
+    - 参考样本存放在按倍增扩容的矩阵中，追加均摊 O(1)
+    - 前 n_base 个为训练得到的基础样本，永不替换
+    - 在线样本每类最多 class_cap 个，超出后按蓄水池抽样（Algorithm R）原地替换，
+      使保留的样本是该类全部在线样本的均匀抽样，索引规模有界
+    - 替换位置只由 (seed, 类别, 该类已接收数) 决定，不依赖进程内的随机数状态：
+      从压缩文件加载后按相同顺序重放追加日志，得到与重启前完全相同的索引
+    参数:
+        references / labels: (M, D) 参考样本与类别下标（前 n_base 个为基础样本）
+        seen: (n_classes,) 每类已接收的在线样本数（蓄水池计数）
+        generation: 压缩代数，用于判断追加日志是否已包含在本模型中（见 sample_log.py）
+        seed: 蓄水池抽样的种子（随模型文件保存）
+        base_sha256: 基础样本来源模型文件的 sha256；与当前模型文件不一致时 worker 重建索引
+    """
+    kind = 'knn_online'
+
+    def __init__(self, classes, references, labels, n_base=None, seen=None, class_cap=64, n_neighbors=3,
+                 generation=0, seed=0, base_sha256=''):
+        super().__init__(classes)
+        self.generation = int(generation)  # 压缩次数（与追加日志的 generation 对应）
+        references = np.asarray(references, dtype=np.float32)
+        labels = np.asarray(labels, dtype=np.intp)
+        self.n_neighbors = int(n_neighbors)
+        self.class_cap = int(class_cap)
+        self.n_base = len(labels) if n_base is None else int(n_base)
+        self.seen = np.zeros(len(self.classes_), dtype=np.int64) if seen is None else np.asarray(seen, dtype=np.int64)
+        self.size = len(labels)
+        capacity = max(16, self.size)
+        self._refs = np.empty((capacity, references.shape[1]), dtype=np.float32)
+        self._sq = np.empty(capacity, dtype=np.float32)
+        self._labels = np.empty(capacity, dtype=np.intp)
+        self._refs[:self.size] = references
+        self._sq[:self.size] = (references ** 2).sum(axis=1)
+        self._labels[:self.size] = labels
+        # 每类在线样本所在的行（蓄水池替换用）
+        self._user_rows = [[] for _ in self.classes_]
+        for row in range(self.n_base, self.size):
+            self._user_rows[labels[row]].append(row)
+        self._index = {str(c): i for i, c in enumerate(self.classes_)}
+        self.seed = int(seed)
+        self.base_sha256 = str(base_sha256)
+
+    @property
+    def references(self):
+        return self._refs[:self.size]
+
+    @property
+    def labels(self):
+        return self._labels[:self.size]
+
+    def _grow(self):
+        capacity = 2 * len(self._labels)
+        for name in ('_refs', '_sq', '_labels'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, vector, label):
+        """
+        追加一个在线样本，返回 'appended' / 'replaced' / 'skipped'
+        未知类别抛出 ValueError（类别集合与概率向量维度固定）
+        """
+        c = self._index.get(str(label))
+        if c is None:
+            raise ValueError(f'unknown class: {label}')
+        x = np.asarray(vector, dtype=np.float32)
+        self.seen[c] += 1
+        rows = self._user_rows[c]
+        if len(rows) < self.class_cap:
+            if self.size == len(self._labels):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self._labels[row] = c
+            rows.append(row)
+            outcome = 'appended'
+        else:
+            j = int(np.random.default_rng((self.seed, c, int(self.seen[c]))).integers(0, self.seen[c]))
+            if j >= self.class_cap:
+                return 'skipped'
+            row = rows[j]
+            outcome = 'replaced'
+        self._refs[row] = x
+        self._sq[row] = float((x ** 2).sum())
+        return outcome
+
+    def online_samples(self):
+        """按行序产出在线样本 (label, vector)（不含基础样本）"""
+        for row in range(self.n_base, self.size):
+            yield str(self.classes_[self._labels[row]]), self._refs[row].copy()
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        refs = self.references
+        d2 = (X ** 2).sum(axis=1)[:, None] - 2.0 * X @ refs.T + self._sq[None, :self.size]
+        k = min(self.n_neighbors, self.size)
+        nearest = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        votes = self.labels[nearest]
+        probs = np.zeros((len(X), len(self.classes_)))
+        np.add.at(probs, (np.arange(len(X))[:, None], votes), 1.0 / k)
+        return probs
+
+    def stats(self):
+        return {
+            'references': self.size,
+            'base': self.n_base,
+            'online': self.size - self.n_base,
+            'seen': int(self.seen.sum()),
+            'capacity': len(self._labels),
+        }
+
+    def arrays(self):
+        return {'references': self.references, 'labels': self.labels, 'n_base': np.int64(self.n_base),
+                'seen': self.seen, 'class_cap': np.int64(self.class_cap), 'n_neighbors': np.int64(self.n_neighbors),
+                'generation': np.int64(self.generation), 'seed': np.int64(self.seed),
+                'base_sha256': np.asarray(self.base_sha256)}
+
+    def save(self, path):
+        """原子写出（先写临时文件再替换），供周期性压缩使用"""
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, kind=self.kind, classes=self.classes_, **self.arrays())
+        os.replace(tmp, path)
+
+    @classmethod
+    def from_sklearn(cls, knn, **kwargs):
+        """以已训练的 sklearn KNeighborsClassifier 的参考样本为基础样本"""
+        return cls(knn.classes_, knn._fit_X, knn._y, n_neighbors=knn.n_neighbors, **kwargs)
+
+
+class TargetVerifier:
+    """
+    目标条件验证（练习模式：已知 target_gesture）
+    只计算到目标类和它的若干易混类（训练时由混淆矩阵得出）的参考样本的距离，
+    不做全类别搜索：
+        d_t = 到目标类 k 个最近样本的平均距离
+        d_c = 到各易混类同样统计量的最小值
+        P(match) = sigmoid(coef × (d_c - d_t) + intercept)   （系数训练时用训练集的折外距离差拟合）
+        P(match) >= threshold 时接受目标手势（阈值训练时选定，使接受率不低于 KNN 准确率）
+    参数:
+        classes / references / class_offsets: 与 CascadeKNNBackend 相同的分组参考样本
+        confusables: (n_classes, M) 每类的易混类下标
+        coef / intercept: 逻辑回归校准参数
+        threshold: 接受阈值
+        n_neighbors: 每类取最近的 k 个样本
+    """
+
+    def __init__(self, classes, references, class_offsets, confusables, coef=1.0, intercept=0.0, threshold=0.5,
+                 n_neighbors=3):
+        self.classes_ = np.asarray(classes)
+        self.references = np.asarray(references, dtype=np.float32)
+        self.class_offsets = np.asarray(class_offsets, dtype=np.intp)
+        self.confusables = np.asarray(confusables, dtype=np.intp)
+        self.coef = float(coef)
+        self.intercept = float(intercept)
+        self.threshold = float(threshold)
+        self.n_neighbors = int(n_neighbors)
+        self._index = {str(c): i for i, c in enumerate(self.classes_)}
+
+    def __contains__(self, label):
+        return label in self._index
+
+    def _class_distance(self, x, c):
+        refs = self.references[self.class_offsets[c]:self.class_offsets[c + 1]]
+        d = np.sqrt(((refs - x) ** 2).sum(axis=1))
+        k = min(self.n_neighbors, len(d))
+        return float(np.partition(d, k - 1)[:k].mean())
+
+    def margin(self, x, target):
+        """返回 (d_c - d_t, 最近易混类的下标)：目标类 vs 最近易混类的距离差"""
+        t = self._index[target]
+        x = np.asarray(x, dtype=np.float32)
+        d_t = self._class_distance(x, t)
+        conf = self.confusables[t]
+        d_conf = np.array([self._class_distance(x, c) for c in conf])
+        best = int(np.argmin(d_conf))
+        return float(d_conf[best] - d_t), int(conf[best])
+
+    def verify(self, x, target):
+        """返回 (匹配概率, 最近易混类的标签)"""
+        diff, rival = self.margin(x, target)
+        prob = 1.0 / (1.0 + np.exp(-(self.coef * diff + self.intercept)))
+        return float(prob), self.classes_[rival]
+
+    def save(self, path):
+        np.savez(path, classes=self.classes_, references=self.references, class_offsets=self.class_offsets,
+                 confusables=self.confusables, coef=np.float32(self.coef),
+                 intercept=np.float32(self.intercept), threshold=np.float32(self.threshold),
+                 n_neighbors=np.int64(self.n_neighbors))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{k: data[k] for k in data.files})
+
+    @staticmethod
+    def confusables_from_matrix(confusion, n_confusable=3):
+        """按混淆矩阵（双向计数之和）为每类选出最易混的 n_confusable 个类"""
+        sym = confusion + confusion.T
+        np.fill_diagonal(sym, -1)
+        # 稳定排序：计数相同的按类别顺序，保证可复现
+        return np.argsort(-sym, axis=1, kind='stable')[:, :n_confusable]
+
+
+BACKENDS = {
+    NearestCentroidBackend.kind: NearestCentroidBackend,
+    MLPBackend.kind: MLPBackend,
+    CascadeKNNBackend.kind: CascadeKNNBackend,
+    OnlineKNNBackend.kind: OnlineKNNBackend,
+}
+
+
+def load_backend(path):
+    """按扩展名加载模型：.pkl 为 sklearn（joblib），.npz 为 NumPy 后端"""
+    if os.path.splitext(path)[1] == '.npz':
+        with np.load(path, allow_pickle=False) as data:
+            kind = str(data['kind'])
+            if kind not in BACKENDS:
+                raise ValueError(f'unknown classifier backend: {kind}')
+            arrays = {k: data[k] for k in data.files if k not in ('kind', 'classes')}
+            return BACKENDS[kind](data['classes'], **arrays)
+    import joblib
+    return joblib.load(path)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+客户端状态存储（按 (client_id, target) 隔离）
+替代原来的全局 ema_conf 字典：
+- 容量上限 + 有序 LRU：超出容量时淘汰最久未访问的会话，O(1)
+- 基于时间的过期：LRU 头部就是最久未访问的记录，只需从头部弹出过期项，均摊 O(1)
+- tuple 键：(client_id, target)，不再拼接 f"{client_id}:{target}" 字符串
+- __slots__ 记录：EMA、最近一次预测、tracker 句柄、landmarks 历史、平滑矩阵及行号、待确认的在线样本
+"""
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_CAPACITY = 1024     # 最多同时保留的会话数
+DEFAULT_TTL = 300           # 会话过期时间（秒）= 5 分钟
+DEFAULT_HISTORY_LEN = 30    # 每个会话保留的 landmarks 历史帧数
+
+
+class ClientState:
+    """单个 (client_id, target) 会话的状态记录"""
+    __slots__ = ('ema', 'last_prediction', 'tracker', 'history', 'row', 'smoother', 'shed', 'confirmed',
+                 'last_seen')
+
+    def __init__(self, history_len=DEFAULT_HISTORY_LEN):
+        self.ema = 0.0                  # 置信度 EMA
+        self.last_prediction = None     # 最近一次预测的标签
+        self.tracker = None             # 外部 tracker 句柄（可选）
+        self.history = deque(maxlen=history_len)  # 最近的特征向量
+        self.row = None                 # 概率平滑状态矩阵中的行号
+        self.smoother = None            # row 所属的平滑矩阵（每个模型一个，切换模型时重新分配行）
+        self.shed = 0                   # 因超过截止时间被丢弃的帧数
+        self.confirmed = None           # 最近一次被服务端确认为目标手势的特征（add_samples 追加）
+        self.last_seen = 0.0
+
+
+class ClientStateStore:
+    """
+    容量有界、带过期时间的 LRU 状态存储
+    参数:
+        capacity: 最大记录数
+        ttl: 记录未访问多少秒后过期
+        history_len: 每条记录的 landmarks 历史长度
+        on_evict: 记录被淘汰时的回调 on_evict(key, state)，用于释放 tracker 等资源
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL,
+                 history_len=DEFAULT_HISTORY_LEN, on_evict=None):
+        if capacity < 1:
+            raise ValueError(f'capacity must be >= 1, got {capacity}')
+        self.capacity = capacity
+        self.ttl = ttl
+        self.history_len = history_len
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self.evicted_capacity = 0   # 因容量淘汰的次数
+        self.evicted_expired = 0    # 因过期淘汰的次数
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _evict(self, key, state):
+        if self.on_evict is not None:
+            self.on_evict(key, state)
+
+    def expire(self, now=None):
+        """从 LRU 头部弹出所有过期记录（头部最旧，遇到未过期即停止）"""
+        now = time.time() if now is None else now
+        entries = self._entries
+        removed = 0
+        while entries:
+            key, state = next(iter(entries.items()))
+            if now - state.last_seen <= self.ttl:
+                break
+            entries.popitem(last=False)
+            self.evicted_expired += 1
+            removed += 1
+            self._evict(key, state)
+        return removed
+
+    def get(self, key, now=None):
+        """获取记录（不存在或已过期返回 None），命中时刷新 LRU 位置"""
+        now = time.time() if now is None else now
+        self.expire(now)
+        state = self._entries.get(key)
+        if state is not None:
+            state.last_seen = now
+            self._entries.move_to_end(key)
+        return state
+
+    def get_or_create(self, key, now=None):
+        """获取记录，不存在时创建；超出容量时淘汰最久未访问的记录"""
+        now = time.time() if now is None else now
+        state = self.get(key, now)
+        if state is not None:
+            return state
+        state = ClientState(self.history_len)
+        state.last_seen = now
+        self._entries[key] = state
+        while len(self._entries) > self.capacity:
+            old_key, old_state = self._entries.popitem(last=False)
+            self.evicted_capacity += 1
+            self._evict(old_key, old_state)
+        return state
+
+    def pop(self, key):
+        """主动移除记录（客户端断开时），同样触发 on_evict"""
+        state = self._entries.pop(key, None)
+        if state is not None:
+            self._evict(key, state)
+        return state
+
+    def pop_client(self, client_id):
+        """移除某个客户端的所有会话（O(n)，仅在断开时调用）"""
+        keys = [k for k in self._entries if k[0] == client_id]
+        for key in keys:
+            self.pop(key)
+        return len(keys)
+
+    def stats(self):
+        """存储大小与淘汰计数"""
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'evicted_capacity': self.evicted_capacity,
+            'evicted_expired': self.evicted_expired,
+        }
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+EDF 调度契约检查：FRAME_TRANSPORT=shm + LATENCY_BUDGET_MS 启动 worker，混合发送共享内存帧与 landmarks，校验：
+- 共享内存帧（process_frame_shm）与 landmarks 一样按截止时间排序，不会插到截止时间更早的 landmarks 前面
+- 已过期的共享内存帧在推理前被丢弃，只回复 slot_released（桥接层据此回收槽位）
+
+发送顺序（一次写入，读线程全部入队时第一帧仍在推理）：
+    F0（占住处理线程） -> L1..Ln（ts=now） -> F1（ts=now+spacing，截止时间晚于所有 L） -> F2（ts 已过期）
+期望回复顺序：F0, L1..Ln, F1；F2 只有 slot_released
+
+用法:
+    python server/ml/edf_contract.py [--landmarks 20] [--budget-ms 2000]
+退出码 0 表示通过，1 表示失败
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+
+from frame_ring import FrameRing
+from pipeline_bench import WORKER, make_frame
+from protocol_contract import synthetic_points
+
+
+def run(n_landmarks, budget_ms):
+    import random
+
+    rng = random.Random(0)
+    env = dict(os.environ, WORKER_LOG_LEVEL='warning', FRAME_TRANSPORT='shm', LATENCY_BUDGET_MS=str(budget_ms))
+    env.pop('WORKER_MODE', None)  # EDF 调度只在串行模式下生效
+    proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, env=env)
+    ready = json.loads(proc.stdout.readline())
+    failures = []
+    if not ready.get('frame_ring'):
+        print('FAIL worker did not announce a frame ring (FRAME_TRANSPORT=shm unsupported here?)')
+        proc.kill()
+        return 1
+    info = ready['frame_ring']
+    ring = FrameRing(info['name'], slots=info['slots'], slot_size=info['slot_size'], create=False)
+    jpeg = base64.b64decode(make_frame(640, 480))
+
+    now = time.time() * 1000
+    spacing = budget_ms / 4
+
+    def frame(seq, slot, ts):
+        gen = ring.write(slot, jpeg)
+        return {'type': 'process_frame_shm', 'client_id': 'edf_frames', 'seq': seq, 'slot': slot, 'gen': gen,
+                'length': len(jpeg), 'target_gesture': 'A', 'ts': ts}
+
+    messages = [frame('F0', 0, now)]
+    messages += [{
+        'type': 'process_landmarks', 'client_id': f'edf_l{i}', 'seq': f'L{i}', 'points': synthetic_points(rng),
+        'image': {'width': 640, 'height': 480, 'unit': 'norm01'}, 'mirrored': False,
+        'target_gesture': 'A', 'ts': now,
+    } for i in range(1, n_landmarks + 1)]
+    messages.append(frame('F1', 1, now + spacing))
+    messages.append(frame('F2', 2, now - 2 * budget_ms))  # 已过期
+    try:
+        proc.stdin.write(''.join(json.dumps(m) + '\n' for m in messages))
+        proc.stdin.close()
+        replies = [json.loads(line) for line in proc.stdout]
+        proc.wait()
+    finally:
+        ring.close()
+
+    order = [r['seq'] for r in replies if r.get('msg_class') == 'result']
+    expected = ['F0'] + [f'L{i}' for i in range(1, n_landmarks + 1)] + ['F1']
+    if order != expected:
+        failures.append(f'result order {order}, expected {expected}')
+    released = [r.get('slot') for r in replies if r.get('type') == 'slot_released']
+    if released != [2]:
+        failures.append(f'expected the expired shm frame (slot 2) to be shed with slot_released, got {released}')
+
+    print(json.dumps({'landmarks': n_landmarks, 'budget_ms': budget_ms, 'results': len(order),
+                      'slot_released': released, 'failures': len(failures)}))
+    for f in failures:
+        print(f'FAIL {f}')
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--landmarks', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=2000.0)
+    args = parser.parse_args()
+    sys.exit(run(args.landmarks, args.budget_ms))
+
+
+if __name__ == '__main__':
+    main()
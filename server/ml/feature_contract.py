@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+特征空间契约检查：landmarks 路径（前端 tasks-vision 关键点）与整帧路径（服务端 MediaPipe）
+必须得到与训练数据（asl_dataset.csv -> load_dataset）相同的 63 维特征，校验：
+- 同一组关键点：landmarks_features(points) 与 extract_landmarks(MediaPipe 结果) 完全一致
+- mirrored=True 且 x 已翻转的关键点还原后与原始关键点特征一致
+- golden 留出集逐条走 process_landmarks，预测与默认模型直接对原始特征 predict 的结果一致
+
+用法:
+    python server/ml/feature_contract.py [--golden server/ml/asl_golden.npz]
+退出码 0 表示通过，1 表示失败
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from golden_eval import GOLDEN_PATH, load_golden
+
+
+def run(golden_path):
+    os.environ.setdefault('WORKER_LOG_LEVEL', 'warning')
+    from mediapipe.framework.formats import landmark_pb2
+    import realtime_recognition as rr
+
+    X = load_golden(golden_path)['X']
+    failures = []
+    vectors = []
+    for i, row in enumerate(X):
+        points = np.stack([row[:21], row[21:42], row[42:]], axis=1)
+        hand = landmark_pb2.NormalizedLandmarkList(
+            landmark=[landmark_pb2.NormalizedLandmark(x=x, y=y, z=z) for x, y, z in points])
+        frame_vec = np.asarray(rr.extract_landmarks(hand), dtype=np.float32)
+        landmarks_vec = np.asarray(rr.landmarks_features(points.tolist()), dtype=np.float32)
+        flipped = points.copy()
+        flipped[:, 0] = 1.0 - flipped[:, 0]
+        mirrored_vec = np.asarray(rr.landmarks_features(flipped.tolist(), mirrored=True), dtype=np.float32)
+        if not np.allclose(frame_vec, landmarks_vec, atol=1e-6):
+            failures.append(f'sample {i}: landmarks path features differ from frame path')
+        if not np.allclose(mirrored_vec, landmarks_vec, atol=1e-6):
+            failures.append(f'sample {i}: mirrored points do not restore to the same features')
+        if not np.allclose(landmarks_vec, row, atol=1e-6):
+            failures.append(f'sample {i}: features differ from the training row')
+        vectors.append(landmarks_vec)
+
+    agreement = None
+    if rr.model is None:
+        failures.append('default model not loaded')
+    else:
+        expected = [str(p) for p in rr.model.predict(np.asarray(vectors))]
+        predicted = []
+        for i, row in enumerate(X):
+            points = np.stack([row[:21], row[21:42], row[42:]], axis=1).tolist()
+            reply = rr.process_landmarks_input({
+                'type': 'process_landmarks', 'client_id': f'feature_{i}', 'points': points,
+                'image': {'width': 640, 'height': 480, 'unit': 'norm01'}, 'mirrored': False,
+                'target_gesture': '',
+            })
+            predicted.append(str((reply.get('data') or {}).get('predicted')))
+        agreement = float(np.mean([a == b for a, b in zip(predicted, expected)]))
+        if agreement < 1.0:
+            failures.append(f'process_landmarks agrees with model.predict on raw features for {agreement:.4f}')
+
+    print(json.dumps({'samples': len(X), 'agreement': agreement, 'failures': len(failures)}))
+    for f in failures[:20]:
+        print(f'FAIL {f}')
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--golden', default=GOLDEN_PATH)
+    args = parser.parse_args()
+    sys.exit(run(args.golden))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+共享内存帧环（/dev/shm，multiprocessing.shared_memory）
+桥接层把 JPEG 原始字节写进固定大小的槽位，只通过 stdin 发一条很小的控制消息：
+    {type: 'process_frame_shm', client_id, seq, slot, gen, length, target_gesture, ts}
+worker 直接在共享内存的 memoryview 上解码，省掉 JSON 字符串拷贝、readline 拷贝和 base64 解码
+
+槽位布局（小端）:
+    [0:4)   length      本次写入的 JPEG 字节数
+    [4:8)   generation  每次写入递增，控制消息中的 gen 必须与之一致（防止读到被覆盖的槽）
+    [64:)   data        JPEG 字节，容量 slot_size
+槽位由桥接层分配；worker 回复（结果或 slot_released）中回显 slot，桥接层据此回收
+"""
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+HEADER = struct.Struct('<II')
+HEADER_BYTES = 64  # 头部按缓存行对齐
+
+
+class FrameRing:
+    """
+    参数:
+        name: 共享内存名（None 时自动生成）
+        slots: 槽位数
+        slot_size: 每个槽位的数据容量（字节）
+        create: True 创建新的共享内存（worker 侧），False 附着到已有的（写入端/基准测试）
+    """
+
+    def __init__(self, name=None, slots=8, slot_size=512 * 1024, create=True):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.stride = HEADER_BYTES + slot_size
+        self.owner = create
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=slots * self.stride)
+        if not create:
+            # 附着方不拥有生命周期：Python < 3.13 会把它登记到 resource_tracker，退出时误删 worker 的帧环
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self._generation = [0] * slots
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def path(self):
+        """Linux 下共享内存对应的文件路径（Node 侧用普通文件 API 写入）"""
+        return f'/dev/shm/{self.shm.name.lstrip("/")}'
+
+    def describe(self):
+        """通告给桥接层的环信息"""
+        return {'name': self.name, 'path': self.path, 'slots': self.slots,
+                'slot_size': self.slot_size, 'header_bytes': HEADER_BYTES}
+
+    def _offset(self, slot):
+        if not 0 <= slot < self.slots:
+            raise ValueError(f'slot out of range: {slot}')
+        return slot * self.stride
+
+    def write(self, slot, data):
+        """写入一帧（写入端使用），返回本次的 generation"""
+        if len(data) > self.slot_size:
+            raise ValueError(f'frame of {len(data)} bytes exceeds slot size {self.slot_size}')
+        off = self._offset(slot)
+        self._generation[slot] = (self._generation[slot] + 1) & 0xFFFFFFFF
+        gen = self._generation[slot]
+        self.shm.buf[off + HEADER_BYTES:off + HEADER_BYTES + len(data)] = data
+        HEADER.pack_into(self.shm.buf, off, len(data), gen)
+        return gen
+
+    def view(self, slot, gen, length):
+        """
+        返回槽位数据的零拷贝 memoryview（调用方用完需 release）
+        头部与控制消息不一致时说明槽位已被覆盖，抛出 ValueError
+        """
+        off = self._offset(slot)
+        stored_len, stored_gen = HEADER.unpack_from(self.shm.buf, off)
+        if stored_gen != gen or stored_len != length:
+            raise ValueError(f'stale frame slot {slot}: gen {stored_gen} != {gen}')
+        start = off + HEADER_BYTES
+        return self.shm.buf[start:start + length]
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+对比帧传输方式：pipe（base64 JPEG 随 JSON 走 stdin）vs shm（JPEG 写入共享内存帧环，stdin 只传槽位号）
+
+两部分测量：
+1. transport —— 进程内只测“搬运 + 解码”成本（不跑 MediaPipe），单位 µs/帧：
+   pipe: b64encode + json.dumps + json.loads + b64decode + imdecode
+   shm:  写入槽位 + json.dumps/loads 控制消息 + memoryview 上 imdecode
+2. worker —— 端到端驱动真实 worker（FRAME_TRANSPORT=pipe / shm），
+   两种方式都限制在途帧数 = 槽位数（与桥接层一致），输出 msgs/s
+
+用法:
+    python server/ml/frame_ring_bench.py [--frames 300] [--width 640] [--height 480]
+                                         [--slots 16] [--image path.jpg] [--transport-only]
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_ring import FrameRing
+from pipeline_bench import WORKER, make_frame
+
+
+def bench_transport(jpeg, frames, slots):
+    """进程内测量两种方式每帧的搬运 + 解码耗时（µs）"""
+    header = {'type': 'process_frame', 'client_id': 'bench', 'seq': 0, 'target_gesture': 'A', 'ts': 0}
+
+    start = time.perf_counter()
+    for i in range(frames):
+        line = json.dumps(dict(header, seq=i, frame=base64.b64encode(jpeg).decode('ascii')))
+        message = json.loads(line)
+        cv2.imdecode(np.frombuffer(base64.b64decode(message['frame']), np.uint8), cv2.IMREAD_COLOR)
+    pipe_us = (time.perf_counter() - start) / frames * 1e6
+
+    ring = FrameRing(slots=slots, slot_size=len(jpeg))  # 同一进程内读写同一块共享内存
+    try:
+        start = time.perf_counter()
+        for i in range(frames):
+            slot = i % slots
+            gen = ring.write(slot, jpeg)
+            message = json.loads(json.dumps(dict(header, type='process_frame_shm', seq=i,
+                                                 slot=slot, gen=gen, length=len(jpeg))))
+            with ring.view(message['slot'], message['gen'], message['length']) as view:
+                cv2.imdecode(np.frombuffer(view, np.uint8), cv2.IMREAD_COLOR)
+        shm_us = (time.perf_counter() - start) / frames * 1e6
+    finally:
+        ring.close()
+    return pipe_us, shm_us
+
+
+def run_worker(jpeg, frames, transport, slots):
+    """启动 worker 并按桥接层的方式限制在途帧数，返回 (结果数, 耗时秒, 平均 stdin 行长度)"""
+    env = dict(os.environ, WORKER_LOG_LEVEL='warning', FRAME_TRANSPORT=transport,
+               FRAME_RING_SLOTS=str(slots), FRAME_RING_SLOT_KB=str(len(jpeg) // 1024 + 1))
+    proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, env=env)
+    ring = None
+    while True:
+        line = proc.stdout.readline()
+        if not line:
+            break
+        ready = json.loads(line)
+        if ready.get('type') == 'ready':
+            if transport == 'shm':
+                info = ready['frame_ring']
+                ring = FrameRing(name=info['name'], slots=info['slots'], slot_size=info['slot_size'], create=False)
+            break
+
+    frame_b64 = base64.b64encode(jpeg).decode('ascii')
+    free = threading.Semaphore(slots)
+    free_slots = list(range(slots))
+    lock = threading.Lock()
+    line_bytes = [0]
+
+    def feed():
+        for i in range(frames):
+            free.acquire()
+            header = {'client_id': f'bench_{i % 4}', 'seq': i, 'target_gesture': 'A'}
+            if ring is not None:
+                with lock:
+                    slot = free_slots.pop()
+                gen = ring.write(slot, jpeg)
+                line = json.dumps(dict(header, type='process_frame_shm', slot=slot, gen=gen, length=len(jpeg)))
+            else:
+                line = json.dumps(dict(header, type='process_frame', frame=frame_b64))
+            line_bytes[0] += len(line) + 1
+            proc.stdin.write(line + '\n')
+            proc.stdin.flush()
+        proc.stdin.close()
+
+    start = time.perf_counter()
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    results = 0
+    for line in proc.stdout:
+        reply = json.loads(line)
+        if reply.get('msg_class') != 'result':
+            continue
+        results += 1
+        if 'slot' in reply:
+            with lock:
+                free_slots.append(reply['slot'])
+        free.release()
+        if results == frames:
+            break
+    elapsed = time.perf_counter() - start
+    writer.join()
+    proc.wait()
+    if ring is not None:
+        ring.close()
+    return results, elapsed, line_bytes[0] / max(1, frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pipe vs shared-memory frame transport')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--slots', type=int, default=16)
+    parser.add_argument('--image', default=None)
+    parser.add_argument('--transport-only', action='store_true', help='只测进程内搬运 + 解码，不启动 worker')
+    args = parser.parse_args()
+
+    jpeg = base64.b64decode(make_frame(args.width, args.height, args.image))
+    pipe_us, shm_us = bench_transport(jpeg, args.frames, args.slots)
+    print(json.dumps({'bench': 'transport', 'jpeg_bytes': len(jpeg), 'pipe_us': round(pipe_us, 1),
+                      'shm_us': round(shm_us, 1), 'speedup': round(pipe_us / shm_us, 2)}))
+    if args.transport_only:
+        return
+
+    rows = {}
+    for transport in ('pipe', 'shm'):
+        n, elapsed, line_len = run_worker(jpeg, args.frames, transport, args.slots)
+        rows[transport] = elapsed
+        print(json.dumps({'bench': 'worker', 'transport': transport, 'results': n,
+                          'msgs_per_s': round(n / elapsed, 2), 'stdin_bytes_per_msg': round(line_len),
+                          'speedup': round(rows['pipe'] / elapsed, 2)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Golden 集准确率护栏：每种推理模式（后端 / 级联 / 目标验证 / 流水线 / EDF / 在线索引 / 共享内存帧环）
+都用同一份冻结的留出集跑一遍真实 worker，与精确 KNN 基线对比，总体或单类精度下降超过阈值即失败
+
+build: 冻结 golden 集到 asl_golden.npz
+    - landmarks：asl_dataset.csv 中与 AIModelTrain.py 相同的分层 20% 留出样本（random_state=42）；
+      AIModelTrain.py 检测到 golden 文件后始终把这些样本排除在训练集之外
+    - frames（可选）：录制的带标注图片，目录结构 <dir>/<label>/*.jpg，JPEG 字节原样存入
+    - 已存在时拒绝覆盖（--force 才重建），保证不同时间的评估结果可比
+run:   逐配置启动 worker，landmarks 走 process_landmarks，frames 走 process_frame（shm 配置走帧环），
+       闭环逐条发送（延迟即单条服务时间），输出一张表：每类准确率 + 总体准确率 + 与基线一致率 + 延迟
+       - 与基线一致率只在该配置总体准确率低于基线时作为失败条件（更准的后端与基线不一致是预期的）
+       - golden 集没有录制帧时，只影响 frames 的配置（shm）无法评估，记为 SKIP 并在 stderr 告警；
+         发布前必须覆盖帧路径时传 --require-frames（这些配置记为失败）
+       - golden 留出样本不参与任何训练或校准（AIModelTrain.py 的目标验证器只在训练集内做交叉验证）
+
+用法:
+    python server/ml/golden_eval.py build [--frames recorded/] [--force]
+    python server/ml/golden_eval.py run [--only knn mlp verify] [--config fast:MODEL_BACKEND=mlp,WORKER_MODE=pipeline]
+                                        [--max-drop 0.02] [--max-class-drop 0.34] [--min-agreement 0.95]
+                                        [--require-frames] [-o golden_report.json]
+退出码 0 表示全部配置通过（或 SKIP），1 表示至少一个配置精度下降超过阈值
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER = os.path.join(BASE_DIR, 'realtime_recognition.py')
+GOLDEN_PATH = os.path.join(BASE_DIR, 'asl_golden.npz')
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+BASELINE = 'knn'  # 精确 KNN：其余配置的对比基准
+CONFIGS = {
+    'knn': {'MODEL_BACKEND': 'knn'},
+    'cascade': {'MODEL_BACKEND': 'cascade'},
+    'centroid': {'MODEL_BACKEND': 'centroid'},
+    'mlp': {'MODEL_BACKEND': 'mlp'},
+    'verify': {'VERIFY_MODE': 'true'},            # 目标手势 = 真实标签（练习模式）
+    'pipeline': {'WORKER_MODE': 'pipeline'},
+    'edf': {'LATENCY_BUDGET_MS': '5000'},          # 预算足够大：只验证调度路径不改变结果
+    'online_index': {'ONLINE_INDEX': 'true'},      # 空日志的在线索引应与 KNN 完全一致
+    'shm': {'FRAME_TRANSPORT': 'shm'},             # 只影响 frames
+}
+FRAME_ONLY = {'shm'}  # 没有录制帧时这些配置无从评估
+# 依赖可选模型文件的配置：文件不存在时 worker 无法加载该后端（verify 会回退到普通分类，结果与基线相同），不能算作通过
+# AIModelTrain.py 只在这些模型精度达标时发布
+REQUIRED_FILES = {'centroid': 'asl_centroid_model.npz', 'mlp': 'asl_mlp_model.npz', 'verify': 'asl_verifier.npz'}
+
+
+# ---------------- build ----------------
+
+def load_frames(directory):
+    """<dir>/<label>/*.jpg -> (JPEG 字节列表, 标签列表)；非 JPEG 图片重新编码"""
+    import cv2
+
+    blobs, labels = [], []
+    for label in sorted(os.listdir(directory)):
+        folder = os.path.join(directory, label)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in IMAGE_EXTS:
+                continue
+            path = os.path.join(folder, name)
+            if ext in ('.jpg', '.jpeg'):
+                with open(path, 'rb') as f:
+                    blobs.append(f.read())
+            else:
+                ok, buf = cv2.imencode('.jpg', cv2.imread(path), [cv2.IMWRITE_JPEG_QUALITY, 90])
+                if not ok:
+                    continue
+                blobs.append(buf.tobytes())
+            labels.append(label)
+    return blobs, labels
+
+
+def build(args):
+    from sklearn.model_selection import train_test_split
+    from AIModelTrain import find_dataset_path, load_dataset
+
+    if os.path.exists(args.output) and not args.force:
+        raise SystemExit(f'{args.output} already exists (frozen); pass --force to rebuild')
+    csv_path = args.dataset or find_dataset_path()
+    X, y = load_dataset(csv_path)
+    # 与 AIModelTrain.py 的切分完全一致：现有模型文件都没有见过这些样本
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    with open(csv_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    blobs, frame_labels = load_frames(args.frames) if args.frames else ([], [])
+    offsets = np.cumsum([0] + [len(b) for b in blobs]).astype(np.int64)
+    np.savez_compressed(
+        args.output,
+        X=X_test.astype(np.float32),
+        y=y_test.astype(str),
+        frames=np.frombuffer(b''.join(blobs), dtype=np.uint8),
+        frame_offsets=offsets,
+        frame_labels=np.asarray(frame_labels, dtype=str),
+        source_sha256=np.asarray(digest),
+        created=np.asarray(time.strftime('%Y-%m-%dT%H:%M:%S')),
+    )
+    print(json.dumps({'type': 'golden_built', 'path': args.output, 'landmarks': len(y_test),
+                      'frames': len(blobs), 'classes': len(set(y_test.tolist()) | set(frame_labels)),
+                      'source': csv_path, 'source_sha256': digest}))
+    return 0
+
+
+def load_golden(path):
+    with np.load(path, allow_pickle=False) as data:
+        offsets = data['frame_offsets']
+        raw = data['frames'].tobytes()
+        return {
+            'X': data['X'],
+            'y': data['y'],
+            'frames': [raw[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)],
+            'frame_labels': data['frame_labels'],
+        }
+
+
+# ---------------- run ----------------
+
+def golden_requests(golden):
+    """(消息, 真实标签, 来源) 列表；每条样本一个 client_id，避免跨样本的时间平滑"""
+    requests = []
+    for i, (row, label) in enumerate(zip(golden['X'], golden['y'])):
+        points = np.stack([row[:21], row[21:42], row[42:]], axis=1).tolist()
+        requests.append(({
+            'type': 'process_landmarks', 'client_id': f'golden_l{i}', 'points': points,
+            'image': {'width': 640, 'height': 480, 'unit': 'norm01'}, 'mirrored': False,
+            'target_gesture': str(label),
+        }, str(label), 'landmarks'))
+    for i, (blob, label) in enumerate(zip(golden['frames'], golden['frame_labels'])):
+        requests.append(({'type': 'process_frame', 'client_id': f'golden_f{i}', 'target_gesture': str(label),
+                          '_jpeg': blob}, str(label), 'frames'))
+    return requests
+
+
+def run_config(name, env_overrides, requests):
+    """
+    启动一个 worker，闭环逐条发送，返回 [(predicted, latency_ms)]
+    predicted: 识别标签；未检测到手为 ''；无回复或错误回复为 None（计入 missing）
+    """
+    from frame_ring import FrameRing
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, WORKER_LOG_LEVEL='warning',
+                   ONLINE_INDEX_PATH=os.path.join(tmp, 'online.npz'),
+                   ONLINE_LOG_PATH=os.path.join(tmp, 'samples.log'), **env_overrides)
+        env.pop('TRAFFIC_CAPTURE_DIR', None)
+        proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, env=env)
+        ready = {}
+        while True:
+            line = proc.stdout.readline()
+            if not line:
+                break
+            ready = json.loads(line)
+            if ready.get('type') == 'ready':
+                break
+        ring = None
+        if ready.get('frame_ring'):
+            info = ready['frame_ring']
+            ring = FrameRing(info['name'], slots=info['slots'], slot_size=info['slot_size'], create=False)
+
+        outputs = []
+        try:
+            for seq, (message, _, _) in enumerate(requests):
+                message = dict(message, seq=seq, ts=time.time() * 1000)
+                blob = message.pop('_jpeg', None)
+                if blob is not None:
+                    if ring is not None and len(blob) <= ring.slot_size:
+                        gen = ring.write(0, blob)  # 闭环发送，同一时刻只有一帧在途
+                        message.update(type='process_frame_shm', slot=0, gen=gen, length=len(blob))
+                    else:
+                        message['frame'] = base64.b64encode(blob).decode('ascii')
+                t0 = time.perf_counter()
+                proc.stdin.write(json.dumps(message) + '\n')
+                proc.stdin.flush()
+                reply = None
+                while True:
+                    line = proc.stdout.readline()
+                    if not line:
+                        break
+                    reply = json.loads(line)
+                    if reply.get('msg_class') == 'result' and reply.get('seq') == seq:
+                        break
+                    reply = None
+                latency = (time.perf_counter() - t0) * 1000
+                data = (reply or {}).get('data') or {}
+                ok = reply is not None and reply.get('ok', True)
+                outputs.append((str(data.get('predicted') or '') if ok else None, latency))
+                if reply is None:
+                    break
+        finally:
+            proc.stdin.close()
+            proc.wait()
+            if ring is not None:
+                ring.close()
+    outputs += [(None, None)] * (len(requests) - len(outputs))
+    return outputs
+
+
+def summarize(name, outputs, requests, baseline):
+    labels = [label for _, label, _ in requests]
+    sources = [source for _, _, source in requests]
+    predicted = [p for p, _ in outputs]
+    correct = np.array([p == t for p, t in zip(predicted, labels)])
+    per_class = {}
+    for cls in sorted(set(labels)):
+        mask = np.array([t == cls for t in labels])
+        per_class[cls] = round(float(correct[mask].mean()), 4)
+    per_source = {}
+    for source in sorted(set(sources)):
+        mask = np.array([s == source for s in sources])
+        per_source[source] = round(float(correct[mask].mean()), 4)
+    latencies = [lat for _, lat in outputs if lat is not None]
+    result = {
+        'name': name,
+        'accuracy': round(float(correct.mean()), 4),
+        'per_class': per_class,
+        'per_source': per_source,
+        'missing': sum(p is None for p in predicted),
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+            'p95': round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        },
+    }
+    if baseline is not None:
+        base_pred = baseline['_predicted']
+        result['agreement'] = round(float(np.mean([a == b for a, b in zip(predicted, base_pred)])), 4)
+    result['_predicted'] = predicted
+    return result
+
+
+def unevaluated(name, reason):
+    """未启动 worker 的配置：表中各项记为 '-'"""
+    return {'name': name, 'accuracy': '-', 'per_class': {}, 'per_source': {}, 'missing': '-',
+            'latency_ms': {'p50': None, 'p95': None}, 'skipped': reason, '_predicted': []}
+
+
+def check(result, baseline, args):
+    """与基线对比，返回失败原因列表"""
+    if baseline is None or result is baseline:
+        return []
+    failures = []
+    drop = baseline['accuracy'] - result['accuracy']
+    if drop > args.max_drop:
+        failures.append(f"accuracy {result['accuracy']:.4f} is {drop:.4f} below {BASELINE}")
+    for cls, acc in result['per_class'].items():
+        class_drop = baseline['per_class'].get(cls, 0.0) - acc
+        if class_drop > args.max_class_drop:
+            failures.append(f'class {cls} accuracy dropped {class_drop:.4f}')
+    # 一致率只在精度不如基线时把关：更准的配置必然与基线在其出错的样本上不一致
+    if (result.get('agreement') is not None and result['agreement'] < args.min_agreement
+            and result['accuracy'] < baseline['accuracy']):
+        failures.append(f"agreement with {BASELINE} {result['agreement']:.4f} < {args.min_agreement}")
+    return failures
+
+
+def print_table(results):
+    """一张表：行为每类准确率 + 汇总指标，列为各配置"""
+    names = [r['name'] for r in results]
+    width = max(10, max(len(n) for n in names) + 2)
+    print(f"{'':<14}" + ''.join(f'{n:>{width}}' for n in names))
+    classes = sorted({c for r in results for c in r['per_class']})
+    def fmt(v):
+        if isinstance(v, float):
+            return f'{v:>{width}.3f}'
+        return f'{str(v):>{width}}'
+
+    for cls in classes:
+        print(f'{cls:<14}' + ''.join(fmt(r['per_class'].get(cls, '-')) for r in results))
+    print('-' * (14 + width * len(results)))
+    for source in sorted({s for r in results for s in r['per_source']}):
+        print(f'{source:<14}' + ''.join(fmt(r['per_source'].get(source, '-')) for r in results))
+    rows = [
+        ('accuracy', lambda r: r['accuracy']),
+        ('agreement', lambda r: r.get('agreement', '-')),
+        ('p50_ms', lambda r: r['latency_ms']['p50']),
+        ('p95_ms', lambda r: r['latency_ms']['p95']),
+        ('missing', lambda r: r['missing']),
+        ('status', lambda r: 'FAIL' if r['failures'] else 'SKIP' if r.get('skipped') else 'PASS'),
+    ]
+    for label, get in rows:
+        print(f'{label:<14}' + ''.join(fmt(get(r)) for r in results))
+
+
+def run(args):
+    if not os.path.exists(args.golden):
+        raise SystemExit(f'{args.golden} not found; run `golden_eval.py build` first')
+    golden = load_golden(args.golden)
+    requests = golden_requests(golden)
+
+    configs = dict(CONFIGS)
+    for spec in args.config:
+        name, _, env = spec.partition(':')
+        configs[name] = dict(item.split('=', 1) for item in env.split(',') if item)
+    names = list(args.only or configs)
+    if BASELINE not in names:
+        names.insert(0, BASELINE)
+    names.sort(key=lambda n: n != BASELINE)  # 基线最先跑
+
+    results, baseline = [], None
+    no_frames = not golden['frames']
+    for name in names:
+        required = REQUIRED_FILES.get(name)
+        if required and not os.path.exists(os.path.join(BASE_DIR, required)):
+            result = unevaluated(name, f'{required} not shipped; mode unavailable')
+            result['failures'] = []
+        elif no_frames and name in FRAME_ONLY:
+            # 帧路径从未被执行：不能把它当作与基线一致而判定通过，默认记为 SKIP 并告警
+            reason = 'golden set has no recorded frames; frame path not evaluated'
+            result = unevaluated(name, reason)
+            if args.require_frames:
+                result['failures'] = [f'{reason} (rebuild with `build --frames <dir> --force`)']
+            else:
+                result['failures'] = []
+                print(f'WARNING {name}: {reason}; rebuild with `build --frames <dir> --force` '
+                      f'and pass --require-frames to gate on it', file=sys.stderr)
+        else:
+            outputs = run_config(name, configs[name], requests)
+            result = summarize(name, outputs, requests, baseline)
+            if name == BASELINE:
+                baseline = result
+            result['failures'] = check(result, baseline, args)
+        result['env'] = configs[name]
+        results.append(result)
+        print(json.dumps({'type': 'golden_config', 'name': name, 'accuracy': result['accuracy'],
+                          'agreement': result.get('agreement'), 'failures': result['failures']}),
+              file=sys.stderr)
+
+    print_table(results)
+    for r in results:
+        r.pop('_predicted')
+        for reason in r['failures']:
+            print(f"FAIL {r['name']}: {reason}")
+        if r.get('skipped') and not r['failures']:
+            print(f"SKIP {r['name']}: {r['skipped']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'golden': args.golden, 'samples': len(requests), 'baseline': BASELINE,
+                       'max_drop': args.max_drop, 'max_class_drop': args.max_class_drop,
+                       'min_agreement': args.min_agreement, 'results': results}, f, indent=2)
+    return 1 if any(r['failures'] for r in results) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Golden-set accuracy guardrail for worker inference modes')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build_p = sub.add_parser('build', help='冻结 golden 集')
+    build_p.add_argument('--dataset', help='默认与 AIModelTrain.py 相同的查找路径')
+    build_p.add_argument('--frames', help='录制帧目录：<dir>/<label>/*.jpg')
+    build_p.add_argument('-o', '--output', default=GOLDEN_PATH)
+    build_p.add_argument('--force', action='store_true', help='覆盖已冻结的 golden 集')
+
+    run_p = sub.add_parser('run', help='逐配置评估')
+    run_p.add_argument('--golden', default=GOLDEN_PATH)
+    run_p.add_argument('--only', nargs='*', help=f'只跑这些配置（{BASELINE} 基线总会先跑）')
+    run_p.add_argument('--config', action='append', default=[], help='自定义配置 name:KEY=VALUE,KEY=VALUE')
+    run_p.add_argument('--max-drop', type=float, default=0.02, help='总体准确率相对基线的最大下降')
+    run_p.add_argument('--max-class-drop', type=float, default=0.34,
+                       help='单类准确率相对基线的最大下降（每类约 3 条留出样本，0.34 即允许错 1 条）')
+    run_p.add_argument('--min-agreement', type=float, default=0.95,
+                       help='与基线预测一致率下限（仅在总体准确率低于基线时作为失败条件）')
+    run_p.add_argument('--require-frames', action='store_true',
+                       help='golden 集没有录制帧时，把只影响 frames 的配置记为失败而非 SKIP')
+    run_p.add_argument('-o', '--output', help='完整结果（JSON）')
+    args = parser.parse_args()
+    return build(args) if args.command == 'build' else run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
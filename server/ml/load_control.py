@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+负载控制：为每个客户端计算推荐的发送帧率、JPEG 尺寸与发送模式
+- 服务时间：按模式（frame / landmarks）分别做 EWMA，单位毫秒/条
+- 活跃客户端：最近 window_s 秒内有消息的客户端（有序字典，从头部过期，均摊 O(1)）
+- 时间片公平分配：每秒可用处理时间 = 1000ms × 目标利用率，按活跃客户端均分，
+  再除以该客户端所用模式的服务时间 => 推荐帧率
+- AIMD 压力系数：出现丢帧或排队超标时乘性下降，否则加性恢复，避免所有人延迟同时崩溃
+- frame 模式分到的帧率低于下限时，推荐改用更便宜的 landmarks 模式；landmarks 模式下
+  整帧帧率回到下限的 RESUME_MARGIN 倍以上时，推荐恢复 frame 模式（留出滞回，避免来回切换）
+"""
+import time
+from collections import OrderedDict
+
+MODE_FRAME = 'frame'
+MODE_LANDMARKS = 'landmarks'
+
+# (负载上限, JPEG 宽度, JPEG 质量)：负载越高，推荐的帧越小
+JPEG_STEPS = [
+    (1.0, 320, 0.6),
+    (2.0, 240, 0.5),
+    (float('inf'), 160, 0.4),
+]
+# 从 landmarks 恢复 frame 模式所需的整帧帧率余量（相对 min_fps）
+RESUME_MARGIN = 1.5
+
+
+class LoadController:
+    """
+    参数:
+        min_fps / max_fps: 推荐帧率范围（max_fps 默认与前端当前发送速率一致）
+        utilization: 目标利用率（留出余量给突发）
+        queue_target_ms: 排队延迟目标，超过视为拥塞
+        window_s: 活跃客户端判定窗口
+        alpha: 服务时间 EWMA 系数
+    """
+
+    def __init__(self, min_fps=5.0, max_fps=20.0, utilization=0.8,
+                 queue_target_ms=100.0, window_s=5.0, alpha=0.2):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.utilization = utilization
+        self.queue_target_ms = queue_target_ms
+        self.window_s = window_s
+        self.alpha = alpha
+        self.service_ms = {MODE_FRAME: None, MODE_LANDMARKS: None}
+        self.pressure = 1.0          # AIMD 系数 (0.1 ~ 1.0)
+        self._last_decrease = 0.0
+        self._active = OrderedDict()  # client_id -> 最近一次消息时间
+
+    def _expire(self, now):
+        active = self._active
+        while active:
+            client_id, seen = next(iter(active.items()))
+            if now - seen <= self.window_s:
+                break
+            active.popitem(last=False)
+
+    def active_clients(self, now=None):
+        self._expire(time.monotonic() if now is None else now)
+        return max(1, len(self._active))
+
+    def observe(self, client_id, mode, service_ms, queue_ms=0.0, shed=False, now=None):
+        """记录一条消息的处理结果（shed=True 表示因过期被丢弃）"""
+        now = time.monotonic() if now is None else now
+        self._active[client_id] = now
+        self._active.move_to_end(client_id)
+        self._expire(now)
+        if not shed:
+            prev = self.service_ms[mode]
+            self.service_ms[mode] = service_ms if prev is None else self.alpha * service_ms + (1 - self.alpha) * prev
+        if shed or queue_ms > self.queue_target_ms:
+            # 乘性下降（每 200ms 最多一次，避免一次突发把系数压到底）
+            if now - self._last_decrease > 0.2:
+                self.pressure = max(0.1, self.pressure * 0.7)
+                self._last_decrease = now
+        else:
+            self.pressure = min(1.0, self.pressure + 0.01)
+
+    def _fps_for(self, mode, share_ms):
+        service = self.service_ms[mode]
+        if not service:
+            return self.max_fps
+        return share_ms / service
+
+    def recommend(self, client_id, mode, now=None):
+        """返回该客户端的推荐：fps / jpeg_width / jpeg_quality / mode / load（source 为当前所用模式）"""
+        source = mode
+        active = self.active_clients(now)
+        share_ms = 1000.0 * self.utilization * self.pressure / active  # 每客户端每秒可用处理时间
+        rate_mode = mode  # fps 与负载按哪种模式的服务时间计算
+        fps = self._fps_for(mode, share_ms)
+        if mode == MODE_FRAME and fps < self.min_fps and self.service_ms[MODE_LANDMARKS]:
+            mode = rate_mode = MODE_LANDMARKS
+            fps = self._fps_for(mode, share_ms)
+        elif mode == MODE_LANDMARKS and self._fps_for(MODE_FRAME, share_ms) >= self.min_fps * RESUME_MARGIN:
+            # 负载回落：客户端可以恢复发送整帧（fps 仍是 landmarks 路径自己的推荐帧率）
+            mode = MODE_FRAME
+        # 负载 = 所有人都按 max_fps 发送时的需求 / 可用处理时间
+        service = self.service_ms[rate_mode] or 0.0
+        load = active * self.max_fps * service / (1000.0 * self.utilization)
+        width, quality = next((w, q) for limit, w, q in JPEG_STEPS if load <= limit)
+        return {
+            'fps': round(min(self.max_fps, max(self.min_fps, fps)), 1),
+            'jpeg_width': width,
+            'jpeg_quality': quality,
+            'mode': mode,
+            'source': source,
+            'load': round(load, 3),
+        }
+
+    def stats(self):
+        return {
+            'active_clients': self.active_clients(),
+            'pressure': round(self.pressure, 3),
+            'service_ms': {k: round(v, 2) if v is not None else None for k, v in self.service_ms.items()},
+        }
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+多模型注册表：按 model_id 懒加载、内存预算 + LRU 常驻
+- 每条请求可带 model_id（课程 / 词表 / 用户微调的参考集），首次使用时才加载
+- 常驻模型总内存超过预算时，淘汰最久未使用的模型（默认模型固定常驻，不参与淘汰）
+- 同一模型文件 + 后端只加载一份：多个 model_id（别名）与所有客户端共享同一组数组
+- 每个模型自带概率平滑矩阵（类别数随模型而不同），会话通过 ClientState.smoother 判断是否需要重新分配行
+- 按 model_id 统计请求数 / 命中率 / 加载次数，按模型统计内存与淘汰次数（ping 回复中上报）
+
+模型 id 解析由调用方提供 resolve(model_id) -> (path, backend)，注册表只负责缓存与淘汰
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from smoothing import ProbabilitySmoother
+
+
+def model_nbytes(model):
+    """估算模型常驻内存：实例属性中的 NumPy 数组（含 sklearn 近邻树内部数组）"""
+    total = 0
+    for value in vars(model).values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif hasattr(value, 'get_arrays'):
+            # sklearn KDTree / BallTree
+            total += sum(a.nbytes for a in value.get_arrays() if isinstance(a, np.ndarray))
+        elif isinstance(value, (list, tuple)):
+            total += sum(v.nbytes for v in value if isinstance(v, np.ndarray))
+    return total
+
+
+class ModelEntry:
+    """一个常驻模型：模型对象、标签下标、平滑矩阵与统计"""
+    __slots__ = ('key', 'model', 'class_index', 'smoother', 'nbytes', 'pinned',
+                 'loaded_at', 'load_ms', 'last_used')
+
+    def __init__(self, key, model, alpha, pinned=False, load_ms=0.0):
+        self.key = key
+        self.model = model
+        self.class_index = {str(c): i for i, c in enumerate(model.classes_)}
+        self.smoother = ProbabilitySmoother(len(model.classes_), alpha=alpha)
+        self.nbytes = model_nbytes(model)
+        self.pinned = pinned
+        self.loaded_at = time.time()
+        self.load_ms = load_ms
+        self.last_used = self.loaded_at
+
+
+class ModelRegistry:
+    """
+    参数:
+        resolve: resolve(model_id) -> (path, backend)，未知 id 抛出 KeyError
+        load: load(path, backend) -> 模型对象
+        budget_bytes: 非固定模型的常驻内存上限（字节），0 表示不限制
+        alpha: 新模型平滑矩阵的 EMA 系数
+    """
+
+    def __init__(self, resolve, load, budget_bytes=0, alpha=0.35):
+        self.resolve = resolve
+        self.load = load
+        self.budget_bytes = budget_bytes
+        self.alpha = alpha
+        self._entries = OrderedDict()   # (realpath, backend) -> ModelEntry，LRU 顺序
+        self._aliases = {}              # model_id -> (realpath, backend)
+        self._lock = threading.Lock()
+        self._counters = {}             # model_id -> {'requests', 'hits', 'loads'}
+        self.evictions = {}             # (realpath, backend) -> 被淘汰次数
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, model_id):
+        key = self._aliases.get(model_id)
+        return key is not None and key in self._entries
+
+    def pin(self, model_id, model, path, backend):
+        """注册已加载的模型并固定常驻（启动时的默认模型）"""
+        key = (os.path.realpath(path), backend) if path else (model_id, backend)
+        with self._lock:
+            entry = ModelEntry(key, model, self.alpha, pinned=True)
+            self._aliases[model_id] = key
+            self._entries[key] = entry
+            self._counters.setdefault(model_id, {'requests': 0, 'hits': 0, 'loads': 0})
+        return entry
+
+    def get(self, model_id):
+        """返回 model_id 对应的 ModelEntry（未常驻时加载，必要时淘汰其它模型）"""
+        with self._lock:
+            counters = self._counters.get(model_id)
+            key = self._aliases.get(model_id)
+            if key is None:
+                path, backend = self.resolve(model_id)
+                key = (os.path.realpath(path), backend)
+                self._aliases[model_id] = key
+            if counters is None:
+                counters = self._counters[model_id] = {'requests': 0, 'hits': 0, 'loads': 0}
+            counters['requests'] += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                counters['hits'] += 1
+                self._entries.move_to_end(key)
+            else:
+                start = time.perf_counter()
+                model = self.load(key[0], key[1])
+                entry = ModelEntry(key, model, self.alpha, load_ms=(time.perf_counter() - start) * 1000)
+                self._entries[key] = entry
+                counters['loads'] += 1
+                self._evict_over_budget(keep=key)
+            entry.last_used = time.time()
+            return entry
+
+    def resident_bytes(self, include_pinned=False):
+        return sum(e.nbytes for e in self._entries.values() if include_pinned or not e.pinned)
+
+    def _evict_over_budget(self, keep):
+        """从 LRU 头部淘汰非固定模型，直到未固定模型的内存回到预算内（刚加载的模型保留）"""
+        if self.budget_bytes <= 0:
+            return
+        for key in list(self._entries):
+            if self.resident_bytes() <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.pinned or key == keep:
+                continue
+            del self._entries[key]
+            self.evictions[key] = self.evictions.get(key, 0) + 1
+
+    def stats(self):
+        """每个 model_id 的命中率与所属模型的内存 / 常驻状态"""
+        with self._lock:
+            models = {}
+            for model_id, counters in self._counters.items():
+                key = self._aliases.get(model_id)
+                entry = self._entries.get(key)
+                requests = counters['requests']
+                models[model_id] = dict(
+                    counters,
+                    hit_rate=round(counters['hits'] / requests, 4) if requests else None,
+                    resident=entry is not None,
+                    pinned=entry.pinned if entry is not None else False,
+                    nbytes=entry.nbytes if entry is not None else 0,
+                    evictions=self.evictions.get(key, 0),
+                    shared_with=sorted(m for m, k in self._aliases.items() if k == key and m != model_id),
+                )
+            return {
+                'budget_bytes': self.budget_bytes,
+                'resident_models': len(self._entries),
+                'resident_bytes': self.resident_bytes(include_pinned=True),
+                'unpinned_bytes': self.resident_bytes(),
+                'models': models,
+            }
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+流水线 worker 模式（线程 + 有界队列）
+把原来串行的 读 stdin -> 解码 -> MediaPipe/KNN -> 写 stdout 拆成四个阶段：
+
+    reader ──q_in──> decode × N ──q_decoded──> infer × 1 ──q_out──> writer
+
+- 解码阶段（JSON 解析 + JPEG 解码）可多线程：cv2.imdecode 会释放 GIL
+- 推理阶段单线程：MediaPipe Hands 图是有状态的，且按到达顺序处理（带重排缓冲）
+- 队列有界，读得太快时自然反压到 stdin
+相邻帧的解码、推理和输出可以重叠执行
+"""
+import heapq
+import json
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class StagePipeline:
+    """
+    参数:
+        prepare: prepare(message) -> message，解码阶段的工作（可在多线程中调用）
+        handle: handle(message) -> reply | None，推理阶段的工作（单线程）
+        emit: emit(reply)，写出阶段
+        decode_threads: 解码阶段线程数
+        queue_size: 每个阶段间队列的容量
+        on_close: 推理线程退出前在该线程上调用（释放线程绑定的资源，如 cProfile 钩子）
+    """
+
+    def __init__(self, prepare, handle, emit, decode_threads=2, queue_size=8, on_close=None):
+        if decode_threads < 1:
+            raise ValueError(f'decode_threads must be >= 1, got {decode_threads}')
+        self.prepare = prepare
+        self.handle = handle
+        self.emit = emit
+        self.on_close = on_close
+        self.decode_threads = decode_threads
+        self.q_in = queue.Queue(maxsize=queue_size)
+        self.q_decoded = queue.Queue(maxsize=queue_size)
+        self.q_out = queue.Queue(maxsize=queue_size)
+        self.messages = 0
+        self.replies = 0
+        self.elapsed = 0.0
+
+    def _reader(self, stream):
+        idx = 0
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            self.q_in.put((idx, line))
+            idx += 1
+        self.messages = idx
+        for _ in range(self.decode_threads):
+            self.q_in.put(_STOP)
+
+    def _decoder(self):
+        while True:
+            item = self.q_in.get()
+            if item is _STOP:
+                self.q_decoded.put(_STOP)
+                return
+            idx, line = item
+            try:
+                message = self.prepare(json.loads(line))
+                self.q_decoded.put((idx, message, None))
+            except Exception as e:
+                self.q_decoded.put((idx, None, e))
+
+    def _infer(self):
+        # 解码是多线程的，这里按原始顺序重排后再推理
+        pending = []
+        next_idx = 0
+        stopped = 0
+        while stopped < self.decode_threads:
+            item = self.q_decoded.get()
+            if item is _STOP:
+                stopped += 1
+                continue
+            heapq.heappush(pending, (item[0], id(item), item))
+            while pending and pending[0][0] == next_idx:
+                _, _, (_, message, error) = heapq.heappop(pending)
+                next_idx += 1
+                self.q_out.put(self._run(message, error))
+        while pending:
+            _, _, (_, message, error) = heapq.heappop(pending)
+            self.q_out.put(self._run(message, error))
+        if self.on_close is not None:
+            try:
+                self.on_close()
+            except Exception as e:
+                self.q_out.put({'type': 'error', 'msg_class': 'error', 'message': str(e)})
+        self.q_out.put(_STOP)
+
+    def _run(self, message, error):
+        if error is not None:
+            return {'type': 'error', 'msg_class': 'error', 'message': str(error)}
+        try:
+            return self.handle(message)
+        except Exception as e:
+            return {'type': 'error', 'msg_class': 'error', 'message': str(e)}
+
+    def _writer(self):
+        while True:
+            reply = self.q_out.get()
+            if reply is _STOP:
+                return
+            if reply is not None:
+                self.emit(reply)
+                self.replies += 1
+
+    def run(self, stream):
+        """运行到输入流结束，返回吞吐统计"""
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._reader, args=(stream,), daemon=True)]
+        threads += [threading.Thread(target=self._decoder, daemon=True) for _ in range(self.decode_threads)]
+        threads += [threading.Thread(target=self._infer, daemon=True),
+                    threading.Thread(target=self._writer, daemon=True)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.elapsed = time.perf_counter() - start
+        return self.stats()
+
+    def stats(self):
+        return {
+            'type': 'pipeline_stats',
+            'decode_threads': self.decode_threads,
+            'messages': self.messages,
+            'replies': self.replies,
+            'elapsed_s': round(self.elapsed, 3),
+            'msgs_per_s': round(self.messages / self.elapsed, 2) if self.elapsed > 0 else None,
+        }
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+对比 worker 串行模式与流水线模式的吞吐量
+用同一批 process_frame 消息分别驱动 WORKER_MODE=sequential / pipeline，
+统计从第一条发出到最后一条结果返回的耗时，输出 msgs/s 与加速比
+
+用法:
+    python server/ml/pipeline_bench.py [--frames 300] [--width 640] [--height 480]
+                                        [--threads 1 2 4] [--image path.jpg]
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'realtime_recognition.py')
+
+
+def make_frame(width, height, image_path=None):
+    """返回一帧 base64 JPEG（优先使用给定图片，否则生成带噪声的渐变图）"""
+    if image_path:
+        img = cv2.imread(image_path)
+        img = cv2.resize(img, (width, height))
+    else:
+        rng = np.random.default_rng(0)
+        ramp = np.linspace(0, 255, width, dtype=np.uint8)
+        img = np.repeat(np.repeat(ramp[None, :, None], height, axis=0), 3, axis=2)
+        img = cv2.add(img, rng.integers(0, 40, img.shape, dtype=np.uint8))
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return base64.b64encode(buf.tobytes()).decode('ascii')
+
+
+def run_worker(lines, env_overrides):
+    """启动 worker，灌入全部消息，返回 (结果数, 耗时秒)"""
+    env = dict(os.environ, WORKER_LOG_LEVEL='warning', **env_overrides)
+    proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, env=env)
+    # 等待 ready，排除模型加载时间
+    while True:
+        line = proc.stdout.readline()
+        if not line or json.loads(line).get('type') == 'ready':
+            break
+
+    def feed():
+        for line in lines:
+            proc.stdin.write(line)
+        proc.stdin.close()
+
+    start = time.perf_counter()
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    results = sum(1 for line in proc.stdout if '"msg_class": "result"' in line)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    proc.wait()
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sequential vs pipeline worker throughput')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--image', default=None)
+    args = parser.parse_args()
+
+    frame = make_frame(args.width, args.height, args.image)
+    lines = [json.dumps({'type': 'process_frame', 'client_id': f'bench_{i % 4}', 'seq': i,
+                         'frame': frame, 'target_gesture': 'A'}) + '\n'
+             for i in range(args.frames)]
+
+    n, base = run_worker(lines, {'WORKER_MODE': 'sequential'})
+    rows = [{'mode': 'sequential', 'threads': 0, 'results': n,
+             'msgs_per_s': round(n / base, 2), 'speedup': 1.0}]
+    for threads in args.threads:
+        n, elapsed = run_worker(lines, {'WORKER_MODE': 'pipeline', 'WORKER_DECODE_THREADS': str(threads)})
+        rows.append({'mode': 'pipeline', 'threads': threads, 'results': n,
+                     'msgs_per_s': round(n / elapsed, 2), 'speedup': round(base / elapsed, 2)})
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == '__main__':
+    main()
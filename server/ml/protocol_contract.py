@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Worker 协议契约检查：本地启动 realtime_recognition.py，模拟多客户端交错发送 landmarks，
+把 worker 的输出直接交给桥接层的真实路由实现（server/worker_router.ts，经 scripts/route_contract.ts 驱动），校验：
+- 每个正在识别的客户端恰好收到一个 gesture_result / 请求，且 client_id / seq 与请求一致、seq 单调递增
+- 已连接但未在识别的客户端收不到任何结果
+- control 消息（ready / pong）不会被路由给任何客户端；管理通道（string seq）的回复交给等待中的请求
+- 桥接端跑不起来（没有 tsx / node）时直接失败，而不是退回 Python 的模拟路由
+
+用法:
+    python server/ml/protocol_contract.py [--clients 100] [--frames 5] [--seed 0]
+    （npm test 即运行本检查；ROUTE_CONTRACT_CMD 可替换桥接端命令）
+退出码 0 表示通过，1 表示失败
+"""
+import argparse
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+from collections import defaultdict
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'realtime_recognition.py')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ROUTER_CMD = os.getenv('ROUTE_CONTRACT_CMD', 'npx --no-install tsx scripts/route_contract.ts')
+ADMIN_SEQ = 'admin-1'
+
+
+def synthetic_points(rng):
+    """生成 21 个 norm01 范围内的随机关键点"""
+    return [[rng.random(), rng.random(), rng.random() * 0.1] for _ in range(21)]
+
+
+def build_requests(n_clients, n_frames, rng):
+    """为每个客户端生成 n_frames 条请求，并随机交错（保持同一客户端内部顺序）"""
+    queues = []
+    for c in range(n_clients):
+        client_id = f'contract_{c}'
+        target = rng.choice('ACDEFGHIKLMNOPQRSTUVWXY')
+        queues.append([{
+            'type': 'process_landmarks',
+            'client_id': client_id,
+            'seq': seq,
+            'points': synthetic_points(rng),
+            'image': {'width': 640, 'height': 480, 'unit': 'norm01'},
+            'mirrored': bool(rng.getrandbits(1)),
+            'target_gesture': target,
+            'ts': 0,
+        } for seq in range(1, n_frames + 1)])
+    requests = []
+    while queues:
+        q = rng.choice(queues)
+        requests.append(q.pop(0))
+        if not q:
+            queues.remove(q)
+    return requests
+
+
+def run(n_clients, n_frames, seed):
+    rng = random.Random(seed)
+    requests = build_requests(n_clients, n_frames, rng)
+    # 中途插入 ping（普通 control）与管理通道 ping（string seq），检查 control 消息不会被路由给客户端
+    requests.insert(len(requests) // 2, {'type': 'ping'})
+    requests.insert(len(requests) // 3, {'type': 'ping', 'seq': ADMIN_SEQ})
+    # 前两个客户端视为已连接但未在识别：它们的结果必须被桥接层丢弃
+    inactive = {f'contract_{c}' for c in range(min(2, n_clients - 1))}
+
+    env = dict(os.environ, WORKER_LOG_LEVEL='warning')
+    proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, env=env)
+    router_cmd = shlex.split(ROUTER_CMD) + ['--pending', ADMIN_SEQ]
+    if inactive:
+        router_cmd += ['--inactive', ','.join(sorted(inactive))]
+    try:
+        router = subprocess.Popen(router_cmd, cwd=REPO_ROOT, stdin=proc.stdout, stdout=subprocess.PIPE,
+                                  text=True)
+    except OSError as e:
+        proc.kill()
+        print(f'FAIL bridge router could not start ({ROUTER_CMD}): {e}')
+        return 1
+    proc.stdout.close()  # 只由桥接端读取
+
+    def feed():
+        try:
+            for req in requests:
+                proc.stdin.write(json.dumps(req) + '\n')
+            proc.stdin.close()
+        except OSError:
+            pass  # 桥接端提前退出时 worker 的管道会断开，下面按失败处理
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+
+    inboxes = defaultdict(list)   # 桥接层投递给各客户端的消息
+    outcomes = defaultdict(list)  # 路由结果 -> 原始输出的 type
+    resolved, raw, end = [], [], None
+    for line in router.stdout:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            raw.append(line)
+            continue
+        kind = event.get('event')
+        if kind == 'deliver':
+            inboxes[event['client_id']].append(event['message'])
+        elif kind == 'resolved':
+            resolved.append(event['seq'])
+        elif kind == 'raw':
+            raw.append(event['line'])
+        elif kind == 'end':
+            end = event
+        elif kind in ('result', 'control', 'dropped'):
+            outcomes[kind].append(event)
+    writer.join()
+    proc.wait()
+    router.wait()
+
+    failures = []
+    if end is None:
+        failures.append(f'bridge router exited with code {router.returncode} before the worker output ended '
+                        f'({ROUTER_CMD}); is tsx installed (npm install)?')
+    expected = defaultdict(list)
+    for req in requests:
+        if req['type'] == 'process_landmarks':
+            expected[req['client_id']].append(req['seq'])
+
+    for client_id, seqs in expected.items():
+        got = inboxes.get(client_id, [])
+        got_seqs = [m.get('seq') for m in got]
+        want = [] if client_id in inactive else seqs
+        if got_seqs != want:
+            failures.append(f'{client_id}: expected seqs {want}, got {got_seqs}')
+        for m in got:
+            if m.get('type') != 'gesture_result':
+                failures.append(f"{client_id}: delivered message type {m.get('type')!r}")
+            data_client = (m.get('data') or {}).get('client_id', m.get('client_id'))
+            if data_client != client_id:
+                failures.append(f'{client_id}: received result for {data_client}')
+    stray = set(inboxes) - set(expected)
+    if stray:
+        failures.append(f'results routed to unknown clients: {sorted(stray)}')
+    dropped_results = [e for e in outcomes['dropped'] if e.get('client_id') in inactive]
+    inactive_requests = sum(len(expected[c]) for c in inactive)
+    if len(dropped_results) != inactive_requests:
+        failures.append(f'expected {inactive_requests} results dropped for inactive clients, '
+                        f'got {len(dropped_results)}')
+    if not any(e.get('type') == 'pong' for e in outcomes['control']):
+        failures.append('pong was not routed as a control message')
+    if resolved != [ADMIN_SEQ] or (end and end.get('unresolved')):
+        failures.append(f'admin control reply not resolved: resolved={resolved}')
+    if raw:
+        failures.append(f'{len(raw)} non-JSON output lines, first: {raw[0]!r}')
+
+    total = sum(len(v) for v in expected.values())
+    routed = sum(len(v) for v in inboxes.values())
+    print(json.dumps({
+        'clients': n_clients,
+        'requests': total,
+        'routed_results': routed,
+        'dropped_inactive': len(dropped_results),
+        'control_messages': len(outcomes['control']),
+        'failures': len(failures),
+    }))
+    for f in failures[:20]:
+        print(f'FAIL {f}')
+    return 0 if not failures and proc.returncode == 0 and router.returncode == 0 else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(run(args.clients, args.frames, args.seed))
+
+
+if __name__ == '__main__':
+    main()
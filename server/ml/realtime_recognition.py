@@ -10,52 +10,270 @@ import base64
 import cv2
 import mediapipe as mp
 import numpy as np
-import joblib
 import os
+import hashlib
+import re
+import tempfile
 import time
+import threading
 from collections import defaultdict
 
+from classifiers import CascadeKNNBackend, OnlineKNNBackend, TargetVerifier, load_backend
+from client_state import ClientStateStore
+from worker_log import create_logger
+from pipeline import StagePipeline
+from scheduler import NO_DEADLINE, DeadlineQueue, message_deadline
+from load_control import MODE_FRAME, MODE_LANDMARKS, LoadController
+from frame_ring import FrameRing
+from traffic_capture import TrafficTap
+from sample_log import SampleLog
+from model_registry import ModelRegistry
+from worker_profiler import ProfileSession
+
+# 诊断日志走独立通道（默认 stderr），stdout 只输出结果与协议回复
+log = create_logger()
+
+# Debug 模式开关（PY_DEBUG 环境变量 或 WORKER_LOG_LEVEL=debug）
+DEBUG = log.enabled('debug')
+
+# Worker 模式：sequential（默认，逐条串行）/ pipeline（解码与推理分阶段重叠执行）
+WORKER_MODE = os.getenv("WORKER_MODE", "sequential").lower()
+DECODE_THREADS = int(os.getenv("WORKER_DECODE_THREADS", "2"))  # 流水线解码阶段线程数
+PIPELINE_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "8"))  # 阶段间队列容量
+
+# 帧传输：pipe（默认，base64 JPEG 随 JSON 走 stdin）/ shm（JPEG 写入共享内存帧环，stdin 只传槽位号）
+FRAME_TRANSPORT = os.getenv("FRAME_TRANSPORT", "pipe").lower()
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "16"))          # 槽位数（≥ 在途帧数）
+FRAME_RING_SLOT_KB = int(os.getenv("FRAME_RING_SLOT_KB", "512"))     # 每槽容量（KB）
+frame_ring = None  # main() 中创建，退出时释放
+
+# 流量抓取：设置 TRAFFIC_CAPTURE_DIR 后把识别消息写入滚动二进制日志（traffic_replay.py 回放）
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", "")
+TRAFFIC_CAPTURE_SAMPLE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE", "1.0"))    # 会话采样率
+TRAFFIC_CAPTURE_MAX_MB = int(os.getenv("TRAFFIC_CAPTURE_MAX_MB", "256"))      # 磁盘占用上限
+TRAFFIC_CAPTURE_SEGMENT_MB = int(os.getenv("TRAFFIC_CAPTURE_SEGMENT_MB", "16"))
+traffic_tap = None
+
+# 按需剖析：profile_start / profile_stop 控制消息，输出写到 PROFILE_DIR，单次会话最长 PROFILE_MAX_S 秒
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), 'gesture-profiles'))
+PROFILE_MAX_S = float(os.getenv("PROFILE_MAX_S", "300"))
+profile_session = None
+profile_lock = threading.Lock()  # 处理线程与计时器线程都可能结束会话
+
+# 延迟预算（毫秒）：截止时间 = ts + 预算，过期帧在推理前丢弃；0 表示关闭
+# 开启后串行模式按最早截止时间优先（EDF）跨客户端调度
+LATENCY_BUDGET_MS = float(os.getenv("LATENCY_BUDGET_MS", "0"))
+shed_total = 0  # 全局丢弃帧数
+
+# 自适应反馈：在 gesture_result 中附带推荐的发送帧率 / JPEG 尺寸 / 模式，拥塞时让客户端主动降速
+ADAPTIVE_RATE = os.getenv("ADAPTIVE_RATE", "true").lower() == "true"
+load_controller = LoadController(
+    min_fps=float(os.getenv("MIN_SEND_FPS", "5")),
+    max_fps=float(os.getenv("MAX_SEND_FPS", "20")),
+    queue_target_ms=float(os.getenv("QUEUE_TARGET_MS", "100")),
+)
+
 # 初始化MediaPipe Hands
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
 
-hands = mp_hands.Hands(
-    static_image_mode=False,
-    max_num_hands=2,
-    min_detection_confidence=0.7,
-    min_tracking_confidence=0.7
-)
+# 静态图片模式：只给离线批量打分的图片任务用（每张图独立检测，不做跨帧跟踪）
+HANDS_STATIC_IMAGE_MODE = os.getenv("HANDS_STATIC_IMAGE_MODE", "false").lower() == "true"
+
+# 每个进程一个 Hands：首次使用时创建（只导入本模块的离线工具不会多建一份 MediaPipe 图），
+# worker 在 ready 之前预热，首帧延迟不变
+hands = None
+_hands_lock = threading.Lock()
+
+def get_hands():
+    global hands
+    if hands is None:
+        with _hands_lock:
+            if hands is None:
+                hands = mp_hands.Hands(
+                    static_image_mode=HANDS_STATIC_IMAGE_MODE,
+                    max_num_hands=2,
+                    min_detection_confidence=0.7,
+                    min_tracking_confidence=0.7
+                )
+    return hands
+
+# 加载训练好的模型（MODEL_BACKEND 选择后端：knn / cascade / centroid / mlp，见 classifiers.py）
+MODEL_FILES = {
+    'knn': 'asl_knn_model.pkl',
+    'cascade': 'asl_knn_model.pkl',  # 由 KNN 参考样本构建级联索引
+    'centroid': 'asl_centroid_model.npz',
+    'mlp': 'asl_mlp_model.npz',
+}
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "knn").lower()
+CASCADE_CANDIDATES = int(os.getenv("CASCADE_CANDIDATES", "5"))  # 级联先做精确搜索的候选类数（只影响速度，不影响结果）
+VERIFY_MODE = os.getenv("VERIFY_MODE", "false").lower() == "true"  # 有目标手势时走目标验证（练习模式）
+model_file = MODEL_FILES.get(MODEL_BACKEND, MODEL_FILES['knn'])
+
+def load_model(path, backend=None):
+    """加载模型文件；backend='cascade' 时由 KNN 参考样本构建级联索引"""
+    loaded = load_backend(path)
+    if backend == 'cascade':
+        loaded = CascadeKNNBackend.from_sklearn(loaded, candidates=CASCADE_CANDIDATES)
+    return loaded
 
-# 加载训练好的模型
 model = None
 possible_paths = [
-    'server/ml/asl_knn_model.pkl',
-    'asl_knn_model.pkl',
-    os.path.join(os.path.dirname(__file__), 'asl_knn_model.pkl')
+    os.path.join('server/ml', model_file),
+    model_file,
+    os.path.join(os.path.dirname(__file__), model_file)
 ]
 
 model_loaded = False
 for model_path in possible_paths:
     try:
         if os.path.exists(model_path):
-            model = joblib.load(model_path)
-            print(json.dumps({'type': 'status', 'message': f'✅ 模型加载成功: {model_path}'}), flush=True)
+            model = load_model(model_path, MODEL_BACKEND)
+            log.info({'type': 'status', 'message': f'✅ 模型加载成功: {model_path}', 'backend': MODEL_BACKEND})
             model_loaded = True
             break
     except Exception as e:
         continue
 
 if not model_loaded:
-    print(json.dumps({'type': 'warning', 'message': '⚠️ 模型文件未找到'}), flush=True)
+    log.warning({'type': 'warning', 'message': '⚠️ 模型文件未找到'})
+
+# 在线参考索引：add_samples 追加用户确认的样本（仅 knn 后端），追加日志持久化，定期压缩为新模型文件
+ONLINE_INDEX = os.getenv("ONLINE_INDEX", "false").lower() == "true"
+ONLINE_CLASS_CAP = int(os.getenv("ONLINE_CLASS_CAP", "64"))            # 每类在线样本上限（超出后蓄水池抽样）
+ONLINE_COMPACT_EVERY = int(os.getenv("ONLINE_COMPACT_EVERY", "500"))   # 日志累计多少条后压缩
+ONLINE_CONFIRM_CONFIDENCE = float(os.getenv("ONLINE_CONFIRM_CONFIDENCE", "0.9"))  # 帧被确认为目标手势所需的置信度
+sample_log = None
+if ONLINE_INDEX and model_loaded:
+    model_dir = os.path.dirname(os.path.abspath(model_path))
+    ONLINE_INDEX_PATH = os.getenv("ONLINE_INDEX_PATH", os.path.join(model_dir, 'asl_knn_online.npz'))
+    ONLINE_LOG_PATH = os.getenv("ONLINE_LOG_PATH", os.path.join(model_dir, 'asl_samples.log'))
+    if MODEL_BACKEND != 'knn':
+        log.warning({'type': 'warning', 'message': f'⚠️ ONLINE_INDEX 仅支持 knn 后端（当前 {MODEL_BACKEND}），已忽略'})
+    else:
+        with open(model_path, 'rb') as f:
+            base_sha256 = hashlib.sha256(f.read()).hexdigest()
+        index = load_backend(ONLINE_INDEX_PATH) if os.path.exists(ONLINE_INDEX_PATH) else None
+        if index is not None and index.base_sha256 == base_sha256:
+            model = index  # 最近一次压缩的结果
+        else:
+            model = OnlineKNNBackend.from_sklearn(model, class_cap=ONLINE_CLASS_CAP, base_sha256=base_sha256)
+            if index is not None:
+                # 模型文件已重新训练：压缩索引里的基础样本过期，以新模型为基础重建，保留已有的在线样本
+                model.generation, model.seed = index.generation, index.seed
+                carried, dropped = 0, 0
+                for label, vector in index.online_samples():
+                    try:
+                        model.add(vector, label)
+                        carried += 1
+                    except ValueError:
+                        dropped += 1  # 新模型已没有该类别
+                model.save(ONLINE_INDEX_PATH)
+                log.warning({'type': 'warning', 'message': f'⚠️ {model_path} 已变化，在线索引已按新模型重建',
+                             'carried': carried, 'dropped': dropped})
+        sample_log = SampleLog(ONLINE_LOG_PATH, generation=model.generation)
+        if sample_log.generation < model.generation:
+            # 上次压缩已写出模型但没来得及清空日志：日志内容已在模型中
+            sample_log.reset(model.generation)
+        replayed = 0
+        for label, vector in sample_log:
+            model.add(vector, label)
+            replayed += 1
+        log.info({'type': 'status', 'message': f'✅ 在线索引已加载（重放 {replayed} 条日志）', **model.stats()})
+
+# 标签 -> 概率向量下标
+class_index = {str(c): i for i, c in enumerate(model.classes_)} if model is not None else {}
+
+# 目标验证器：只比较目标类与其易混类（AIModelTrain.py 生成 asl_verifier.npz）
+verifier = None
+if VERIFY_MODE:
+    for verifier_path in [p.replace(model_file, 'asl_verifier.npz') for p in possible_paths]:
+        if os.path.exists(verifier_path):
+            try:
+                verifier = TargetVerifier.load(verifier_path)
+                log.info({'type': 'status', 'message': f'✅ 目标验证器加载成功: {verifier_path}'})
+                break
+            except Exception as e:
+                log.warning({'type': 'warning', 'message': f'⚠️ 目标验证器加载失败: {e}'})
+    if verifier is None:
+        log.warning({'type': 'warning', 'message': '⚠️ VERIFY_MODE 已开启但未找到 asl_verifier.npz'
+                     '（AIModelTrain.py 只在验证器精度不低于 KNN 时发布），回退到普通分类'})
 
 # EMA 平滑配置（支持 client_id 隔离）
-ema_conf = {}  # key: "client_id:target" -> (value, timestamp)
-EMA_ALPHA = 0.35  # 平滑系数
-MAX_CACHE_AGE = 300  # EMA 缓存过期时间（秒）= 5 分钟
-frame_count = 0  # 帧计数器，用于定期清理缓存
+EMA_ALPHA = float(os.getenv("EMA_ALPHA", "0.35"))  # 平滑系数（EMA_ALPHA 环境变量可调）
+MAX_CACHE_AGE = int(os.getenv("CLIENT_STATE_TTL", "300"))  # 会话状态过期时间（秒）= 5 分钟
+CLIENT_STATE_CAPACITY = int(os.getenv("CLIENT_STATE_CAPACITY", "1024"))  # 最多保留的会话数
+
+# 多模型注册表：请求中的 model_id 选择课程 / 词表 / 用户微调模型，首次使用时加载，
+# 非默认模型总内存超过 MODEL_MEMORY_MB 时按 LRU 淘汰；默认模型（id 'default'）固定常驻
+# model_id 解析顺序：MODEL_REGISTRY_DIR/models.json 清单 -> 后端名（knn / cascade / centroid / mlp）
+#                  -> MODEL_REGISTRY_DIR/<model_id>.npz|.pkl
+# MODEL_REGISTRY_DIR 是单独的模型目录（默认 server/ml/models），只放可供客户端选择的模型文件：
+# 客户端传来的 model_id 只能命中这里的文件，不会加载源码目录中的其它 .pkl
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+MODEL_MEMORY_MB = float(os.getenv("MODEL_MEMORY_MB", "256"))
+DEFAULT_MODEL_ID = 'default'
+MODEL_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$')  # 只允许简单文件名，防止路径穿越
+
+model_manifest = {}
+_manifest_path = os.path.join(MODEL_REGISTRY_DIR, 'models.json')
+if os.path.exists(_manifest_path):
+    try:
+        with open(_manifest_path) as f:
+            model_manifest = json.load(f)  # {model_id: "file.npz" | {"path": ..., "backend": "cascade"}}
+    except (OSError, ValueError) as e:
+        log.warning({'type': 'warning', 'message': f'⚠️ 模型清单读取失败: {e}'})
+
+def resolve_model(model_id):
+    """model_id -> (模型文件路径, 后端包装)；未知 id 抛出 KeyError"""
+    if not MODEL_ID_PATTERN.match(model_id):
+        raise KeyError(f'invalid model_id: {model_id}')
+    spec = model_manifest.get(model_id)
+    if spec is not None:
+        if isinstance(spec, str):
+            spec = {'path': spec}
+        root = os.path.realpath(MODEL_REGISTRY_DIR)
+        path = os.path.realpath(os.path.join(root, spec['path']))
+        if os.path.commonpath([root, path]) != root:
+            raise KeyError(f'manifest path outside MODEL_REGISTRY_DIR: {model_id}')
+        return path, spec.get('backend')
+    if model_id in MODEL_FILES:
+        for path in [p.replace(model_file, MODEL_FILES[model_id]) for p in possible_paths]:
+            if os.path.exists(path):
+                return path, 'cascade' if model_id == 'cascade' else None
+    for ext in ('.npz', '.pkl'):
+        path = os.path.join(MODEL_REGISTRY_DIR, model_id + ext)
+        if os.path.exists(path):
+            return path, None
+    raise KeyError(f'unknown model_id: {model_id}')
+
+model_registry = ModelRegistry(resolve_model, load_model, budget_bytes=int(MODEL_MEMORY_MB * (1 << 20)),
+                               alpha=EMA_ALPHA)
+default_entry = None
+if model is not None:
+    # 在线索引会被 add_samples 修改，不与同一文件的只读副本共享
+    default_backend = 'online' if sample_log is not None else ('cascade' if MODEL_BACKEND == 'cascade' else None)
+    default_entry = model_registry.pin(DEFAULT_MODEL_ID, model, model_path, default_backend)
 
-# Debug 模式开关（PY_DEBUG 环境变量）
-DEBUG = os.getenv("PY_DEBUG", "false").lower() == "true" or os.getenv("DEBUG", "false").lower() == "true"
+def model_entry(message):
+    """按消息中的 model_id 取模型（省略时为默认模型，未加载任何模型时为 None）"""
+    model_id = message.get('model_id') or DEFAULT_MODEL_ID
+    if model_id == DEFAULT_MODEL_ID and default_entry is None:
+        return None
+    return model_registry.get(model_id)
+
+def _release_client_state(key, state):
+    """会话被淘汰时归还平滑矩阵中的行"""
+    if state.row is not None and state.smoother is not None:
+        state.smoother.release(state.row)
+        state.row = None
+        state.smoother = None
+
+# 每个 (client_id, target) 的状态：EMA / 最近预测 / tracker / landmarks 历史
+# 有界 LRU + 过期时间，均摊 O(1) 淘汰，替代原来的全局 ema_conf + 每 100 帧全量扫描
+client_states = ClientStateStore(capacity=CLIENT_STATE_CAPACITY, ttl=MAX_CACHE_AGE,
+                                 on_evict=_release_client_state)
 
 def extract_landmarks(hand_landmarks):
     """提取手部关键点特征（与训练时一致）"""
@@ -66,21 +284,85 @@ def extract_landmarks(hand_landmarks):
     user_vector.extend([lm.z for lm in hand_landmarks.landmark])
     return user_vector
 
-def ema_smooth(client_id, target, value):
+def ema_smooth_batch(keys, probs_matrix, entry=None):
+    """
+    批量平滑多个会话的类别概率向量（一次向量化运算）
+    参数:
+        keys: [(client_id, target), ...]，同一批内不重复
+        probs_matrix: (N, n_classes) 原始概率
+        entry: 产生这批概率的模型（ModelEntry，None 为默认模型）
+    返回:
+        (N, n_classes) 平滑后的概率
+    """
+    smoother = (entry or default_entry).smoother
+    # 先取齐所有会话并持有引用：批内后面的 get_or_create 可能因容量淘汰前面的会话，
+    # 之后不再按 key 重新查找（被淘汰的记录查不到）
+    states = [client_states.get_or_create(key) for key in keys]
+    rows = []
+    for key, state in zip(keys, states):
+        if state.smoother is not smoother:
+            # 会话切换了模型（或模型被淘汰后重新加载）：在该模型的平滑矩阵中重新分配一行
+            _release_client_state(key, state)
+            state.row = smoother.acquire()
+            state.smoother = smoother
+        rows.append(state.row)
+    smoothed = smoother.update(rows, probs_matrix)
+    for key, state, vec in zip(keys, states, smoothed):
+        state.ema = float(vec.max())
+        if key not in client_states:
+            # 批内已被淘汰：本帧照常返回平滑结果，临时分配的行立即归还
+            _release_client_state(key, state)
+    return smoothed
+
+def ema_smooth(client_id, target, probs, entry=None):
     """
     指数移动平均平滑函数（支持 client_id 隔离）
     参数:
         client_id: 客户端唯一标识
         target: 目标手势
-        value: 当前帧的原始置信度
+        probs: 当前帧的原始类别概率向量
+        entry: 产生该概率的模型（None 为默认模型）
     返回:
-        平滑后的置信度
+        平滑后的类别概率向量
     """
-    key = f"{client_id}:{target}"
-    prev_value, _ = ema_conf.get(key, (0.0, 0))
-    smoothed = EMA_ALPHA * value + (1 - EMA_ALPHA) * prev_value
-    ema_conf[key] = (smoothed, time.time())
-    return smoothed
+    return ema_smooth_batch([(client_id, target)], [probs], entry)[0]
+
+def classify(user_vector, entry=None):
+    """
+    单次推理：只调用一次 predict_proba，标签取概率最大的类别
+    （原来 predict + predict_proba 会让 KNN 搜索两遍）
+    返回: (标签, 置信度, 概率向量)
+    """
+    clf = (entry or default_entry).model
+    probs = clf.predict_proba([user_vector])[0]
+    best = int(np.argmax(probs))
+    return clf.classes_[best], float(probs[best]), probs
+
+def verify_target(user_vector, target):
+    """
+    目标验证：只计算到目标类和易混类的距离，返回 (标签, 置信度, 概率向量, 匹配概率)
+    概率向量只在目标类和最近易混类上有值，便于复用概率平滑
+    """
+    match_prob, rival = verifier.verify(user_vector, target)
+    label = target if match_prob >= verifier.threshold else rival
+    probs = None
+    if target in class_index and str(rival) in class_index:
+        probs = np.zeros(len(class_index), dtype=np.float32)
+        probs[class_index[target]] = match_prob
+        probs[class_index[str(rival)]] = 1.0 - match_prob
+    return label, max(match_prob, 1.0 - match_prob), probs, match_prob
+
+def smooth_prediction(client_id, target, predicted_label, raw_confidence, probs, entry=None):
+    """
+    对当前帧结果做时间平滑，返回 (平滑后标签, 平滑后置信度, 平滑后概率向量)
+    模型未加载或推理失败（probs 为 None）时原样返回，概率向量为 None
+    """
+    entry = entry or default_entry
+    if probs is None or entry is None:
+        return predicted_label, raw_confidence, None
+    smoothed_probs = ema_smooth(client_id, target, probs, entry)
+    best = int(np.argmax(smoothed_probs))
+    return entry.model.classes_[best], float(smoothed_probs[best]), smoothed_probs
 
 def check_landmarks_quality(landmarks_data, is_raw_points=False):
     """
@@ -118,25 +400,6 @@ def check_landmarks_quality(landmarks_data, is_raw_points=False):
     
     return landmarks_ok, avg_vis, bbox_area
 
-def cleanup_ema_cache():
-    """
-    清理过期的 EMA 缓存（基于时间）
-    每 100 帧调用一次，删除超过 MAX_CACHE_AGE 秒未更新的缓存
-    """
-    now = time.time()
-    expired_keys = [
-        key for key, (value, timestamp) in ema_conf.items()
-        if now - timestamp > MAX_CACHE_AGE
-    ]
-    for key in expired_keys:
-        del ema_conf[key]
-    
-    if expired_keys and DEBUG:
-        print(json.dumps({
-            'type': 'debug',
-            'message': f'Cleaned {len(expired_keys)} expired EMA cache entries'
-        }), flush=True)
-
 def calculate_grade(confidence):
     """
     计算评分等级（来自Mediapipe.py的打分系统）
@@ -150,54 +413,35 @@ def calculate_grade(confidence):
     else:
         return "D", "需要改进"
 
-def normalize_landmarks(points, mirrored=False):
+def landmarks_features(points, mirrored=False):
     """
-    归一化 landmarks（与训练数据对齐）
+    前端 landmarks -> 与训练数据相同的特征空间
     参数:
-        points: 21 个 [x, y, z] 点（范围 0~1）
-        mirrored: 是否需要镜像对齐（前端 CSS 镜像时为 True）
+        points: 21 个 [x, y, z] 点（norm01，tasks-vision 的原始画面坐标）
+        mirrored: 坐标本身是否已做水平镜像（x 已翻转）；CSS 显示镜像不影响 tasks-vision 的输出
     返回:
-        归一化后的特征向量（63 维：x*21 + y*21 + z*21）
+        63 维特征向量：x*21 + y*21 + z*21
     
-    步骤:
-    1. 镜像对齐：若 mirrored=True，x = 1 - x
-    2. 居中：以手腕点（index 0）为基准
-    3. 尺度归一：按手部最大边界缩放
+    训练数据（asl_dataset.csv）与整帧路径（extract_landmarks）都是 MediaPipe 的原始 norm01 坐标，
+    不居中、不做尺度归一，这里只做镜像还原，保证 landmarks 路径与参考样本在同一空间
     """
     points = np.array(points, dtype=np.float32)
-    
-    # 1. 镜像对齐（前端显示镜像时，坐标需要翻转）
     if mirrored:
-        points[:, 0] = 1.0 - points[:, 0]  # x 坐标镜像
-    
-    # 2. 居中：以手腕点（wrist, index=0）为基准
-    wrist = points[0].copy()
-    points = points - wrist  # 平移到原点
-    
-    # 3. 尺度归一化：按最大边界缩放到单位尺度
-    xs, ys, zs = points[:, 0], points[:, 1], points[:, 2]
-    max_range = max(xs.max() - xs.min(), ys.max() - ys.min(), zs.max() - zs.min())
-    if max_range > 1e-6:  # 避免除零
-        points = points / max_range
-    
-    # 4. 返回特征向量（与训练时顺序一致：x*21 + y*21 + z*21）
-    feature_vector = np.concatenate([points[:, 0], points[:, 1], points[:, 2]])
-    
-    # Debug 日志：打印前 5 个点的归一化后坐标
-    if DEBUG:
-        print(json.dumps({
-            'type': 'debug',
-            'normalized_sample': {
-                'point_0': [float(f'{points[0, 0]:.3f}'), float(f'{points[0, 1]:.3f}'), float(f'{points[0, 2]:.3f}')],
-                'point_4': [float(f'{points[4, 0]:.3f}'), float(f'{points[4, 1]:.3f}'), float(f'{points[4, 2]:.3f}')],
-                'x_range': [float(f'{xs.min():.3f}'), float(f'{xs.max():.3f}')],
-                'y_range': [float(f'{ys.min():.3f}'), float(f'{ys.max():.3f}')],
-            }
-        }), flush=True)
-    
-    return feature_vector.tolist()
+        points[:, 0] = 1.0 - points[:, 0]
+    return np.concatenate([points[:, 0], points[:, 1], points[:, 2]]).tolist()
+
+def remember_confirmed(state, entry, target, predicted_label, confidence, landmarks_ok, user_vector):
+    """
+    在线索引开启时记录该会话最近一次被服务端确认的样本：
+    质量合格、默认模型（在线索引即默认模型）、单帧预测 = 目标手势且置信度达标
+    add_samples 只追加这里记录的特征，不接受客户端提供的标签或坐标
+    """
+    if sample_log is None or entry is not default_entry or not landmarks_ok or not target:
+        return
+    if str(predicted_label) == target and confidence >= ONLINE_CONFIRM_CONFIDENCE:
+        state.confirmed = np.asarray(user_vector, dtype=np.float32)
 
-def process_landmarks_input(message):
+def process_landmarks_input(message, entry=None):
     """
     处理前端发来的 landmarks 消息（带镜像/单位上下文）
     参数:
@@ -208,13 +452,15 @@ def process_landmarks_input(message):
             image: { width, height, unit: 'norm01' },
             mirrored: bool,
             target_gesture: str,
+            model_id: str,  # 可选，省略时用默认模型
             ts: int
         }
+        entry: 已解析的模型（ModelEntry，None 为默认模型）
     返回:
         符合新协议的 JSON 对象
     """
-    global frame_count
     start_time = time.time()
+    entry = entry or default_entry
     
     try:
         client_id = message.get('client_id', '')
@@ -237,7 +483,7 @@ def process_landmarks_input(message):
         
         # Debug 日志：打印质量指标
         if DEBUG:
-            print(json.dumps({
+            log.debug({
                 'type': 'debug',
                 'quality_check': {
                     'avg_vis': round(avg_vis, 3),
@@ -245,31 +491,28 @@ def process_landmarks_input(message):
                     'landmarks_ok': landmarks_ok,
                     'mirrored': mirrored,
                 }
-            }), flush=True)
-        
-        # 定期清理 EMA 缓存
-        frame_count += 1
-        if frame_count % 100 == 0:
-            cleanup_ema_cache()
+            })
         
         # 如果质量不佳，返回但不拦截（仅标记）
         inference_time_ms = (time.time() - start_time) * 1000
         
-        # 归一化 landmarks（镜像对齐 + 居中 + 尺度归一）
-        user_vector = normalize_landmarks(points, mirrored)
+        # 转换到训练数据的特征空间（原始 norm01 坐标，仅做镜像还原）
+        user_vector = landmarks_features(points, mirrored)
         
         # 预测手势
         predicted_label = None
         raw_confidence = 0.0
         probs = None
+        match_prob = None  # 目标验证模式下的匹配概率
         
-        if model is not None:
+        if verifier is not None and entry is default_entry and target_gesture in verifier:
+            # 练习模式热路径：只比较目标类与易混类，不做全类别搜索（验证器基于默认模型构建）
+            predicted_label, raw_confidence, probs, match_prob = verify_target(user_vector, target_gesture)
+        elif entry is not None:
             try:
-                predicted_label = model.predict([user_vector])[0]
-                probs = model.predict_proba([user_vector])[0]
-                raw_confidence = float(max(probs))
+                predicted_label, raw_confidence, probs = classify(user_vector, entry)
             except Exception as e:
-                print(json.dumps({'type': 'error', 'message': f'模型推理错误: {str(e)}'}), flush=True)
+                log.error({'type': 'error', 'message': f'模型推理错误: {str(e)}'})
                 predicted_label = 'Error'
                 raw_confidence = 0.0
         else:
@@ -277,15 +520,25 @@ def process_landmarks_input(message):
             predicted_label = 'A'
             raw_confidence = 0.75
         
+        # 更新会话状态（最近预测 + landmarks 历史）
+        state = client_states.get_or_create((client_id, target_gesture))
+        state.last_prediction = predicted_label
+        state.history.append(user_vector)
+        remember_confirmed(state, entry, target_gesture, predicted_label, raw_confidence, landmarks_ok, user_vector)
+        
+        # 时间平滑：完整类别概率向量的 EMA（服务端统一平滑，前端不必各自再平滑）
+        smoothed_label, smoothed_confidence, smoothed_probs = smooth_prediction(
+            client_id, target_gesture, predicted_label, raw_confidence, probs, entry)
+        
         # 计算推理耗时
         inference_time_ms = (time.time() - start_time) * 1000
         
         # Debug 日志：打印预测结果和概率分布
-        if DEBUG and probs is not None and model is not None:
+        if DEBUG and probs is not None and entry is not None:
             top3_idx = np.argsort(probs)[-3:][::-1]
-            classes = model.classes_
+            classes = entry.model.classes_
             top3 = [(classes[i], round(float(probs[i]), 3)) for i in top3_idx]
-            print(json.dumps({
+            log.debug({
                 'type': 'debug',
                 'prediction': {
                     'predicted': predicted_label,
@@ -293,10 +546,10 @@ def process_landmarks_input(message):
                     'top3': top3,
                     'target': target_gesture,
                 }
-            }), flush=True)
+            })
         
-        # 性能日志（每帧打印）
-        print(json.dumps({
+        # 性能日志（逐帧聚合，周期输出 perf_summary；debug 级别下限流输出单帧）
+        log.perf({
             'type': 'perf',
             'avg_vis': round(avg_vis, 3),
             'bbox_area': round(bbox_area, 4),
@@ -305,16 +558,21 @@ def process_landmarks_input(message):
             'target': target_gesture,
             'confidence': round(raw_confidence, 3),
             'inference_ms': round(inference_time_ms, 2)
-        }), flush=True)
+        })
         
-        # 计算得分（与目标手势匹配时 = confidence * 100，否则较低分）
+        # 计算得分（基于平滑结果：与目标手势匹配时 = confidence * 100，否则较低分）
         score = 0.0
-        if target_gesture and predicted_label == target_gesture:
-            score = raw_confidence * 100
+        if match_prob is not None:
+            # 目标验证模式：得分即（平滑后的）校准匹配概率
+            if smoothed_probs is not None:
+                match_prob = float(smoothed_probs[class_index[target_gesture]])
+            score = match_prob * 100
+        elif target_gesture and smoothed_label == target_gesture:
+            score = smoothed_confidence * 100
         elif target_gesture:
-            score = max(0, raw_confidence * 30)  # 错误手势给予低分
+            score = max(0, smoothed_confidence * 30)  # 错误手势给予低分
         else:
-            score = raw_confidence * 100  # 无目标时按置信度给分
+            score = smoothed_confidence * 100  # 无目标时按置信度给分
         
         # 返回结果
         return {
@@ -326,7 +584,11 @@ def process_landmarks_input(message):
                 'target': target_gesture,
                 'predicted': predicted_label,
                 'confidence': float(raw_confidence),
+                'raw_confidence': float(raw_confidence),
+                'smoothed_predicted': smoothed_label,
+                'smoothed_confidence': smoothed_confidence,
                 'score': round(score, 2),
+                'mode': 'verify' if match_prob is not None else 'classify',
                 'landmarks_ok': landmarks_ok,
                 'landmarks': [{'x': float(p[0]), 'y': float(p[1]), 'visibility': 1.0} for p in points],
                 'server_ts': int(time.time() * 1000),
@@ -338,38 +600,55 @@ def process_landmarks_input(message):
         return {'ok': False, 'error': f'处理 landmarks 错误: {str(e)}'}
 
 
-def process_frame(frame_data, target_gesture="", client_id=""):
+def decode_jpeg(buffer):
+    """
+    解码 JPEG 字节（bytes / memoryview 均可，不拷贝）为 RGB 图像（失败返回 None）
+    cv2.imdecode / cvtColor 会释放 GIL，流水线模式下可在独立线程中并行执行
+    """
+    frame = cv2.imdecode(np.frombuffer(buffer, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+def decode_frame(frame_data):
+    """解码 base64 JPEG 为 RGB 图像（失败返回 None）"""
+    return decode_jpeg(base64.b64decode(frame_data))
+
+def decode_shm_frame(message):
+    """
+    直接在共享内存槽位上解码（零拷贝），返回 RGB 图像
+    未启用帧环或槽位已被覆盖时抛出 ValueError
+    """
+    if frame_ring is None:
+        raise ValueError('frame ring not enabled (FRAME_TRANSPORT=shm)')
+    with frame_ring.view(int(message['slot']), int(message['gen']), int(message['length'])) as view:
+        return decode_jpeg(view)
+
+def process_frame(frame_data, target_gesture="", client_id="", rgb_frame=None, entry=None):
     """
     处理视频帧并返回识别结果（性能优化版：去掉降权，保留原始confidence）
     参数:
         frame_data: base64 编码的图像数据
         target_gesture: 目标手势（用于评分）
         client_id: 客户端唯一标识（用于 EMA 隔离）
+        rgb_frame: 已解码的 RGB 图像（流水线模式下由解码阶段提供，None 时在此解码）
+        entry: 已解析的模型（ModelEntry，None 为默认模型）
     返回:
         符合新协议的 JSON 对象
     """
-    global frame_count
     start_time = time.time()  # 记录开始时间，用于计算推理耗时
+    entry = entry or default_entry
     
     try:
-        # 解码base64图像
-        image_data = base64.b64decode(frame_data)
-        nparr = np.frombuffer(image_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # 解码base64图像并转换为RGB
+        if rgb_frame is None:
+            rgb_frame = decode_frame(frame_data)
         
-        if frame is None:
+        if rgb_frame is None:
             return {'ok': False, 'error': '无法解码图像'}
         
-        # 转换为RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
         # 使用MediaPipe处理帧
-        results = hands.process(rgb_frame)
-        
-        # 定期清理 EMA 缓存（每 100 帧）
-        frame_count += 1
-        if frame_count % 100 == 0:
-            cleanup_ema_cache()
+        results = get_hands().process(rgb_frame)
         
         # 如果未检测到手部（添加 server_ts 和 inference_ms）
         inference_time_ms = (time.time() - start_time) * 1000
@@ -414,14 +693,12 @@ def process_frame(frame_data, target_gesture="", client_id=""):
         raw_confidence = 0.0
         probs = None
         
-        if model is not None:
+        if entry is not None:
             try:
-                # 使用 KNN 模型预测
-                predicted_label = model.predict([user_vector])[0]
-                probs = model.predict_proba([user_vector])[0]
-                raw_confidence = float(max(probs))
+                # 使用分类器后端预测
+                predicted_label, raw_confidence, probs = classify(user_vector, entry)
             except Exception as e:
-                print(json.dumps({'type': 'error', 'message': f'模型推理错误: {str(e)}'}), flush=True)
+                log.error({'type': 'error', 'message': f'模型推理错误: {str(e)}'})
                 predicted_label = 'Error'
                 raw_confidence = 0.0
         else:
@@ -429,28 +706,38 @@ def process_frame(frame_data, target_gesture="", client_id=""):
             predicted_label = 'A'
             raw_confidence = 0.75
         
+        # 更新会话状态（最近预测 + landmarks 历史）
+        state = client_states.get_or_create((client_id, target_gesture))
+        state.last_prediction = predicted_label
+        state.history.append(user_vector)
+        remember_confirmed(state, entry, target_gesture, predicted_label, raw_confidence, landmarks_ok, user_vector)
+        
+        # 时间平滑：完整类别概率向量的 EMA（服务端统一平滑，前端不必各自再平滑）
+        smoothed_label, smoothed_confidence, _ = smooth_prediction(
+            client_id, target_gesture, predicted_label, raw_confidence, probs, entry)
+        
         # 计算推理耗时（毫秒）
         inference_time_ms = (time.time() - start_time) * 1000
         
-        # 打印质量指标和推理耗时（每帧都打印，用于性能监控）
-        print(json.dumps({
+        # 记录质量指标和推理耗时（逐帧聚合，周期输出 perf_summary）
+        log.perf({
             'type': 'perf',
             'avg_vis': round(avg_vis, 3),
             'bbox_area': round(bbox_area, 4),
             'landmarks_ok': landmarks_ok,
             'inference_ms': round(inference_time_ms, 2)
-        }), flush=True)
+        })
         
         # Debug 日志：打印概率分布（仅在 DEBUG 模式下）
-        if DEBUG and probs is not None and model is not None:
+        if DEBUG and probs is not None and entry is not None:
             # 获取 top-3 概率
             top3_idx = np.argsort(probs)[-3:][::-1]
-            classes = model.classes_
+            classes = entry.model.classes_
             top3 = [(classes[i], round(float(probs[i]), 3)) for i in top3_idx]
-            print(json.dumps({
+            log.debug({
                 'type': 'debug',
                 'top3_probs': top3
-            }), flush=True)
+            })
         
         # ⚠️ 性能优化：去掉质量降权和错类降权，保留原始 confidence
         # 直接使用原始 confidence，用于 A/B 测试
@@ -466,6 +753,9 @@ def process_frame(frame_data, target_gesture="", client_id=""):
                 'target': target_gesture,
                 'predicted': predicted_label,
                 'confidence': float(final_confidence),  # 原始 confidence，不再降权
+                'raw_confidence': float(raw_confidence),
+                'smoothed_predicted': smoothed_label,
+                'smoothed_confidence': smoothed_confidence,
                 'landmarks_ok': landmarks_ok,
                 'landmarks': landmarks,
                 'server_ts': int(time.time() * 1000),  # 服务器时间戳（毫秒）
@@ -477,43 +767,395 @@ def process_frame(frame_data, target_gesture="", client_id=""):
         return {'ok': False, 'error': f'处理帧错误: {str(e)}'}
 
 
-# 主循环 - 从标准输入读取消息
-def main():
-    print(json.dumps({'type': 'ready', 'message': '✅ 带评分系统的手势识别服务已启动（支持 landmarks 输入）'}), flush=True)
-    if DEBUG:
-        print(json.dumps({'type': 'debug', 'message': '🔧 Debug 模式已启用（PY_DEBUG=1）'}), flush=True)
+# 消息类别（msg_class）：桥接层据此路由
+#   result  —— 某个客户端的识别结果/错误，带 client_id + seq，只发给该客户端
+#   control —— 协议回复（ready / pong 等），不转发给前端
+#   error   —— 无法归属到客户端的错误（如 JSON 解析失败）
+MSG_RESULT = 'result'
+MSG_CONTROL = 'control'
+MSG_ERROR = 'error'
+
+FRAME_TYPES = ('process_frame', 'process_frame_shm')
+
+def compact_index():
+    """把当前在线索引写成新的模型文件（原子替换），然后清空追加日志"""
+    compacted = sample_log.count
+    model.generation += 1
+    model.save(ONLINE_INDEX_PATH)
+    sample_log.reset(model.generation)
+    stats = dict(model.stats(), compacted=compacted, generation=model.generation, path=ONLINE_INDEX_PATH)
+    log.info(dict(stats, type='status', message='✅ 在线索引已压缩'))
+    return stats
+
+def add_samples(message):
+    """
+    处理 add_samples：把该会话最近一次被服务端确认的样本（见 remember_confirmed）追加到在线索引
+    message: {client_id, target_gesture}；标签即目标手势，特征来自服务端自己的推理输入，
+    客户端无法提交任意标签或坐标（在线索引由所有客户端共享）
+    每个确认样本只追加一次；先写追加日志再更新内存索引，日志累计到 ONLINE_COMPACT_EVERY 条时压缩
+    """
+    reply = {'type': 'samples_added', 'msg_class': MSG_CONTROL,
+             'client_id': message.get('client_id', ''), 'seq': message.get('seq')}
+    if sample_log is None:
+        return dict(reply, ok=False, error='online index disabled (ONLINE_INDEX=true with MODEL_BACKEND=knn)')
+    target = message.get('target_gesture', '')
+    state = client_states.get((reply['client_id'], target))
+    if state is None or state.confirmed is None:
+        return dict(reply, ok=False, error='no confirmed sample for this session')
+    sample = (target, state.confirmed)
+    state.confirmed = None
+    sample_log.append([sample])
+    outcome = model.add(sample[1], target)
+    reply.update(ok=True, label=target, outcome=outcome)
+    if sample_log.count >= ONLINE_COMPACT_EVERY:
+        reply['compacted'] = compact_index()
+    reply['index'] = model.stats()
+    return reply
+
+def tag_reply(reply, message):
+    """为回复加上关联信息：回显请求的 seq 与 client_id，并标记消息类别"""
+    reply['msg_class'] = MSG_RESULT
+    reply['client_id'] = message.get('client_id', '')
+    reply['seq'] = message.get('seq')
+    if 'slot' in message:
+        reply['slot'] = message['slot']  # 桥接层据此回收帧环槽位
+    if message.get('model_id') and 'data' in reply:
+        reply['data']['model_id'] = message['model_id']
+    if '_queue_ms' in message and 'data' in reply:
+        # 排队延迟与该会话累计丢弃帧数
+        state = client_states.get((reply['client_id'], message.get('target_gesture', '')))
+        reply['data']['queue_ms'] = message['_queue_ms']
+        reply['data']['shed_count'] = state.shed if state is not None else 0
+    if ADAPTIVE_RATE and '_t0' in message:
+        mode = MODE_FRAME if message.get('type') in FRAME_TYPES else MODE_LANDMARKS
+        service_ms = (time.perf_counter() - message['_t0']) * 1000
+        load_controller.observe(reply['client_id'], mode, service_ms, message.get('_queue_ms', 0.0))
+        if 'data' in reply:
+            reply['data']['recommend'] = load_controller.recommend(reply['client_id'], mode)
+    return reply
+
+def shed_if_expired(message):
+    """
+    截止时间检查（在归一化/推理之前）：过期返回 True 并计数，否则记录排队延迟
+    """
+    global shed_total
+    now_ms = time.time() * 1000
+    deadline = message.get('_deadline')
+    if deadline is None:
+        deadline = message_deadline(message, LATENCY_BUDGET_MS, now_ms)
+    message['_queue_ms'] = round(now_ms - (deadline - LATENCY_BUDGET_MS), 2)
+    if now_ms <= deadline:
+        return False
+    shed_total += 1
+    state = client_states.get_or_create((message.get('client_id', ''), message.get('target_gesture', '')))
+    state.shed += 1
+    if ADAPTIVE_RATE:
+        mode = MODE_FRAME if message.get('type') in FRAME_TYPES else MODE_LANDMARKS
+        load_controller.observe(message.get('client_id', ''), mode, 0.0, shed=True)
+    return True
+
+def start_profile(message):
+    """
+    profile_start：开启一次有时长上限的剖析会话
+    message: {mode: 'cprofile' | 'sampling', duration_s, top_n, interval_ms, tracemalloc: bool}
+    """
+    global profile_session
+    reply = {'type': 'profile_started', 'msg_class': MSG_CONTROL, 'seq': message.get('seq')}
+    running = current_profile()
+    if running is not None:
+        return dict(reply, ok=False, error='profile already running', mode=running.mode)
+    try:
+        session = ProfileSession(
+            PROFILE_DIR,
+            mode=message.get('mode', 'cprofile'),
+            duration_s=min(float(message.get('duration_s', 30)), PROFILE_MAX_S),
+            top_n=int(message.get('top_n', 25)),
+            interval_ms=float(message.get('interval_ms', 5)),
+            trace_memory=bool(message.get('tracemalloc', True)),
+            on_expire=_profile_expired,
+        )
+        session.start()
+    except (OSError, TypeError, ValueError) as e:
+        return dict(reply, ok=False, error=str(e))
+    with profile_lock:
+        profile_session = session
+    log.info({'type': 'status', 'message': f'🔍 开始剖析（{session.mode}，最长 {session.duration_s}s）'})
+    return dict(reply, ok=True, mode=session.mode, duration_s=session.duration_s, directory=PROFILE_DIR)
+
+def _profile_expired(session):
+    """
+    计时器线程：会话到期（空闲的 worker 同样按时结束）
+    采样与 tracemalloc 已由会话自己停止并落盘；cProfile 钩子只能由开启它的处理线程移除，
+    在处理下一条消息或退出前由 stop_profile() 收尾（空闲时该钩子没有开销）
+    """
+    if session.thread_bound:
+        log.info({'type': 'status', 'message': '🔍 剖析已到期：采样 / tracemalloc 已停止，cProfile 将在下一条消息时写出'})
+        return
+    stop_profile(session)
+
+def current_profile():
+    """取当前剖析会话的快照；计时器线程可能随时将 profile_session 置空，调用方只使用返回的局部引用"""
+    with profile_lock:
+        return profile_session
+
+def stop_profile(expected=None):
+    """
+    结束当前剖析会话并写出文件，返回摘要（无会话时返回 None）
+    cProfile 会话必须在处理消息的线程上调用；expected 非空时只结束该会话（计时器回调用）
+    """
+    global profile_session
+    with profile_lock:
+        session = profile_session
+        if session is None or (expected is not None and session is not expected):
+            return None
+        profile_session = None
+    summary = session.stop()
+    if summary is None:
+        return None
+    log.info(dict(type='status', message=f"🔍 剖析结果已写出: {', '.join(summary['files'].values())}",
+                  files=summary['files']))
+    return summary
+
+def handle_message(message):
+    """
+    处理一条输入消息，返回需要输出的回复（无需回复时返回 None）
+    主循环、回放等入口共用
+    """
+    msg_type = message.get('type')
+    
+    session = current_profile()
+    if session is not None:
+        session.messages += 1
+        if session.expired():
+            stop_profile(session)  # 超过时长上限：自动结束并落盘
+    
+    if LATENCY_BUDGET_MS > 0 and msg_type in ('process_landmarks',) + FRAME_TYPES:
+        if shed_if_expired(message):
+            if 'slot' in message:
+                # 丢弃的共享内存帧也要通知桥接层回收槽位
+                return {'type': 'slot_released', 'msg_class': MSG_CONTROL, 'slot': message['slot']}
+            return None
+    message['_t0'] = time.perf_counter()  # 服务时间起点（负载控制用）
+    
+    entry = None
+    if msg_type in ('process_landmarks',) + FRAME_TYPES:
+        try:
+            entry = model_entry(message)
+        except Exception as e:
+            # 未知 model_id 或模型文件加载失败：只影响这一条请求（tag_reply 回显 slot，槽位照常回收）
+            return tag_reply({'ok': False, 'error': f'模型不可用: {e}'}, message)
+    
+    if msg_type == 'process_landmarks':
+        # 处理前端发来的 landmarks（新路径：性能更优，无需重复检测）
+        return tag_reply(process_landmarks_input(message, entry), message)
+    
+    if msg_type == 'process_frame':
+        # 处理图像帧（旧路径：兼容保留）
+        frame_data = message.get('frame') or message.get('frame_data')
+        target_gesture = message.get('target_gesture', '')
+        client_id = message.get('client_id', '')
+        
+        if frame_data:
+            result = process_frame(frame_data, target_gesture, client_id, message.get('_rgb'), entry)
+            return tag_reply(result, message)
+        return None
     
+    if msg_type == 'process_frame_shm':
+        # 图像帧走共享内存帧环：stdin 只带槽位号，JPEG 在 /dev/shm 中原地解码
+        rgb_frame = message.get('_rgb')
+        if rgb_frame is None:
+            try:
+                rgb_frame = decode_shm_frame(message)
+            except (KeyError, TypeError, ValueError) as e:
+                return tag_reply({'ok': False, 'error': f'共享内存帧读取失败: {e}'}, message)
+        if rgb_frame is None:
+            return tag_reply({'ok': False, 'error': '无法解码图像'}, message)
+        result = process_frame(None, message.get('target_gesture', ''), message.get('client_id', ''), rgb_frame, entry)
+        return tag_reply(result, message)
+    
+    if msg_type == 'add_samples':
+        return add_samples(message)
+    
+    if msg_type == 'compact_index':
+        if sample_log is None:
+            return {'type': 'index_compacted', 'msg_class': MSG_CONTROL, 'seq': message.get('seq'),
+                    'ok': False, 'error': 'online index disabled'}
+        return dict(compact_index(), type='index_compacted', msg_class=MSG_CONTROL, seq=message.get('seq'), ok=True)
+    
+    if msg_type == 'client_disconnect':
+        # 客户端断开：立即释放其全部会话状态
+        client_states.pop_client(message.get('client_id', ''))
+        return None
+    
+    if msg_type == 'ping':
+        # 回显 seq：管理通道按 seq 等待 control 回复
+        reply = {'type': 'pong', 'msg_class': MSG_CONTROL, 'seq': message.get('seq'), 'status': 'ok',
+                 'client_states': client_states.stats()}
+        if hasattr(model, 'stats'):
+            reply['model_stats'] = model.stats()  # 如级联 KNN 的回退比例
+        reply['models'] = model_registry.stats()  # 每个 model_id 的命中率与常驻内存
+        if LATENCY_BUDGET_MS > 0:
+            reply['shed_total'] = shed_total
+        if ADAPTIVE_RATE:
+            reply['load'] = load_controller.stats()
+        if traffic_tap is not None:
+            reply['capture'] = traffic_tap.stats()
+        session = current_profile()
+        if session is not None:
+            reply['profiling'] = {'mode': session.mode, 'messages': session.messages}
+        return reply
+    
+    if msg_type == 'profile_start':
+        return start_profile(message)
+    
+    if msg_type == 'profile_stop':
+        summary = stop_profile()
+        reply = {'type': 'profile_stopped', 'msg_class': MSG_CONTROL, 'seq': message.get('seq')}
+        if summary is None:
+            return dict(reply, ok=False, error='no profile running')
+        return dict(reply, ok=True, **summary)
+    
+    return None
+
+def prepare_message(message):
+    """流水线解码阶段：提前把 process_frame(_shm) 的 JPEG 解码为 RGB（失败时留给推理阶段报错）"""
+    msg_type = message.get('type')
+    if msg_type == 'process_frame':
+        frame_data = message.get('frame') or message.get('frame_data')
+        if frame_data:
+            try:
+                message['_rgb'] = decode_frame(frame_data)
+            except Exception:
+                message['_rgb'] = None
+    elif msg_type == 'process_frame_shm':
+        try:
+            message['_rgb'] = decode_shm_frame(message)
+        except Exception:
+            message['_rgb'] = None
+    return message
+
+def emit(reply):
+    """向结果流写一行 JSON（逐行 flush，保证桥接层及时收到）"""
+    print(json.dumps(reply), flush=True)
+
+def run_scheduled(stream):
+    """
+    EDF 主循环：读线程持续把消息放入截止时间堆，处理线程总是先处理截止时间最早的消息，
+    过期消息在 handle_message 中推理前丢弃
+    """
+    queue = DeadlineQueue()
+    counts = {'messages': 0}
+
+    def reader():
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            counts['messages'] += 1
+            try:
+                message = json.loads(line)
+            except ValueError as e:
+                queue.push(e, NO_DEADLINE)
+                continue
+            if message.get('type') in ('process_landmarks',) + FRAME_TYPES:
+                message['_deadline'] = message_deadline(message, LATENCY_BUDGET_MS, time.time() * 1000)
+                queue.push(message, message['_deadline'])
+            else:
+                queue.push(message, NO_DEADLINE)
+        queue.close()
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    while True:
+        item = queue.pop()
+        if item is None:
+            break
+        try:
+            if isinstance(item, Exception):
+                raise item
+            reply = handle_message(item)
+            if reply is not None:
+                emit(reply)
+        except Exception as e:
+            emit({'type': 'error', 'msg_class': MSG_ERROR, 'message': str(e)})
+    thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'type': 'pipeline_stats',
+        'decode_threads': 0,
+        'messages': counts['messages'],
+        'shed': shed_total,
+        'elapsed_s': round(elapsed, 3),
+        'msgs_per_s': round(counts['messages'] / elapsed, 2) if elapsed > 0 else None,
+    }
+
+def run_sequential(stream):
+    """串行主循环：读一条、处理一条、写一条"""
+    messages = 0
+    start = time.perf_counter()
     while True:
         try:
-            line = sys.stdin.readline()
+            line = stream.readline()
             if not line:
                 break
+            if not line.strip():
+                continue
+            messages += 1
             
-            message = json.loads(line.strip())
-            msg_type = message.get('type')
-            
-            if msg_type == 'process_landmarks':
-                # 处理前端发来的 landmarks（新路径：性能更优，无需重复检测）
-                result = process_landmarks_input(message)
-                print(json.dumps(result), flush=True)
-            
-            elif msg_type == 'process_frame':
-                # 处理图像帧（旧路径：兼容保留）
-                frame_data = message.get('frame') or message.get('frame_data')
-                target_gesture = message.get('target_gesture', '')
-                client_id = message.get('client_id', '')
-                
-                if frame_data:
-                    result = process_frame(frame_data, target_gesture, client_id)
-                    print(json.dumps(result), flush=True)
-            
-            elif msg_type == 'ping':
-                print(json.dumps({'type': 'pong', 'status': 'ok'}), flush=True)
+            reply = handle_message(json.loads(line.strip()))
+            if reply is not None:
+                emit(reply)
                 
         except Exception as e:
-            print(json.dumps({'type': 'error', 'message': str(e)}), flush=True)
+            emit({'type': 'error', 'msg_class': MSG_ERROR, 'message': str(e)})
+    elapsed = time.perf_counter() - start
+    return {
+        'type': 'pipeline_stats',
+        'decode_threads': 0,
+        'messages': messages,
+        'elapsed_s': round(elapsed, 3),
+        'msgs_per_s': round(messages / elapsed, 2) if elapsed > 0 else None,
+    }
+
+# 主循环 - 从标准输入读取消息
+def main():
+    global frame_ring, traffic_tap
+    ready = {'type': 'ready', 'msg_class': MSG_CONTROL, 'message': '✅ 带评分系统的手势识别服务已启动（支持 landmarks 输入）'}
+    get_hands()
+    if FRAME_TRANSPORT == 'shm':
+        # worker 拥有帧环的生命周期：创建后在 ready 中通告，桥接层按 path 打开并写入
+        frame_ring = FrameRing(slots=FRAME_RING_SLOTS, slot_size=FRAME_RING_SLOT_KB * 1024)
+        ready['frame_ring'] = frame_ring.describe()
+    emit(ready)
+    if DEBUG:
+        log.debug({'type': 'debug', 'message': '🔧 Debug 模式已启用（PY_DEBUG=1）'})
+    
+    stream = sys.stdin
+    if TRAFFIC_CAPTURE_DIR:
+        traffic_tap = TrafficTap(TRAFFIC_CAPTURE_DIR, sample_rate=TRAFFIC_CAPTURE_SAMPLE,
+                                 max_bytes=TRAFFIC_CAPTURE_MAX_MB << 20,
+                                 segment_bytes=TRAFFIC_CAPTURE_SEGMENT_MB << 20)
+        stream = traffic_tap.wrap(sys.stdin)
+    
+    if WORKER_MODE == 'pipeline':
+        # 推理线程退出前在该线程上结束剖析（cProfile 钩子是线程绑定的）
+        pipeline = StagePipeline(prepare_message, handle_message, emit,
+                                 decode_threads=DECODE_THREADS, queue_size=PIPELINE_QUEUE_SIZE,
+                                 on_close=stop_profile)
+        stats = pipeline.run(stream)
+    elif LATENCY_BUDGET_MS > 0:
+        stats = run_scheduled(stream)
+    else:
+        stats = run_sequential(stream)
+    stats['mode'] = WORKER_MODE
+    log.info(stats)
+    stop_profile()  # stdin 关闭时仍在剖析：照常落盘（流水线模式已在推理线程上结束，这里为空操作）
+    if traffic_tap is not None:
+        traffic_tap.close()
+        log.info(dict(traffic_tap.stats(), type='capture_stats', directory=TRAFFIC_CAPTURE_DIR))
+    if frame_ring is not None:
+        frame_ring.close()
 
 if __name__ == '__main__':
     main()
-
-
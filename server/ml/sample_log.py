@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+在线样本的追加日志（add_samples 的持久化）
+worker 重启时先加载最近一次压缩得到的模型，再按顺序重放日志，得到与重启前一致的索引
+
+文件格式:
+    文件头 b'GSMP\x01' + <Q generation>
+    记录   <H label 字节数><H 维度> + label(utf-8) + float32 × 维度
+末尾不完整的记录（进程被杀时写了一半）在读取时忽略，并在下次打开时截掉
+
+generation：每次压缩后加一，并同时写进模型文件。若模型文件的 generation 比日志新，
+说明压缩已完成但清空日志前进程退出，日志内容已包含在模型中，不应再重放
+"""
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'GSMP\x01'
+HEADER = struct.Struct('<Q')
+HEADER_BYTES = len(MAGIC) + HEADER.size
+RECORD = struct.Struct('<HH')
+
+
+class SampleLog:
+    def __init__(self, path, generation=0):
+        self.path = path
+        self.count = 0
+        self.generation = generation
+        valid = self._scan()
+        self._file = open(path, 'ab')
+        if valid is None:
+            self._file.write(MAGIC + HEADER.pack(generation))
+            self._file.flush()
+        elif valid < os.path.getsize(path):
+            self._file.truncate(valid)
+
+    def _scan(self):
+        """读取 generation 并统计已有记录数，返回有效数据的末尾偏移（文件不存在或为空时返回 None）"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        end = HEADER_BYTES
+        for _, _, end in self._records():
+            self.count += 1
+        return end
+
+    def _records(self):
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'not a sample log: {self.path}')
+            self.generation = HEADER.unpack(f.read(HEADER.size))[0]
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return
+                label_len, dim = RECORD.unpack(head)
+                body = f.read(label_len + 4 * dim)
+                if len(body) < label_len + 4 * dim:
+                    return
+                label = body[:label_len].decode('utf-8')
+                yield label, np.frombuffer(body, dtype=np.float32, offset=label_len), f.tell()
+
+    def __iter__(self):
+        """按追加顺序产出 (label, vector)"""
+        for label, vector, _ in self._records():
+            yield label, vector
+
+    def append(self, samples):
+        """追加一批 (label, vector) 并 flush（一批一次系统调用）"""
+        chunks = []
+        for label, vector in samples:
+            raw = label.encode('utf-8')
+            vec = np.asarray(vector, dtype=np.float32)
+            chunks.append(RECORD.pack(len(raw), len(vec)) + raw + vec.tobytes())
+        self._file.write(b''.join(chunks))
+        self._file.flush()
+        self.count += len(chunks)
+
+    def reset(self, generation):
+        """压缩完成后清空日志（内容已写入 generation 对应的模型文件）"""
+        self._file.truncate(0)
+        self._file.write(MAGIC + HEADER.pack(generation))
+        self._file.flush()
+        self.generation = generation
+        self.count = 0
+
+    def close(self):
+        self._file.close()
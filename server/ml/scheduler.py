@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+截止时间调度（EDF）
+- 每条识别消息的截止时间 = ts（桥接层收到帧的时间，毫秒）+ 延迟预算
+- 读线程把消息放进按截止时间排序的堆，处理线程总是先取截止时间最早的（跨客户端）
+- 控制消息（ping / client_disconnect 等）没有截止时间，优先处理
+已经过期的消息在归一化/推理之前就被丢弃（见 realtime_recognition.handle_message）
+"""
+import heapq
+import itertools
+import threading
+
+NO_DEADLINE = float('-inf')  # 控制消息：排在所有识别消息之前
+
+
+def message_deadline(message, budget_ms, now_ms):
+    """
+    计算消息的截止时间（毫秒）
+    ts 缺失或明显异常（在未来超过一个预算）时按“刚收到”处理，避免时钟问题导致误丢
+    """
+    ts = message.get('ts')
+    if not isinstance(ts, (int, float)) or ts <= 0 or ts > now_ms + budget_ms:
+        ts = now_ms
+    return ts + budget_ms
+
+
+class DeadlineQueue:
+    """线程安全的最早截止时间优先队列"""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()  # 同一截止时间按到达顺序
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def push(self, item, deadline):
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, next(self._counter), item))
+            self._cond.notify()
+
+    def close(self):
+        """输入结束：队列取空后 pop() 返回 None"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def pop(self):
+        """阻塞直到有消息，返回截止时间最早的一条；已关闭且为空时返回 None"""
+        with self._cond:
+            while not self._heap and not self._closed:
+                self._cond.wait()
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[2]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+多客户端概率向量 EMA 平滑
+- 每个会话占用状态矩阵中的一行（float32，连续内存），存放完整的类别概率向量
+- update() 一次向量化运算更新任意多个会话的 EMA，可直接接在批量推理后面
+- 行号通过空闲列表复用，会话被淘汰时 release() 归还
+"""
+import numpy as np
+
+
+class ProbabilitySmoother:
+    """
+    参数:
+        n_classes: 类别数（概率向量长度）
+        alpha: 平滑系数，越大越跟手，越小越平稳
+        initial_rows: 状态矩阵初始行数，不够时按倍数扩容
+    """
+
+    def __init__(self, n_classes, alpha=0.35, initial_rows=64):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError(f'alpha must be in (0, 1], got {alpha}')
+        self.n_classes = n_classes
+        self.alpha = alpha
+        self.state = np.zeros((initial_rows, n_classes), dtype=np.float32)
+        self.primed = np.zeros(initial_rows, dtype=bool)  # 该行是否已有历史值
+        self._free = list(range(initial_rows - 1, -1, -1))
+
+    def __len__(self):
+        return self.state.shape[0] - len(self._free)
+
+    def _grow(self):
+        old = self.state.shape[0]
+        self.state = np.vstack([self.state, np.zeros_like(self.state)])
+        self.primed = np.concatenate([self.primed, np.zeros(old, dtype=bool)])
+        self._free.extend(range(2 * old - 1, old - 1, -1))
+
+    def acquire(self):
+        """分配一行状态，返回行号"""
+        if not self._free:
+            self._grow()
+        row = self._free.pop()
+        self.primed[row] = False
+        return row
+
+    def release(self, row):
+        """归还一行状态"""
+        self.primed[row] = False
+        self._free.append(row)
+
+    def update(self, rows, probs):
+        """
+        向量化更新多行 EMA
+        参数:
+            rows: 行号数组，长度 N（同一批内不应重复）
+            probs: (N, n_classes) 原始概率矩阵
+        返回:
+            (N, n_classes) 平滑后的概率矩阵
+        首次出现的行直接用当前概率初始化，避免从 0 爬升
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        probs = np.asarray(probs, dtype=np.float32)
+        prev = self.state[rows]
+        fresh = ~self.primed[rows]
+        prev[fresh] = probs[fresh]
+        smoothed = self.alpha * probs + (1.0 - self.alpha) * prev
+        self.state[rows] = smoothed
+        self.primed[rows] = True
+        return smoothed
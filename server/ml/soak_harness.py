@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Worker 长时间浸泡测试：本地启动 realtime_recognition.py，按固定速率持续发送请求数小时，
+模拟真实的客户端流动（新 client_id 接入、断开、切换目标手势 / 模型），定期采样:
+- worker 进程 RSS 与打开的文件描述符数（/proc，仅 Linux）
+- 每个采样窗口按消息类型（landmarks / frame）分别统计的延迟 p50 / p95 / p99、错误数、未回复数
+- pong 中的会话数（client_states.size），与发送该 ping 时在线客户端的 (client_id, target) 数对比
+结束时对预热之后的样本做漂移判定，任一项超限即失败（退出码 1）:
+- RSS 线性拟合的增长量超过 --max-rss-growth-mb
+- 文件描述符增长超过 --max-fd-growth
+- 任一消息类型：后 1/3 窗口的 p95 中位数 / 前 1/3 窗口的 p95 中位数 超过 --max-latency-ratio
+  （两类服务时间相差数倍，混在一起时窗口 p95 会随 frame 占比的随机波动在两者之间跳动；
+  同理，发送时有 frame 在途的 landmarks 会排在 frame 后面，只计数、不计入 landmarks 分位数）
+- worker 会话数超过在线客户端应有的会话数（断开的客户端状态没有释放）
+- 错误率超过 --max-error-rate
+
+用法:
+    python server/ml/soak_harness.py [--duration 4h] [--rate 30] [--clients 50] [--churn 0.5]
+                                     [--switch 0.2] [--frame-ratio 0.05] [--model-ids default,mlp]
+                                     [--sample-interval 30] [--warmup 120] [--env KEY=VALUE ...]
+                                     [-o soak.jsonl]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from pipeline_bench import make_frame
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'realtime_recognition.py')
+TARGETS = 'ACDEFGHIKLMNOPQRSTUVWXY'
+KINDS = ('landmarks', 'frame')
+MIN_WINDOW_SAMPLES = 20  # 窗口内某类回复少于该数时不计算其分位数（样本太少，p95 不稳定）
+
+
+def parse_duration(value):
+    """'90' / '90s' / '30m' / '4h' -> 秒"""
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def synthetic_points(rng):
+    """以随机手腕为中心生成 21 个 norm01 范围内的关键点（bbox 足够大，走完整推理路径）"""
+    cx, cy = rng.uniform(0.3, 0.7), rng.uniform(0.3, 0.7)
+    return [[cx + rng.uniform(-0.15, 0.15), cy + rng.uniform(-0.15, 0.15), rng.uniform(-0.05, 0.05)]
+            for _ in range(21)]
+
+
+def read_proc(pid):
+    """(RSS MB, 打开的 fd 数)；非 Linux 或进程已退出时为 None"""
+    rss = fds = None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+                    break
+        fds = len(os.listdir(f'/proc/{pid}/fd'))
+    except OSError:
+        pass
+    return rss, fds
+
+
+def percentiles(values):
+    if len(values) < MIN_WINDOW_SAMPLES:
+        return None
+    arr = np.asarray(values)
+    return {
+        'p50': round(float(np.percentile(arr, 50)), 2),
+        'p95': round(float(np.percentile(arr, 95)), 2),
+        'p99': round(float(np.percentile(arr, 99)), 2),
+    }
+
+
+class Soak:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.model_ids = [m for m in args.model_ids.split(',') if m]
+        self.frame = make_frame(320, 240) if args.frame_ratio > 0 else None
+        self.lock = threading.Lock()
+        self.sent = {}           # seq -> (发送时刻, 消息类型 | None 表示排在 frame 后的 landmarks)
+        self.latencies = {kind: [] for kind in KINDS}  # 当前窗口内按消息类型的延迟（毫秒）
+        self.window = {'errors': 0, 'results': 0, 'throttled': 0, 'disconnects': 0, 'switches': 0,
+                       'behind_frame': 0}
+        self.totals = dict(self.window, requests=0)
+        self.clients = {}        # 在线 client_id -> {'target', 'model_id'}
+        self.live_sessions = set()  # 在线客户端用过的 (client_id, target)
+        self.pong = None
+        self.pending_pings = deque()  # 每个 ping 发送时的在线会话数（pong 按顺序返回，逐个对应）
+        self.next_client = 0
+        self.seq = 0
+        self.stop = threading.Event()
+        self.proc = None
+
+    # ---------------- 发送端 ----------------
+
+    def _new_client(self):
+        client_id = f'soak_{self.next_client}'
+        self.next_client += 1
+        self.clients[client_id] = {
+            'target': self.rng.choice(TARGETS),
+            'model_id': self.rng.choice(self.model_ids) if self.model_ids else None,
+        }
+
+    def _send(self, message):
+        self.proc.stdin.write(json.dumps(message) + '\n')
+        self.proc.stdin.flush()
+
+    def _churn(self):
+        """按每秒概率折算到每条消息：替换一个客户端 / 切换一个客户端的目标手势"""
+        per_msg = 1.0 / self.args.rate
+        if self.rng.random() < self.args.churn * per_msg:
+            client_id = self.rng.choice(list(self.clients))
+            del self.clients[client_id]
+            self.live_sessions = {k for k in self.live_sessions if k[0] != client_id}
+            self._send({'type': 'client_disconnect', 'client_id': client_id})
+            self._new_client()
+            with self.lock:
+                self.window['disconnects'] += 1
+        if self.rng.random() < self.args.switch * per_msg:
+            state = self.clients[self.rng.choice(list(self.clients))]
+            state['target'] = self.rng.choice(TARGETS)
+            if self.model_ids:
+                state['model_id'] = self.rng.choice(self.model_ids)
+            with self.lock:
+                self.window['switches'] += 1
+
+    def _request(self, client_id):
+        state = self.clients[client_id]
+        self.seq += 1
+        message = {'client_id': client_id, 'seq': self.seq, 'target_gesture': state['target'],
+                   'ts': time.time() * 1000}
+        if state['model_id'] and state['model_id'] != 'default':
+            message['model_id'] = state['model_id']
+        if self.frame is not None and self.rng.random() < self.args.frame_ratio:
+            message.update(type='process_frame', frame=self.frame)
+        else:
+            message.update(type='process_landmarks', points=synthetic_points(self.rng),
+                           image={'width': 640, 'height': 480, 'unit': 'norm01'},
+                           mirrored=bool(self.rng.getrandbits(1)))
+        return message
+
+    def feed(self, deadline):
+        for _ in range(self.args.clients):
+            self._new_client()
+        interval = 1.0 / self.args.rate
+        next_at = time.perf_counter()
+        next_ping = next_at
+        try:
+            while time.perf_counter() < deadline and not self.stop.is_set():
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self._churn()
+                if time.perf_counter() >= next_ping:
+                    self.pending_pings.append(len(self.live_sessions))
+                    self._send({'type': 'ping'})
+                    next_ping += self.args.sample_interval / 2
+                client_id = self.rng.choice(list(self.clients))
+                with self.lock:
+                    if len(self.sent) >= self.args.max_inflight:
+                        # 与桥接层一样只保留最新帧：worker 跟不上时丢弃而不是排队
+                        self.window['throttled'] += 1
+                        continue
+                message = self._request(client_id)
+                self.live_sessions.add((client_id, message['target_gesture']))
+                kind = 'frame' if message['type'] == 'process_frame' else 'landmarks'
+                now = time.perf_counter()
+                with self.lock:
+                    # 有 frame 在途（未回复且未超过 1s，被丢弃的帧不会回复）时，延迟主要是等前面的 frame
+                    if kind == 'landmarks' and any(k == 'frame' and now - t < 1.0 for t, k in self.sent.values()):
+                        kind = None
+                    self.sent[message['seq']] = (now, kind)
+                self._send(message)
+        except (BrokenPipeError, ValueError):
+            pass  # worker 提前退出，由主线程报告
+        finally:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+    # ---------------- 接收端 ----------------
+
+    def read(self):
+        for line in self.proc.stdout:
+            now = time.perf_counter()
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                continue
+            if reply.get('type') == 'pong':
+                reply['expected_sessions'] = self.pending_pings.popleft() if self.pending_pings else None
+                self.pong = reply
+                continue
+            if reply.get('msg_class') != 'result':
+                continue
+            with self.lock:
+                sent = self.sent.pop(reply.get('seq'), None)
+                if sent is not None:
+                    if sent[1] is None:
+                        self.window['behind_frame'] += 1
+                    else:
+                        self.latencies[sent[1]].append((now - sent[0]) * 1000)
+                self.window['results'] += 1
+                if not reply.get('ok', True):
+                    self.window['errors'] += 1
+
+    # ---------------- 采样 ----------------
+
+    def sample(self, elapsed):
+        rss, fds = read_proc(self.proc.pid)
+        with self.lock:
+            latencies, self.latencies = self.latencies, {kind: [] for kind in KINDS}
+            window, self.window = self.window, dict.fromkeys(self.window, 0)
+            inflight = len(self.sent)
+        for key, value in window.items():
+            self.totals[key] += value
+        self.totals['requests'] = self.seq
+        pong = self.pong or {}
+        return dict(
+            type='soak_sample',
+            t_s=round(elapsed, 1),
+            rss_mb=round(rss, 2) if rss is not None else None,
+            fds=fds,
+            latency_ms={kind: percentiles(values) for kind, values in latencies.items()},
+            replies={kind: len(values) for kind, values in latencies.items()},
+            inflight=inflight,
+            sessions=(pong.get('client_states') or {}).get('size'),
+            expected_sessions=pong.get('expected_sessions'),
+            resident_models=(pong.get('models') or {}).get('resident_models'),
+            **window,
+        )
+
+    def run(self):
+        args = self.args
+        env = dict(os.environ, WORKER_LOG_LEVEL='warning', **args.env)
+        self.proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, text=True, env=env)
+        while True:
+            line = self.proc.stdout.readline()
+            if not line or json.loads(line).get('type') == 'ready':
+                break
+        start = time.perf_counter()
+        deadline = start + args.duration
+        reader = threading.Thread(target=self.read, daemon=True)
+        writer = threading.Thread(target=self.feed, args=(deadline,), daemon=True)
+        reader.start()
+        writer.start()
+
+        samples = []
+        out = open(args.output, 'w') if args.output else None
+        try:
+            while time.perf_counter() < deadline and self.proc.poll() is None:
+                time.sleep(min(args.sample_interval, max(0.0, deadline - time.perf_counter())))
+                sample = self.sample(time.perf_counter() - start)
+                samples.append(sample)
+                print(json.dumps(sample), flush=True)
+                if out:
+                    out.write(json.dumps(sample) + '\n')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop.set()
+            writer.join()
+            reader.join(timeout=30)
+            if self.proc.poll() is None:
+                self.proc.terminate()
+            self.proc.wait()
+
+        report = analyze(samples, args, self.totals, len(self.sent), self.proc.returncode)
+        print(json.dumps(report))
+        if out:
+            out.write(json.dumps(report) + '\n')
+            out.close()
+        return 0 if not report['failures'] else 1
+
+
+def analyze(samples, args, totals, missing, returncode):
+    """对预热之后的样本做漂移判定"""
+    steady = [s for s in samples if s['t_s'] >= args.warmup]
+    failures = []
+    report = {'type': 'soak_report', 'duration_s': args.duration, 'samples': len(samples),
+              'steady_samples': len(steady), 'totals': totals, 'missing': missing}
+    if returncode not in (0, None):
+        failures.append(f'worker exited with code {returncode}')
+    if len(steady) < 3:
+        failures.append(f'only {len(steady)} samples after warmup; run longer or lower --sample-interval')
+        report['failures'] = failures
+        return report
+
+    t_h = np.array([s['t_s'] for s in steady]) / 3600
+    rss = [s['rss_mb'] for s in steady]
+    if None not in rss:
+        slope = float(np.polyfit(t_h, rss, 1)[0])
+        growth = slope * (t_h[-1] - t_h[0])
+        report['rss_mb'] = {'start': rss[0], 'end': rss[-1], 'max': max(rss),
+                            'slope_mb_per_h': round(slope, 2), 'fitted_growth_mb': round(growth, 2)}
+        if growth > args.max_rss_growth_mb:
+            failures.append(f'RSS grew {growth:.1f} MB over the steady window ({slope:.1f} MB/h)')
+
+    fds = [s['fds'] for s in steady]
+    if None not in fds:
+        report['fds'] = {'start': fds[0], 'end': fds[-1], 'max': max(fds)}
+        if max(fds) - fds[0] > args.max_fd_growth:
+            failures.append(f'open fds grew from {fds[0]} to {max(fds)}')
+
+    # 按消息类型分别判定：frame 与 landmarks 的服务时间相差数倍，不能混在同一个分位数里
+    report['latency_p95_ms'] = {}
+    for kind in KINDS:
+        p95 = [s['latency_ms'][kind]['p95'] for s in steady if s['latency_ms'].get(kind)]
+        if len(p95) < 6:
+            continue
+        third = len(p95) // 3
+        head, tail = float(np.median(p95[:third])), float(np.median(p95[-third:]))
+        ratio = tail / head if head > 0 else None
+        report['latency_p95_ms'][kind] = {'windows': len(p95), 'first_third': round(head, 2),
+                                          'last_third': round(tail, 2), 'ratio': round(ratio, 3) if ratio else None}
+        if ratio and ratio > args.max_latency_ratio:
+            failures.append(f'{kind} p95 latency drifted {head:.1f} -> {tail:.1f} ms (x{ratio:.2f})')
+
+    # 容差 = 在途请求上限：EDF 调度下 ping 之后发出的帧可能先于 ping 处理
+    leaks = [s for s in steady if s['sessions'] is not None and s['expected_sessions'] is not None
+             and s['sessions'] > s['expected_sessions'] + args.max_inflight]
+    report['session_overshoot'] = max((s['sessions'] - s['expected_sessions'] for s in leaks), default=0)
+    if leaks:
+        failures.append(f'worker held more sessions than connected clients in {len(leaks)} samples '
+                        f'(max overshoot {report["session_overshoot"]})')
+
+    results = totals['results'] or 1
+    error_rate = totals['errors'] / results
+    report['error_rate'] = round(error_rate, 4)
+    if error_rate > args.max_error_rate:
+        failures.append(f'error rate {error_rate:.2%}')
+
+    report['failures'] = failures
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-running worker soak test with drift detection')
+    parser.add_argument('--duration', type=parse_duration, default=parse_duration('1h'), help='如 90s / 30m / 4h')
+    parser.add_argument('--rate', type=float, default=30.0, help='每秒请求数')
+    parser.add_argument('--clients', type=int, default=50, help='同时在线客户端数')
+    parser.add_argument('--churn', type=float, default=0.5, help='每秒替换（断开 + 新接入）的客户端数')
+    parser.add_argument('--switch', type=float, default=0.2, help='每秒切换目标手势 / 模型的客户端数')
+    parser.add_argument('--frame-ratio', type=float, default=0.05, help='process_frame 占比（其余为 landmarks）')
+    parser.add_argument('--model-ids', default='', help='客户端随机选用的 model_id，逗号分隔')
+    parser.add_argument('--max-inflight', type=int, default=32)
+    parser.add_argument('--sample-interval', type=float, default=30.0, help='采样周期（秒）')
+    parser.add_argument('--warmup', type=parse_duration, default=120.0, help='不参与漂移判定的预热时长')
+    parser.add_argument('--max-rss-growth-mb', type=float, default=32.0)
+    parser.add_argument('--max-fd-growth', type=int, default=8)
+    parser.add_argument('--max-latency-ratio', type=float, default=1.5)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--env', nargs='*', default=[], help='worker 环境变量覆盖，如 WORKER_MODE=pipeline')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='采样与报告（JSON lines）')
+    args = parser.parse_args()
+    args.env = dict(item.split('=', 1) for item in args.env)
+    sys.exit(Soak(args).run())
+
+
+if __name__ == '__main__':
+    main()
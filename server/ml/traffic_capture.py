@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+流量抓取：把 worker 收到的 process_landmarks / process_frame 原始消息连同到达时间写入滚动二进制日志
+供 traffic_replay.py 回放，复现线上的性能问题
+
+段文件格式（*.gtap）:
+    文件头 b'GTAP\\x01'
+    记录   <d arrival_s><I length> + zlib(原始 JSON 行)
+- 采样按 client_id 哈希（被选中的会话完整保留，EMA 等时序状态可以复现）
+- 单段超过 segment_bytes 时切换新段；所有段总大小超过 max_bytes 时删除最旧的段
+- 压缩与写盘在后台线程完成；队列满时直接丢弃并计数，抓取不会拖慢推理
+process_frame_shm 的帧数据在共享内存中，不在消息里，因此不抓取
+"""
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b'GTAP\x01'
+RECORD = struct.Struct('<dI')
+CAPTURE_TYPES = (b'"process_landmarks"', b'"process_frame"')
+_CLIENT_RE = re.compile(rb'"client_id":\s*"([^"]*)"')
+
+
+def _sampled(line, rate):
+    """按 client_id 的哈希决定是否采样（同一会话的结果总是一致）"""
+    if rate >= 1.0:
+        return True
+    match = _CLIENT_RE.search(line)
+    key = match.group(1) if match else b''
+    return (zlib.crc32(key) % 10000) < rate * 10000
+
+
+class TrafficTap:
+    """
+    参数:
+        directory: 日志目录
+        sample_rate: 会话采样率 (0, 1]
+        max_bytes: 所有段文件的总大小上限
+        segment_bytes: 单个段文件的大小上限
+        queue_size: 待写入的记录数上限（超过即丢弃）
+    """
+
+    def __init__(self, directory, sample_rate=1.0, max_bytes=256 << 20, segment_bytes=16 << 20, queue_size=1024):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.captured = 0
+        self.dropped = 0
+        self._segments = []  # [(path, size)]，最旧的在前
+        self._file = None
+        self._counter = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.gtap'):
+                path = os.path.join(directory, name)
+                self._segments.append((path, os.path.getsize(path)))
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def record(self, line, arrival=None):
+        """记录一行原始输入（str 或 bytes）；非识别消息或未被采样时忽略"""
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        if not any(t in line for t in CAPTURE_TYPES) or not _sampled(line, self.sample_rate):
+            return
+        try:
+            self._queue.put_nowait((time.time() if arrival is None else arrival, line))
+        except queue.Full:
+            self.dropped += 1
+
+    def wrap(self, stream):
+        """包装输入流：逐行读取时顺带抓取（readline 与迭代两种用法都支持）"""
+        return _TappedStream(stream, self)
+
+    def _open_segment(self):
+        self._counter += 1
+        path = os.path.join(self.directory, f'capture-{int(time.time() * 1000)}-{self._counter:04d}.gtap')
+        self._file = open(path, 'wb', buffering=1 << 20)
+        self._file.write(MAGIC)
+        self._segments.append((path, len(MAGIC)))
+
+    def _enforce_budget(self):
+        total = sum(size for _, size in self._segments)
+        while total > self.max_bytes and len(self._segments) > 1:
+            path, size = self._segments.pop(0)
+            total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            arrival, line = item
+            payload = zlib.compress(line, 1)
+            if self._file is None or self._segments[-1][1] + RECORD.size + len(payload) > self.segment_bytes:
+                if self._file is not None:
+                    self._file.close()
+                self._open_segment()
+            self._file.write(RECORD.pack(arrival, len(payload)))
+            self._file.write(payload)
+            path, size = self._segments[-1]
+            self._segments[-1] = (path, size + RECORD.size + len(payload))
+            self.captured += 1
+            self._enforce_budget()
+        if self._file is not None:
+            self._file.close()
+
+    def close(self):
+        """写完队列中剩余的记录并关闭当前段"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            'captured': self.captured,
+            'dropped': self.dropped,
+            'segments': len(self._segments),
+            'bytes': sum(size for _, size in self._segments),
+        }
+
+
+class _TappedStream:
+    def __init__(self, stream, tap):
+        self._stream = stream
+        self._tap = tap
+
+    def readline(self):
+        line = self._stream.readline()
+        if line.strip():
+            self._tap.record(line)
+        return line
+
+    def __iter__(self):
+        for line in self._stream:
+            if line.strip():
+                self._tap.record(line)
+            yield line
+
+
+def capture_files(path):
+    """目录 -> 按文件名（时间）排序的段文件；单个文件原样返回"""
+    if os.path.isdir(path):
+        return [os.path.join(path, n) for n in sorted(os.listdir(path)) if n.endswith('.gtap')]
+    return [path]
+
+
+def read_capture(path):
+    """按时间顺序逐条产出 (arrival_s, 原始 JSON 行 str)；末尾不完整的记录（进程被杀）直接忽略"""
+    for file_path in capture_files(path):
+        with open(file_path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'not a capture segment: {file_path}')
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    break
+                arrival, length = RECORD.unpack(head)
+                payload = f.read(length)
+                if len(payload) < length:
+                    break
+                yield arrival, zlib.decompress(payload).decode('utf-8').strip()
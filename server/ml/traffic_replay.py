@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+回放 traffic_capture 抓取的线上流量，复现并对比 worker 的输出与延迟
+
+run:     把抓取日志按原始节奏（或缩放 / 最快速度）灌入本地 worker，逐条记录结果与延迟
+compare: 对比两次 run 的输出（按回放序号一一对应）：预测一致率、置信度差、延迟分布
+
+- 回放时 seq 改写为日志中的序号（两次回放可逐条对齐），ts 改写为实际发送时间
+  （否则开启 LATENCY_BUDGET_MS 时所有历史消息都会被判定过期）
+- 未收到结果的请求（被截止时间丢弃）计入 missing
+
+用法:
+    python server/ml/traffic_replay.py run captures/ -o base.jsonl [--speed original|max|2.0]
+                                       [--env MODEL_BACKEND=mlp ...] [--limit N]
+    python server/ml/traffic_replay.py compare base.jsonl mlp.jsonl [--min-agreement 0.95]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from traffic_capture import read_capture
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'realtime_recognition.py')
+
+
+def percentiles(values):
+    if not values:
+        return None
+    arr = np.asarray(values)
+    return {
+        'p50': round(float(np.percentile(arr, 50)), 2),
+        'p95': round(float(np.percentile(arr, 95)), 2),
+        'p99': round(float(np.percentile(arr, 99)), 2),
+        'max': round(float(arr.max()), 2),
+        'mean': round(float(arr.mean()), 2),
+    }
+
+
+def parse_speed(value):
+    """original -> 1.0，max -> None（不等待），其余按倍数解析"""
+    if value == 'original':
+        return 1.0
+    if value == 'max':
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError('speed must be positive')
+    return speed
+
+
+def replay(capture, speed, env_overrides, limit=None):
+    """回放一份抓取日志，返回 (逐条结果列表, 汇总)"""
+    records = []
+    for arrival, line in read_capture(capture):
+        records.append((arrival, line))
+        if limit and len(records) >= limit:
+            break
+    if not records:
+        raise SystemExit(f'no records in {capture}')
+
+    env = dict(os.environ, WORKER_LOG_LEVEL='warning', **env_overrides)
+    env.pop('TRAFFIC_CAPTURE_DIR', None)  # 回放时不再抓取
+    proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, env=env)
+    while True:
+        line = proc.stdout.readline()
+        if not line or json.loads(line).get('type') == 'ready':
+            break
+
+    sent = {}
+    lag_ms = []
+
+    def feed():
+        start = time.perf_counter()
+        origin = records[0][0]
+        for i, (arrival, line) in enumerate(records):
+            if speed is not None:
+                due = start + (arrival - origin) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    lag_ms.append(-delay * 1000)
+            message = json.loads(line)
+            message['seq'] = i
+            message['ts'] = time.time() * 1000
+            sent[i] = time.perf_counter()
+            proc.stdin.write(json.dumps(message) + '\n')
+            proc.stdin.flush()
+        proc.stdin.close()
+
+    start = time.perf_counter()
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    results, errors = [], 0
+    for line in proc.stdout:
+        now = time.perf_counter()
+        reply = json.loads(line)
+        if reply.get('msg_class') != 'result':
+            continue
+        seq = reply.get('seq')
+        data = reply.get('data') or {}
+        if not reply.get('ok', True):
+            errors += 1
+        results.append({
+            'type': 'replay_result',
+            'seq': seq,
+            'client_id': reply.get('client_id'),
+            'ok': reply.get('ok', True),
+            'predicted': data.get('predicted'),
+            'smoothed_predicted': data.get('smoothed_predicted'),
+            'confidence': data.get('confidence'),
+            'smoothed_confidence': data.get('smoothed_confidence'),
+            'latency_ms': round((now - sent.get(seq, now)) * 1000, 3),
+        })
+    elapsed = time.perf_counter() - start
+    writer.join()
+    proc.wait()
+
+    summary = {
+        'type': 'replay_summary',
+        'capture': capture,
+        'speed': 'max' if speed is None else speed,
+        'env': env_overrides,
+        'requests': len(records),
+        'results': len(results),
+        'errors': errors,
+        'missing': len(records) - len(results),
+        'elapsed_s': round(elapsed, 3),
+        'capture_span_s': round(records[-1][0] - records[0][0], 3),
+        'msgs_per_s': round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': percentiles([r['latency_ms'] for r in results]),
+        'send_lag_ms': percentiles(lag_ms),  # 发送端跟不上原始节奏的程度
+    }
+    return results, summary
+
+
+def load_run(path):
+    results, summary = {}, None
+    with open(path) as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get('type') == 'replay_summary':
+                summary = rec
+            else:
+                results[rec['seq']] = rec
+    return results, summary
+
+
+def compare(path_a, path_b):
+    a, summary_a = load_run(path_a)
+    b, summary_b = load_run(path_b)
+    common = sorted(set(a) & set(b))
+    same = sum(a[s]['predicted'] == b[s]['predicted'] for s in common)
+    same_smoothed = sum(a[s]['smoothed_predicted'] == b[s]['smoothed_predicted'] for s in common)
+    conf_delta = [abs((a[s]['confidence'] or 0.0) - (b[s]['confidence'] or 0.0)) for s in common]
+    lat_a = percentiles([a[s]['latency_ms'] for s in common])
+    lat_b = percentiles([b[s]['latency_ms'] for s in common])
+    return {
+        'type': 'replay_compare',
+        'a': path_a,
+        'b': path_b,
+        'matched': len(common),
+        'only_a': len(set(a) - set(b)),
+        'only_b': len(set(b) - set(a)),
+        'agreement': round(same / len(common), 4) if common else None,
+        'smoothed_agreement': round(same_smoothed / len(common), 4) if common else None,
+        'mean_abs_confidence_delta': round(float(np.mean(conf_delta)), 4) if conf_delta else None,
+        'latency_ms': {'a': lat_a, 'b': lat_b},
+        'latency_p95_ratio': round(lat_b['p95'] / lat_a['p95'], 3) if lat_a and lat_b and lat_a['p95'] else None,
+        'throughput': {'a': (summary_a or {}).get('msgs_per_s'), 'b': (summary_b or {}).get('msgs_per_s')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured worker traffic and compare runs')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_p = sub.add_parser('run', help='回放抓取日志')
+    run_p.add_argument('capture', help='.gtap 段文件或抓取目录')
+    run_p.add_argument('-o', '--output', help='逐条结果 + 汇总（JSON lines）')
+    run_p.add_argument('--speed', type=parse_speed, default=1.0, help='original / max / 倍数（如 2.0）')
+    run_p.add_argument('--env', nargs='*', default=[], help='worker 环境变量覆盖，如 MODEL_BACKEND=mlp')
+    run_p.add_argument('--limit', type=int, default=None)
+
+    cmp_p = sub.add_parser('compare', help='对比两次回放')
+    cmp_p.add_argument('a')
+    cmp_p.add_argument('b')
+    cmp_p.add_argument('--min-agreement', type=float, default=0.0, help='预测一致率低于此值时退出码为 1')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        env = dict(item.split('=', 1) for item in args.env)
+        results, summary = replay(args.capture, args.speed, env, args.limit)
+        if args.output:
+            with open(args.output, 'w') as f:
+                for rec in results:
+                    f.write(json.dumps(rec) + '\n')
+                f.write(json.dumps(summary) + '\n')
+        print(json.dumps(summary))
+        return 0
+
+    report = compare(args.a, args.b)
+    print(json.dumps(report))
+    return 0 if (report['agreement'] or 0.0) >= args.min_agreement else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
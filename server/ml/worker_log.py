@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Worker 诊断日志（与结果流分离）
+- 诊断信息写到独立通道（默认 stderr，或 WORKER_LOG_FD 指定的文件描述符），stdout 只承载结果
+- 级别控制：WORKER_LOG_LEVEL=debug/info/warning/error（PY_DEBUG=true 等价于 debug）
+- 限流采样：每种记录类型一个令牌桶，超出速率的记录丢弃并计数
+- 周期汇总：逐帧 perf 只做聚合，每 WORKER_LOG_SUMMARY_S 秒输出一条 perf_summary
+- 写入带缓冲：info 以上的状态 / 生命周期记录（启动、模型加载、调度模式等）和汇总立即 flush，
+  只有高频的逐帧 debug 记录留在缓冲里，由下一条状态记录、汇总或退出时一并写出
+"""
+import atexit
+import json
+import os
+import time
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+
+class _TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'last')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class WorkerLogger:
+    """
+    参数:
+        stream: 可写文本流
+        level: 最低输出级别（'debug' / 'info' / 'warning' / 'error'）
+        rate: 每种记录类型每秒最多输出条数（warning 以上不限流）
+        summary_interval: perf 汇总周期（秒），<= 0 表示关闭汇总
+    """
+
+    def __init__(self, stream, level='info', rate=5.0, summary_interval=10.0):
+        self.stream = stream
+        self.level = LEVELS.get(level, LEVELS['info'])
+        self.rate = rate
+        self.summary_interval = summary_interval
+        self._buckets = {}
+        self._suppressed = {}
+        self._window_start = time.monotonic()
+        self._perf_ms = []
+        self._perf_ok = 0
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def _write(self, record, flush):
+        try:
+            self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            if flush:
+                self.stream.flush()
+        except (OSError, ValueError):
+            pass  # 诊断通道不可写时静默丢弃，不影响结果流
+
+    def log(self, level, record):
+        """输出一条诊断记录（dict，需含 'type'）"""
+        if not self.enabled(level):
+            return
+        urgent = LEVELS[level] >= LEVELS['warning']
+        if not urgent and self.rate > 0:
+            kind = record.get('type', level)
+            bucket = self._buckets.get(kind)
+            if bucket is None:
+                bucket = self._buckets[kind] = _TokenBucket(self.rate, max(1.0, self.rate))
+            if not bucket.take():
+                self._suppressed[kind] = self._suppressed.get(kind, 0) + 1
+                return
+        # 只有 debug 记录缓冲：安静的 worker 被杀掉时也不会丢失状态记录
+        self._write(dict(record, level=level), flush=LEVELS[level] > LEVELS['debug'])
+
+    def debug(self, record):
+        self.log('debug', record)
+
+    def info(self, record):
+        self.log('info', record)
+
+    def warning(self, record):
+        self.log('warning', record)
+
+    def error(self, record):
+        self.log('error', record)
+
+    def perf(self, record):
+        """记录一帧性能数据：始终参与汇总，debug 级别下额外限流输出单帧记录"""
+        self._perf_ms.append(record.get('inference_ms', 0.0))
+        if record.get('landmarks_ok'):
+            self._perf_ok += 1
+        if self.level <= LEVELS['debug']:
+            self.log('debug', dict(record, type='perf'))
+        if self.summary_interval > 0 and time.monotonic() - self._window_start >= self.summary_interval:
+            self.summary()
+
+    def summary(self):
+        """输出并重置当前窗口的 perf 汇总"""
+        now = time.monotonic()
+        window = now - self._window_start
+        samples = sorted(self._perf_ms)
+        if samples and self.enabled('info'):
+            n = len(samples)
+            self._write({
+                'type': 'perf_summary',
+                'level': 'info',
+                'window_s': round(window, 2),
+                'frames': n,
+                'fps': round(n / window, 2) if window > 0 else None,
+                'inference_ms': {
+                    'mean': round(sum(samples) / n, 2),
+                    'p50': round(samples[n // 2], 2),
+                    'p95': round(samples[min(n - 1, int(n * 0.95))], 2),
+                    'max': round(samples[-1], 2),
+                },
+                'landmarks_ok_ratio': round(self._perf_ok / n, 3),
+                'suppressed': self._suppressed,
+            }, flush=True)
+        self._window_start = now
+        self._perf_ms = []
+        self._perf_ok = 0
+        self._suppressed = {}
+
+    def close(self):
+        self.summary()
+        try:
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass
+
+
+def create_logger():
+    """按环境变量创建 worker 日志器，并在退出时输出最后一次汇总"""
+    debug = (os.getenv("PY_DEBUG", "false").lower() == "true"
+             or os.getenv("DEBUG", "false").lower() == "true")
+    level = os.getenv("WORKER_LOG_LEVEL", "debug" if debug else "info").lower()
+    fd = int(os.getenv("WORKER_LOG_FD", "2"))
+    stream = open(fd, 'w', buffering=1 << 16, encoding='utf-8', closefd=False)
+    logger = WorkerLogger(
+        stream,
+        level=level,
+        rate=float(os.getenv("WORKER_LOG_RATE", "5")),
+        summary_interval=float(os.getenv("WORKER_LOG_SUMMARY_S", "10")),
+    )
+    atexit.register(logger.close)
+    return logger
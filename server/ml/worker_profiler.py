@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+在线 worker 的按需性能剖析（profile_start / profile_stop 控制消息）
+- cprofile：在处理消息的线程上开启 cProfile（覆盖 process_frame / process_landmarks_input 的完整调用树），
+  结束时写出 .pstats（可用 snakeviz / pstats 查看）和按累计耗时排序的 .txt 摘要
+- sampling：后台线程按固定间隔采样所有线程的调用栈（含流水线解码线程），写出 collapsed-stack
+  文本（flamegraph.pl / speedscope 可直接打开），开销只与采样频率有关
+- 两种模式都可同时开启 tracemalloc，结束时写出按代码行聚合的分配量 top-N
+  （只记录 1 层调用栈：按行聚合不需要更深的栈，开销也小得多）
+- 每次会话有时长上限，由计时器线程判定到期（空闲的 worker 也会按时结束），忘记 profile_stop 也不会一直拖慢 worker:
+  到期时立即停掉与线程无关的部分（采样线程、tracemalloc）并落盘；cProfile 的钩子只能在开启它的线程上移除，
+  由该线程在处理下一条消息或退出前调用 stop() 收尾（线程空闲时 cProfile 不产生任何开销）
+- 输出文件前缀 = 时间戳 + 进程号 + 进程内序号，同一秒内的多次会话互不覆盖
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+MODES = ('cprofile', 'sampling')
+# 栈顶落在这些文件里的采样视为空闲（线程在等锁 / 队列 / join）
+IDLE_FILES = ('(threading.py:', '(queue.py:')
+_session_ids = itertools.count(1)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """后台线程定时采样 sys._current_frames()，按折叠调用栈计数"""
+
+    def __init__(self, interval_s=0.005):
+        self.interval_s = interval_s
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, f'thread-{ident}'))
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.counts.items(), key=lambda kv: -kv[1]):
+                f.write(f'{stack} {count}\n')
+
+    def top(self, n):
+        """按自身采样数（栈顶函数）排序的热点，忽略阻塞在锁 / 队列上的空闲线程"""
+        leaf = {}
+        idle = 0
+        for stack, count in self.counts.items():
+            name = stack.rsplit(';', 1)[-1]
+            if any(f in name for f in IDLE_FILES):
+                idle += count
+                continue
+            leaf[name] = leaf.get(name, 0) + count
+        total = sum(leaf.values()) or 1
+        hot = [{'function': name, 'samples': count, 'ratio': round(count / total, 4)}
+               for name, count in sorted(leaf.items(), key=lambda kv: -kv[1])[:n]]
+        return hot, idle
+
+
+class ProfileSession:
+    """
+    参数:
+        directory: 输出目录
+        mode: 'cprofile' / 'sampling'
+        duration_s: 最长持续时间（秒）
+        top_n: 摘要与 tracemalloc 快照保留的条数
+        interval_ms: sampling 模式的采样间隔
+        trace_memory: 是否同时记录 tracemalloc 分配快照
+        on_expire: 到期回调 on_expire(session)，在计时器线程上调用（此时采样与 tracemalloc 已停止）
+    """
+
+    def __init__(self, directory, mode='cprofile', duration_s=30.0, top_n=25,
+                 interval_ms=5.0, trace_memory=True, on_expire=None):
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {MODES}, got {mode!r}')
+        self.directory = directory
+        self.mode = mode
+        self.duration_s = duration_s
+        self.top_n = top_n
+        self.interval_ms = interval_ms
+        self.trace_memory = trace_memory
+        self.on_expire = on_expire
+        self.prefix = os.path.join(
+            directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_session_ids)}")
+        self.started = None
+        self.messages = 0
+        self.owner = None               # 开启 cProfile 的线程（只能在该线程上停止）
+        self._profiler = None
+        self._sampler = None
+        self._owns_tracemalloc = False
+        self._timer = None
+        self._lock = threading.Lock()
+        self._summary = None            # 已停止部分的摘要（计时器到期时先写入）
+        self._timed_out = False
+        self._stopped = False
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+            self._owns_tracemalloc = True
+        self.owner = threading.get_ident()
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(self.interval_ms / 1000.0)
+            self._sampler.start()
+        self.started = time.monotonic()
+        self._timer = threading.Timer(self.duration_s, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+        return self
+
+    @property
+    def thread_bound(self):
+        """是否有只能在开启线程上停止的部分（cProfile）"""
+        return self._profiler is not None
+
+    def expired(self):
+        return self._timed_out or time.monotonic() - self.started >= self.duration_s
+
+    def _expire(self):
+        """计时器线程：停掉与线程无关的部分并落盘，cProfile 留给开启线程的 stop()"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._timed_out = True
+            self._summary = self._stop_shared()
+        if self.on_expire is not None:
+            self.on_expire(self)
+
+    def stop(self):
+        """
+        结束剖析并写出文件，返回摘要（文件路径 + 热点 top-N）；已结束时返回 None
+        cProfile 模式必须在开启它的线程上调用
+        """
+        if self._profiler is not None and threading.get_ident() != self.owner:
+            raise RuntimeError('cProfile session must be stopped on the thread that started it')
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            if self._stopped:
+                return None
+            self._stopped = True
+            summary = self._summary if self._summary is not None else self._stop_shared()
+            if self._profiler is not None:
+                self._stop_cprofile(summary)
+        summary['elapsed_s'] = round(time.monotonic() - self.started, 3)
+        summary['messages'] = self.messages
+        summary['timed_out'] = self._timed_out
+        return summary
+
+    def _stop_cprofile(self, summary):
+        """停止 cProfile 并写出 .pstats 与文本摘要（在开启线程上调用）"""
+        self._profiler.disable()
+        path = self.prefix + '.pstats'
+        self._profiler.dump_stats(path)
+        text = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=text).sort_stats('cumulative')
+        stats.print_stats(self.top_n)
+        with open(self.prefix + '.txt', 'w') as f:
+            f.write(text.getvalue())
+        summary['files'].update(pstats=path, text=self.prefix + '.txt')
+        summary['top'] = [
+            {'function': f'{func[2]} ({os.path.basename(func[0])}:{func[1]})',
+             'calls': row[1], 'tottime_ms': round(row[2] * 1000, 2), 'cumtime_ms': round(row[3] * 1000, 2)}
+            for func, row in sorted(stats.stats.items(), key=lambda kv: -kv[1][2])[:self.top_n]
+        ]
+
+    def _stop_shared(self):
+        """停止采样线程与 tracemalloc 并写出文件（任意线程均可调用），返回部分摘要"""
+        summary = {'mode': self.mode, 'files': {}}
+        if self._sampler is not None:
+            self._sampler.stop()
+            path = self.prefix + '.collapsed'
+            self._sampler.write(path)
+            summary['files']['collapsed'] = path
+            summary['samples'] = self._sampler.samples
+            summary['top'], summary['idle_samples'] = self._sampler.top(self.top_n)
+        if tracemalloc.is_tracing() and self.trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            ])
+            current, peak = tracemalloc.get_traced_memory()
+            path = self.prefix + '.tracemalloc.txt'
+            with open(path, 'w') as f:
+                f.write(f'traced current={current} peak={peak} bytes\n')
+                for stat in snapshot.statistics('lineno')[:self.top_n]:
+                    f.write(f'{stat}\n')
+            summary['files']['tracemalloc'] = path
+            summary['traced_bytes'] = {'current': current, 'peak': peak}
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        return summary
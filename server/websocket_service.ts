@@ -11,15 +11,18 @@ import path from "path";
 import { WebSocketServer, WebSocket } from "ws";
 import { IncomingMessage } from "http";
 import { PythonShell } from "python-shell";
+import { FrameRingWriter } from "./frame_ring.js";
+import { routePythonMessage, RouteSinks } from "./worker_router.js";
 
 const WS_PATH = "/ws/gesture";        // 前端用的 WS 路径
 const HEARTBEAT_MS = 30_000;          // 心跳间隔
 
 interface GestureMessage {
-  type: "gesture_data" | "frame_data" | "landmarks" | "start_recognition" | "stop_recognition";
+  type: "gesture_data" | "frame_data" | "landmarks" | "start_recognition" | "stop_recognition" | "add_samples";
   data?: any;
   frame?: string;
   target_gesture?: string;
+  model_id?: string;  // 课程 / 词表 / 用户微调模型（worker 的模型注册表按需加载），省略时用默认模型
   // landmarks 消息字段
   points?: number[][];  // 21 个 [x, y, z] 点
   image?: { width: number; height: number; unit: string };
@@ -31,8 +34,11 @@ interface ClientConnection {
   ws: WebSocket;
   isRecognizing: boolean;
   targetGesture?: string;
+  modelId?: string;      // start_recognition 时选定的模型
   lastPongTs: number;
   latestFrame?: string;  // 仅保存最新帧，旧帧会被覆盖
+  latestFrameTs?: number;  // 最新帧到达桥接层的时间（毫秒）
+  seq: number;           // 发往 Python 的请求序号（结果会原样回显）
 }
 
 export class GestureWebSocketService {
@@ -41,7 +47,11 @@ export class GestureWebSocketService {
   private httpServer: http.Server;
   private clients: Map<string, ClientConnection> = new Map();
   private pythonProcess: PythonShell | null = null;
+  private frameRing: FrameRingWriter | null = null;  // FRAME_TRANSPORT=shm 时由 worker 的 ready 消息开启
   private heartBeatTimer: NodeJS.Timeout | null = null;
+  // 管理通道：等待 worker control 回复的请求（seq 为 "admin-N"，与客户端的数字 seq 不冲突）
+  private adminSeq = 0;
+  private pendingControl: Map<string, { resolve: (msg: any) => void; timer: NodeJS.Timeout }> = new Map();
 
   /**
    * 只附着到外部 server（由 index.ts 传入）
@@ -100,6 +110,7 @@ export class GestureWebSocketService {
         ws,
         isRecognizing: false,
         lastPongTs: Date.now(),
+        seq: 0,
       });
 
       this.safeSend(ws, {
@@ -126,6 +137,7 @@ export class GestureWebSocketService {
       ws.on("close", (_code: number) => {
         console.log(`🔌 WS client closed: ${clientId}`);
         this.clients.delete(clientId);
+        this.notifyPythonDisconnect(clientId);
       });
 
       ws.on("error", (e) => {
@@ -173,12 +185,14 @@ export class GestureWebSocketService {
       this.pythonProcess.on("message", (line: string) => {
         try {
           const obj = JSON.parse(line);
-          if (obj.type === "status" || obj.type === "ready") {
+          // stdout 只承载结果与协议回复，诊断信息走 stderr（见下方）
+          if (obj.type === "ready") {
             console.log(`🐍 ${obj.message || "Python ready"}`);
-          } else {
-            console.log(`🐍 Python result:`, obj);
+            if (obj.frame_ring) this.openFrameRing(obj.frame_ring);
+          } else if (obj.type === "error" || obj.ok === false) {
+            console.error(`🐍 Python error:`, obj.message || obj.error);
           }
-          this.broadcastGestureResult(obj);
+          this.onPythonMessage(obj);
         } catch {
           // 过滤冗余日志
           if (
@@ -191,15 +205,32 @@ export class GestureWebSocketService {
         }
       });
 
+      // 诊断通道：worker 的结构化日志（已限流 + 周期汇总）
       this.pythonProcess.on("stderr", (stderr: string) => {
-        if (!stderr.includes("WARNING") && !stderr.includes("W0000")) {
-          console.error(`🐍 stderr: ${stderr}`);
+        let rec: any;
+        try {
+          rec = JSON.parse(stderr);
+        } catch {
+          if (!stderr.includes("WARNING") && !stderr.includes("W0000")) {
+            console.error(`🐍 stderr: ${stderr}`);
+          }
+          return;
+        }
+        if (rec.level === "error" || rec.level === "warning") {
+          console.warn(`🐍 [${rec.level}]`, rec.message ?? rec);
+        } else if (rec.type === "perf_summary") {
+          console.log(`🐍 perf: ${rec.frames} frames, ${rec.fps} fps, p50=${rec.inference_ms?.p50}ms p95=${rec.inference_ms?.p95}ms`);
+        } else if (rec.type === "status") {
+          console.log(`🐍 ${rec.message}`);
+        } else {
+          console.debug(`🐍 [${rec.level}]`, rec);
         }
       });
 
       this.pythonProcess.on("close", (code: number) => {
         console.log(`🐍 Python exited with code: ${code}`);
         this.pythonProcess = null;
+        if (this.frameRing) { this.frameRing.close(); this.frameRing = null; }
       });
 
       this.pythonProcess.on("error", (err: Error) => {
@@ -229,9 +260,11 @@ export class GestureWebSocketService {
       case "start_recognition": {
         client.isRecognizing = true;
         client.targetGesture = message.target_gesture;
+        client.modelId = message.model_id;
         this.sendToClient(clientId, {
           type: "recognition_started",
           target_gesture: message.target_gesture,
+          model_id: message.model_id,
           message: "Start recognition",
         });
         break;
@@ -239,6 +272,7 @@ export class GestureWebSocketService {
       case "stop_recognition": {
         client.isRecognizing = false;
         client.targetGesture = undefined;
+        client.modelId = undefined;
         this.sendToClient(clientId, {
           type: "recognition_stopped",
           message: "Stop recognition",
@@ -258,6 +292,24 @@ export class GestureWebSocketService {
         }
         break;
       }
+      case "add_samples": {
+        // 在线索引（ONLINE_INDEX=true）：请求把本会话最近一次被 worker 确认为目标手势的样本加入索引
+        // 只转发会话标识，标签与坐标由 worker 自己的推理结果决定（客户端提交的内容一律不转发）
+        // 回复为 control 消息，不回传前端
+        if (client.isRecognizing && client.targetGesture && this.pythonProcess) {
+          try {
+            this.pythonProcess.send(JSON.stringify({
+              type: "add_samples",
+              client_id: clientId,
+              seq: ++client.seq,
+              target_gesture: client.targetGesture,
+            }));
+          } catch (e) {
+            console.error("❌ send samples to Python failed:", e);
+          }
+        }
+        break;
+      }
       default:
         this.sendToClient(clientId, { type: "error", message: "Unknown message type" });
     }
@@ -269,6 +321,7 @@ export class GestureWebSocketService {
 
     // ⚠️ 性能优化：仅保存最新帧，不排队处理旧帧（避免延迟累积）
     client.latestFrame = frameData;
+    client.latestFrameTs = Date.now();
     client.targetGesture = target;
 
     // 立即处理最新帧（如果 Python 空闲）
@@ -279,12 +332,21 @@ export class GestureWebSocketService {
     const client = this.clients.get(clientId);
     if (!client || !client.latestFrame || !this.pythonProcess) return;
 
-    const payload = {
-      type: "process_frame",
+    const header = {
       client_id: clientId,
-      frame: client.latestFrame,
-      target_gesture: client.targetGesture || ""
+      seq: ++client.seq,
+      target_gesture: client.targetGesture || "",
+      model_id: client.modelId,
+      ts: client.latestFrameTs || Date.now(),  // Python 据此计算截止时间（同机时钟）
     };
+    let payload: any = { type: "process_frame", ...header, frame: client.latestFrame };
+
+    if (this.frameRing) {
+      // 共享内存路径：JPEG 字节写入帧环，stdin 只发槽位号（无空闲槽位时退回 pipe 路径）
+      const jpeg = Buffer.from(client.latestFrame, "base64");
+      const slot = this.frameRing.write(jpeg);
+      if (slot) payload = { type: "process_frame_shm", ...header, ...slot, length: jpeg.length };
+    }
 
     try {
       this.pythonProcess.send(JSON.stringify(payload));
@@ -292,6 +354,7 @@ export class GestureWebSocketService {
       client.latestFrame = undefined;
     } catch (e) {
       console.error("❌ send to Python failed:", e);
+      if (this.frameRing && payload.slot !== undefined) this.frameRing.release(payload.slot);
       this.sendToClient(clientId, { type: "error", message: "Send to Python failed" });
     }
   }
@@ -304,11 +367,14 @@ export class GestureWebSocketService {
     const payload = {
       type: "process_landmarks",  // 新的处理类型
       client_id: clientId,
+      seq: ++client.seq,
       points: message.points,
       image: message.image,
       mirrored: message.mirrored,
       target_gesture: message.target_gesture || client.targetGesture || "",
-      ts: message.ts || Date.now(),
+      model_id: message.model_id || client.modelId,
+      ts: Date.now(),          // 桥接层到达时间：与 Python 同机时钟，用于截止时间调度
+      client_ts: message.ts,   // 浏览器时间戳（可能有时钟偏差，仅供参考）
     };
 
     try {
@@ -319,15 +385,79 @@ export class GestureWebSocketService {
     }
   }
 
-  private broadcastGestureResult(result: any) {
-    // 用 forEach，避免 TS 的 downlevelIteration 报错
-    this.clients.forEach((client, clientId) => {
-      if (client.isRecognizing && client.ws.readyState === WebSocket.OPEN) {
-        this.safeSend(client.ws, { type: "gesture_result", ...result });
+  // 通知 Python 释放该客户端的会话状态（EMA / 历史等）
+  private notifyPythonDisconnect(clientId: string) {
+    if (!this.pythonProcess) return;
+    try {
+      this.pythonProcess.send(JSON.stringify({ type: "client_disconnect", client_id: clientId }));
+    } catch (e) {
+      console.error("❌ send disconnect to Python failed:", e);
+    }
+  }
+
+  /**
+   * 管理通道：向 worker 发送控制消息（profile_start / profile_stop），按 seq 等待对应的 control 回复
+   * 只由鉴权后的 admin 路由调用（见 admin_routes.ts），前端 WebSocket 消息无法触发
+   */
+  public sendWorkerControl(message: Record<string, any>, timeoutMs = 10_000): Promise<any> {
+    const python = this.pythonProcess;
+    if (!python) return Promise.reject(new Error("Python worker not running"));
+    const seq = `admin-${++this.adminSeq}`;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pendingControl.delete(seq);
+        reject(new Error(`Worker did not reply to ${message.type} within ${timeoutMs}ms`));
+      }, timeoutMs);
+      this.pendingControl.set(seq, { resolve, timer });
+      try {
+        python.send(JSON.stringify({ ...message, seq }));
+      } catch (e) {
+        clearTimeout(timer);
+        this.pendingControl.delete(seq);
+        reject(e);
       }
     });
   }
 
+  // 路由规则见 worker_router.ts（协议契约测试驱动的是同一份实现）
+  private routeSinks: RouteSinks = {
+    releaseSlot: (slot) => { if (this.frameRing) this.frameRing.release(slot); },
+    resolveControl: (seq, msg) => {
+      const pending = this.pendingControl.get(seq);
+      if (!pending) return false;
+      clearTimeout(pending.timer);
+      this.pendingControl.delete(seq);
+      pending.resolve(msg);
+      return true;
+    },
+    deliverResult: (clientId, message) => {
+      const client = this.clients.get(clientId);
+      if (!client || !client.isRecognizing || client.ws.readyState !== WebSocket.OPEN) return false;
+      this.safeSend(client.ws, message);
+      return true;
+    },
+  };
+
+  private onPythonMessage(msg: any) {
+    if (msg.type === "profile_stopped" && msg.ok) {
+      const top = (msg.top || []).slice(0, 5).map((t: any) => t.function).join(", ");
+      console.log(`🐍 profile (${msg.mode}, ${msg.elapsed_s}s, ${msg.messages} msgs): ${Object.values(msg.files || {}).join(", ")}`);
+      if (top) console.log(`🐍 profile top: ${top}`);
+    }
+    routePythonMessage(msg, this.routeSinks);
+  }
+
+  private openFrameRing(info: any) {
+    try {
+      this.frameRing = new FrameRingWriter(info);
+      console.log(`🐍 Frame ring: ${info.path} (${info.slots} x ${Math.round(info.slot_size / 1024)}KB)`);
+    } catch (e) {
+      // 打不开共享内存（如非 Linux）时继续走 pipe 路径
+      console.warn("⚠️  Frame ring unavailable, using pipe transport:", e);
+      this.frameRing = null;
+    }
+  }
+
   private sendToClient(clientId: string, message: any) {
     const c = this.clients.get(clientId);
     if (!c || c.ws.readyState !== WebSocket.OPEN) return;
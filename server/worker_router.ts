@@ -0,0 +1,29 @@
+/**
+ * Worker 输出路由：按 msg_class 把 Python 的每一行输出分发到客户端 / 管理通道
+ * - 不依赖 ws / python-shell，GestureWebSocketService 与协议契约测试（scripts/route_contract.ts）共用同一份实现
+ * - result：只发给 client_id 对应、且正在识别的客户端（客户端之间互不可见）
+ * - control：管理通道（string seq）的回复交给等待中的请求，其余协议回复（ready / pong）不转发给前端
+ * - error 及其他无法归属的输出：丢弃
+ */
+
+export type RouteOutcome = "result" | "control" | "dropped";
+
+export interface RouteSinks {
+  /** 回显 slot 的回复（结果或 slot_released）表示 worker 已用完该帧环槽位 */
+  releaseSlot(slot: number): void;
+  /** 交给等待中的管理请求；返回是否有请求在等这个 seq */
+  resolveControl(seq: string, msg: any): boolean;
+  /** 发给客户端；客户端不存在 / 未在识别 / 连接已关闭时返回 false */
+  deliverResult(clientId: string, message: any): boolean;
+}
+
+export function routePythonMessage(msg: any, sinks: RouteSinks): RouteOutcome {
+  if (!msg || typeof msg !== "object") return "dropped";
+  if (typeof msg.slot === "number") sinks.releaseSlot(msg.slot);
+  if (msg.msg_class === "control") {
+    if (typeof msg.seq === "string") sinks.resolveControl(msg.seq, msg);
+    return "control";
+  }
+  if (msg.msg_class !== "result" || !msg.client_id) return "dropped";
+  return sinks.deliverResult(msg.client_id, { type: "gesture_result", ...msg }) ? "result" : "dropped";
+}